@@ -9,6 +9,7 @@ import click
 from tqdm import tqdm
 from flask import current_app
 from langchain.embeddings import OpenAIEmbeddings
+from sqlalchemy.dialects.postgresql import insert
 from werkzeug.exceptions import NotFound
 
 from core.embedding.cached_embedding import CacheEmbedding
@@ -23,7 +24,7 @@ from libs.helper import email as email_validate
 from extensions.ext_database import db
 from libs.rsa import generate_key_pair
 from models.account import InvitationCode, Tenant, TenantAccountJoin
-from models.dataset import Dataset, DatasetQuery, Document
+from models.dataset import Dataset, DatasetQuery, Document, Embedding, DatasetKeywordTable, DatasetKeywordNode
 from models.model import Account, AppModelConfig, App
 import secrets
 import base64
@@ -175,7 +176,9 @@ def generate_upper_string():
 
 
 @click.command('recreate-all-dataset-indexes', help='Recreate all dataset indexes.')
-def recreate_all_dataset_indexes():
+@click.option('--resume', is_flag=True, default=False,
+              help='Continue interrupted rebuilds after their last indexed segment.')
+def recreate_all_dataset_indexes(resume: bool):
     click.echo(click.style('Start recreate all dataset indexes.', fg='green'))
     recreate_count = 0
 
@@ -192,8 +195,9 @@ def recreate_all_dataset_indexes():
             try:
                 click.echo('Recreating dataset index: {}'.format(dataset.id))
                 index = IndexBuilder.get_index(dataset, 'high_quality')
-                if index and index._is_origin():
-                    index.recreate_dataset(dataset)
+                # an interrupted rebuild is resumable whatever the dataset's index struct is
+                if index and (index._is_origin() or (resume and index.is_rebuild_interrupted(dataset))):
+                    index.recreate_dataset(dataset, resume=resume)
                     recreate_count += 1
                 else:
                     click.echo('passed.')
@@ -305,7 +309,9 @@ def sync_anthropic_hosted_providers():
 
 
 @click.command('create-qdrant-indexes', help='Create qdrant indexes.')
-def create_qdrant_indexes():
+@click.option('--resume', is_flag=True, default=False,
+              help='Continue interrupted rebuilds after their last indexed segment.')
+def create_qdrant_indexes(resume: bool):
     click.echo(click.style('Start create qdrant indexes.', fg='green'))
     create_count = 0
 
@@ -361,7 +367,7 @@ def create_qdrant_indexes():
                             embeddings=embeddings
                         )
                         if index:
-                            index.create_qdrant_dataset(dataset)
+                            index.create_qdrant_dataset(dataset, resume=resume)
                             index_struct = {
                                 "type": 'qdrant',
                                 "vector_store": {"class_prefix": dataset.index_struct_dict['vector_store']['class_prefix']}
@@ -440,6 +446,43 @@ def update_qdrant_indexes():
 
     click.echo(click.style('Congratulations! Update {} dataset indexes.'.format(create_count), fg='green'))
 
+@click.command('migrate-qdrant-shared-collections',
+               help='Move qdrant dataset indexes into the collections shared by embedding model and dimension.')
+def migrate_qdrant_shared_collections():
+    click.echo(click.style('Start migrate qdrant dataset indexes into shared collections.', fg='green'))
+    migrate_count = 0
+
+    page = 1
+    while True:
+        try:
+            datasets = db.session.query(Dataset).filter(Dataset.indexing_technique == 'high_quality') \
+                .order_by(Dataset.created_at.desc()).paginate(page=page, per_page=50)
+        except NotFound:
+            break
+
+        page += 1
+        for dataset in datasets:
+            index_struct_dict = dataset.index_struct_dict
+            if not index_struct_dict or index_struct_dict['type'] != 'qdrant' \
+                    or index_struct_dict['vector_store'].get('shared'):
+                continue
+
+            try:
+                click.echo('Migrate dataset qdrant index: {}'.format(dataset.id))
+                index = IndexBuilder.get_index(dataset, 'high_quality')
+                if index and not index._is_origin():
+                    index.migrate_to_shared_collection(dataset)
+                    migrate_count += 1
+                else:
+                    click.echo('passed.')
+            except Exception as e:
+                click.echo(
+                    click.style('Migrate dataset index error: {} {}'.format(e.__class__.__name__, str(e)), fg='red'))
+                continue
+
+    click.echo(click.style('Congratulations! Migrated {} dataset indexes.'.format(migrate_count), fg='green'))
+
+
 @click.command('update_app_model_configs', help='Migrate data to support paragraph variable.')
 @click.option("--batch-size", default=500, help="Number of records to migrate in each batch.")
 def update_app_model_configs(batch_size):
@@ -541,6 +584,114 @@ def update_app_model_configs(batch_size):
             
             pbar.update(len(data_batch))
 
+@click.command('migrate-embeddings-format', help='Rewrite pickled cached embeddings in the compact float32 format.')
+@click.option("--batch-size", default=500, help="Number of embeddings to rewrite in each batch.")
+@click.option("--sleep", default=0.0, help="Seconds to sleep between batches to limit the database load.")
+def migrate_embeddings_format(batch_size, sleep):
+    click.secho("Start rewrite pickled embeddings.", fg='green')
+    migrated_count = 0
+    last_id = None
+
+    while True:
+        query = db.session.query(Embedding).order_by(Embedding.id)
+        if last_id:
+            query = query.filter(Embedding.id > last_id)
+
+        embeddings = query.limit(batch_size).all()
+        if not embeddings:
+            break
+
+        batch_last_id = embeddings[-1].id
+        batch_migrated_count = 0
+        try:
+            for embedding in embeddings:
+                if embedding.is_pickled:
+                    embedding.set_embedding(embedding.get_embedding())
+                    batch_migrated_count += 1
+
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            # abort instead of skipping the batch, a rerun only rewrites the embeddings still pickled
+            click.secho(f"Error while rewriting embeddings: {e}, rewrote {migrated_count} embeddings "
+                        f"up to id {last_id}", fg='red')
+            raise click.Abort()
+
+        last_id = batch_last_id
+        migrated_count += batch_migrated_count
+
+        if sleep:
+            time.sleep(sleep)
+
+    click.secho(f"Congratulations! Rewrote {migrated_count} embeddings.", fg='green')
+
+
+@click.command('migrate-keyword-tables', help='Migrate dataset keyword tables to the normalized storage.')
+@click.option("--batch-size", default=1000, help="Number of keyword nodes to insert in each batch.")
+def migrate_keyword_tables(batch_size):
+    click.secho("Start migrate dataset keyword tables.", fg='green')
+    migrated_count = 0
+    last_id = None
+
+    while True:
+        query = db.session.query(DatasetKeywordTable.id).filter(DatasetKeywordTable.storage_type == 'json') \
+            .order_by(DatasetKeywordTable.id)
+        if last_id:
+            query = query.filter(DatasetKeywordTable.id > last_id)
+
+        dataset_keyword_table_ids = [row.id for row in query.limit(50).all()]
+        if not dataset_keyword_table_ids:
+            break
+
+        last_id = dataset_keyword_table_ids[-1]
+        for dataset_keyword_table_id in dataset_keyword_table_ids:
+            try:
+                # lock the row so that the keyword table is not changed while it is copied
+                dataset_keyword_table = db.session.query(DatasetKeywordTable).filter(
+                    DatasetKeywordTable.id == dataset_keyword_table_id,
+                    DatasetKeywordTable.storage_type == 'json'
+                ).with_for_update().first()
+                if not dataset_keyword_table:
+                    db.session.rollback()
+                    continue
+
+                click.echo('Migrating dataset keyword table: {}'.format(dataset_keyword_table.dataset_id))
+                keyword_table_dict = dataset_keyword_table.keyword_table_dict
+                keyword_table = keyword_table_dict['__data__']['table'] if keyword_table_dict else {}
+                keyword_nodes = [
+                    {'dataset_id': dataset_keyword_table.dataset_id, 'keyword': keyword, 'node_id': node_id}
+                    for keyword, node_ids in keyword_table.items()
+                    for node_id in node_ids
+                ]
+
+                for i in range(0, len(keyword_nodes), batch_size):
+                    db.session.execute(
+                        insert(DatasetKeywordNode).values(keyword_nodes[i:i + batch_size]).on_conflict_do_nothing(
+                            index_elements=['dataset_id', 'keyword', 'node_id']
+                        )
+                    )
+
+                dataset_keyword_table.storage_type = 'normalized'
+                dataset_keyword_table.keyword_table = json.dumps({
+                    '__type__': 'keyword_table',
+                    '__data__': {
+                        "index_id": dataset_keyword_table.dataset_id,
+                        "summary": None,
+                        "table": {}
+                    }
+                })
+                db.session.commit()
+                migrated_count += 1
+            except Exception as e:
+                db.session.rollback()
+                click.echo(
+                    click.style('Migrate dataset keyword table error: {} {}'.format(
+                        e.__class__.__name__, str(e)), fg='red'))
+                continue
+
+    click.secho(f"Congratulations! Migrated {migrated_count} dataset keyword tables.", fg='green')
+
+
 def register_commands(app):
     app.cli.add_command(reset_password)
     app.cli.add_command(reset_email)
@@ -551,4 +702,7 @@ def register_commands(app):
     app.cli.add_command(clean_unused_dataset_indexes)
     app.cli.add_command(create_qdrant_indexes)
     app.cli.add_command(update_qdrant_indexes)
-    app.cli.add_command(update_app_model_configs)
\ No newline at end of file
+    app.cli.add_command(migrate_qdrant_shared_collections)
+    app.cli.add_command(update_app_model_configs)
+    app.cli.add_command(migrate_embeddings_format)
+    app.cli.add_command(migrate_keyword_tables)
\ No newline at end of file
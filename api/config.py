@@ -67,6 +67,28 @@ DEFAULTS = {
     'CLEAN_DAY_SETTING': 30,
     'UPLOAD_FILE_SIZE_LIMIT': 15,
     'UPLOAD_FILE_BATCH_LIMIT': 5,
+    'QDRANT_CLIENT_POOL_SIZE': 20,
+    'QDRANT_SHARED_COLLECTION': 'False',
+    'NUMPY_VECTOR_STORE_PATH': 'storage/numpy_vectors',
+    'NUMPY_VECTOR_STORE_IVF_THRESHOLD': 50000,
+    'NUMPY_VECTOR_STORE_IVF_NPROBE': 8,
+    'INDEXING_PIPELINE_ENABLED': 'False',
+    'INDEXING_PIPELINE_QUEUE_SIZE': 4,
+    'EMBEDDING_CACHE_LRU_SIZE': 1000,
+    'EMBEDDING_CACHE_REDIS_TTL': 3600,
+    'EMBEDDING_QUERY_BATCH_MAX_SIZE': 16,
+    'EMBEDDING_QUERY_BATCH_MAX_WAIT_MS': 5,
+    'EMBEDDING_RATE_LIMIT_RPM': 0,
+    'EMBEDDING_MAX_CONCURRENCY': 1,
+    'KEYWORD_TABLE_STORAGE': 'json',
+    'KEYWORD_TABLE_CACHE_SIZE': 100,
+    'KEYWORD_TABLE_CACHE_TTL': 300,
+    'KEYWORD_TABLE_SCORING_MODE': 'keyword_count',
+    'KEYWORD_EXTRACTION_PROCESSES': 0,
+    'HYBRID_SEARCH_LATENCY_BUDGET_MS': 0,
+    'DATASET_RETRIEVAL_FANOUT_ENABLED': 'False',
+    'DATASET_RETRIEVAL_DEADLINE_MS': 0,
+    'DATASET_RETRIEVAL_CACHE_TTL': 600,
 }
 
 
@@ -154,7 +176,7 @@ class Config:
         self.S3_SECRET_KEY = get_env('S3_SECRET_KEY')
         self.S3_REGION = get_env('S3_REGION')
 
-        # vector store settings, only support weaviate, qdrant
+        # vector store settings, only support weaviate, qdrant, numpy
         self.VECTOR_STORE = get_env('VECTOR_STORE')
 
         # weaviate settings
@@ -166,6 +188,13 @@ class Config:
         # qdrant settings
         self.QDRANT_URL = get_env('QDRANT_URL')
         self.QDRANT_API_KEY = get_env('QDRANT_API_KEY')
+        self.QDRANT_CLIENT_POOL_SIZE = int(get_env('QDRANT_CLIENT_POOL_SIZE'))
+        self.QDRANT_SHARED_COLLECTION = get_bool_env('QDRANT_SHARED_COLLECTION')
+
+        # numpy vector store settings
+        self.NUMPY_VECTOR_STORE_PATH = get_env('NUMPY_VECTOR_STORE_PATH')
+        self.NUMPY_VECTOR_STORE_IVF_THRESHOLD = int(get_env('NUMPY_VECTOR_STORE_IVF_THRESHOLD'))
+        self.NUMPY_VECTOR_STORE_IVF_NPROBE = int(get_env('NUMPY_VECTOR_STORE_IVF_NPROBE'))
 
         # cors settings
         self.CONSOLE_CORS_ALLOW_ORIGINS = get_cors_allow_origins(
@@ -252,6 +281,35 @@ class Config:
         self.UPLOAD_FILE_SIZE_LIMIT = int(get_env('UPLOAD_FILE_SIZE_LIMIT'))
         self.UPLOAD_FILE_BATCH_LIMIT = int(get_env('UPLOAD_FILE_BATCH_LIMIT'))
 
+        # indexing settings
+        self.INDEXING_PIPELINE_ENABLED = get_bool_env('INDEXING_PIPELINE_ENABLED')
+        self.INDEXING_PIPELINE_QUEUE_SIZE = int(get_env('INDEXING_PIPELINE_QUEUE_SIZE'))
+
+        # embedding cache settings
+        self.EMBEDDING_CACHE_LRU_SIZE = int(get_env('EMBEDDING_CACHE_LRU_SIZE'))
+        self.EMBEDDING_CACHE_REDIS_TTL = int(get_env('EMBEDDING_CACHE_REDIS_TTL'))
+        self.EMBEDDING_QUERY_BATCH_MAX_SIZE = int(get_env('EMBEDDING_QUERY_BATCH_MAX_SIZE'))
+        self.EMBEDDING_QUERY_BATCH_MAX_WAIT_MS = int(get_env('EMBEDDING_QUERY_BATCH_MAX_WAIT_MS'))
+        self.EMBEDDING_RATE_LIMIT_RPM = int(get_env('EMBEDDING_RATE_LIMIT_RPM'))
+        self.EMBEDDING_MAX_CONCURRENCY = int(get_env('EMBEDDING_MAX_CONCURRENCY'))
+
+        # keyword table settings
+        self.KEYWORD_TABLE_STORAGE = get_env('KEYWORD_TABLE_STORAGE')
+        self.KEYWORD_TABLE_CACHE_SIZE = int(get_env('KEYWORD_TABLE_CACHE_SIZE'))
+        self.KEYWORD_TABLE_CACHE_TTL = int(get_env('KEYWORD_TABLE_CACHE_TTL'))
+        self.KEYWORD_TABLE_SCORING_MODE = get_env('KEYWORD_TABLE_SCORING_MODE')
+        self.KEYWORD_EXTRACTION_PROCESSES = int(get_env('KEYWORD_EXTRACTION_PROCESSES'))
+
+        # hybrid search settings
+        self.HYBRID_SEARCH_LATENCY_BUDGET_MS = int(get_env('HYBRID_SEARCH_LATENCY_BUDGET_MS'))
+
+        # multi dataset retrieval settings
+        self.DATASET_RETRIEVAL_FANOUT_ENABLED = get_bool_env('DATASET_RETRIEVAL_FANOUT_ENABLED')
+        self.DATASET_RETRIEVAL_DEADLINE_MS = int(get_env('DATASET_RETRIEVAL_DEADLINE_MS'))
+
+        # dataset retrieval cache settings
+        self.DATASET_RETRIEVAL_CACHE_TTL = int(get_env('DATASET_RETRIEVAL_CACHE_TTL'))
+
 
 class CloudEditionConfig(Config):
 
@@ -38,7 +38,8 @@ dataset_detail_fields = {
     'updated_at': TimestampField,
     'embedding_model': fields.String,
     'embedding_model_provider': fields.String,
-    'embedding_available': fields.Boolean
+    'embedding_available': fields.Boolean,
+    'retrieval_config': fields.Raw(attribute='retrieval_config_dict')
 }
 
 dataset_query_detail_fields = {
@@ -194,6 +195,7 @@ class DatasetApi(Resource):
                             help='Invalid indexing technique.')
         parser.add_argument('permission', type=str, location='json', choices=(
             'only_me', 'all_team_members'), help='Invalid permission.')
+        parser.add_argument('retrieval_config', type=dict, location='json', help='Invalid retrieval config.')
         args = parser.parse_args()
 
         # The role of the current user in the ta table must be admin or owner
@@ -11,6 +11,7 @@ from langchain.tools import BaseTool
 
 from core.model_providers.models.llm.base import BaseLLM
 from core.tool.dataset_retriever_tool import DatasetRetrieverTool
+from core.tool.multi_dataset_retriever_tool import MultiDatasetRetrieverTool
 
 
 class MultiDatasetRouterAgent(OpenAIFunctionsAgent):
@@ -55,6 +56,10 @@ class MultiDatasetRouterAgent(OpenAIFunctionsAgent):
             _, observation = intermediate_steps[-1]
             return AgentFinish(return_values={"output": observation}, log=observation)
 
+        if len(self.tools) == 1 and isinstance(self.tools[0], MultiDatasetRetrieverTool):
+            # the tool queries every dataset, nothing to route
+            return AgentAction(tool=self.tools[0].name, tool_input=kwargs['input'], log='')
+
         try:
             return super().plan(intermediate_steps, callbacks, **kwargs)
         except Exception as e:
@@ -14,6 +14,7 @@ from langchain.agents.structured_chat.prompt import PREFIX, SUFFIX
 
 from core.model_providers.models.llm.base import BaseLLM
 from core.tool.dataset_retriever_tool import DatasetRetrieverTool
+from core.tool.multi_dataset_retriever_tool import MultiDatasetRetrieverTool
 
 FORMAT_INSTRUCTIONS = """Use a json blob to specify a tool by providing an action key (tool name) and an action_input key (tool input).
 The nouns in the format of "Thought", "Action", "Action Input", "Final Answer" must be expressed in English.
@@ -88,6 +89,14 @@ class StructuredMultiDatasetRouterAgent(StructuredChatAgent):
         if len(self.dataset_tools) == 0:
             return AgentFinish(return_values={"output": ''}, log='')
 
+        if len(self.dataset_tools) == 1 and isinstance(self.dataset_tools[0], MultiDatasetRetrieverTool):
+            # the tool queries every dataset, nothing to route
+            if intermediate_steps:
+                _, observation = intermediate_steps[-1]
+                return AgentFinish(return_values={"output": observation}, log=observation)
+
+            return AgentAction(tool=self.dataset_tools[0].name, tool_input=kwargs['input'], log='')
+
         full_inputs = self.get_full_inputs(intermediate_steps, **kwargs)
 
         try:
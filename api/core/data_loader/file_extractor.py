@@ -1,9 +1,10 @@
 import tempfile
 from pathlib import Path
-from typing import List, Union, Optional
+from typing import Iterator, List, Union, Optional
 
 import requests
 from langchain.document_loaders import TextLoader, Docx2txtLoader
+from langchain.document_loaders.base import BaseLoader
 from langchain.schema import Document
 
 from core.data_loader.loader.csv_loader import CSVLoader
@@ -28,6 +29,22 @@ class FileExtractor:
 
             return cls.load_from_file(file_path, return_text, upload_file)
 
+    @classmethod
+    def lazy_load(cls, upload_file: UploadFile) -> Iterator[Document]:
+        """Load the documents of the file one by one, as the loader produces them when it can."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            suffix = Path(upload_file.key).suffix
+            file_path = f"{temp_dir}/{next(tempfile._get_candidate_names())}{suffix}"
+            storage.download(upload_file.key, file_path)
+
+            loader = cls._get_loader(file_path, upload_file)
+            try:
+                documents = loader.lazy_load()
+            except NotImplementedError:
+                documents = loader.load()
+
+            yield from documents
+
     @classmethod
     def load_from_url(cls, url: str, return_text: bool = False) -> Union[List[Document] | str]:
         response = requests.get(url, headers={
@@ -45,8 +62,14 @@ class FileExtractor:
     @classmethod
     def load_from_file(cls, file_path: str, return_text: bool = False,
                        upload_file: Optional[UploadFile] = None) -> Union[List[Document] | str]:
-        input_file = Path(file_path)
         delimiter = '\n'
+        loader = cls._get_loader(file_path, upload_file)
+
+        return delimiter.join([document.page_content for document in loader.load()]) if return_text else loader.load()
+
+    @classmethod
+    def _get_loader(cls, file_path: str, upload_file: Optional[UploadFile] = None) -> BaseLoader:
+        input_file = Path(file_path)
         file_extension = input_file.suffix.lower()
         if file_extension == '.xlsx':
             loader = ExcelLoader(file_path)
@@ -64,4 +87,4 @@ class FileExtractor:
             # txt
             loader = TextLoader(file_path, autodetect_encoding=True)
 
-        return delimiter.join([document.page_content for document in loader.load()]) if return_text else loader.load()
+        return loader
@@ -1,5 +1,5 @@
 import logging
-from typing import List, Optional
+from typing import Iterator, List, Optional
 
 from langchain.document_loaders import PyPDFium2Loader
 from langchain.document_loaders.base import BaseLoader
@@ -29,6 +29,10 @@ class PdfLoader(BaseLoader):
         self._upload_file = upload_file
 
     def load(self) -> List[Document]:
+        return list(self.lazy_load())
+
+    def lazy_load(self) -> Iterator[Document]:
+        """Load the pages one by one as they are parsed."""
         plaintext_file_key = ''
         plaintext_file_exists = False
         if self._upload_file:
@@ -38,18 +42,18 @@ class PdfLoader(BaseLoader):
                 try:
                     text = storage.load(plaintext_file_key).decode('utf-8')
                     plaintext_file_exists = True
-                    return [Document(page_content=text)]
+                    yield Document(page_content=text)
+                    return
                 except FileNotFoundError:
                     pass
-        documents = PyPDFium2Loader(file_path=self._file_path).load()
+
         text_list = []
-        for document in documents:
+        for document in PyPDFium2Loader(file_path=self._file_path).lazy_load():
             text_list.append(document.page_content)
+            yield document
         text = "\n\n".join(text_list)
 
         # save plaintext file for caching
         if not plaintext_file_exists and plaintext_file_key:
             storage.save(plaintext_file_key, text.encode('utf-8'))
 
-        return documents
-
@@ -1,4 +1,4 @@
-from typing import Any, Dict, Optional, Sequence
+from typing import Any, Dict, List, Optional, Sequence
 
 from langchain.schema import Document
 from sqlalchemy import func
@@ -9,6 +9,8 @@ from models.dataset import Dataset, DocumentSegment
 
 
 class DatesetDocumentStore:
+    BULK_INSERT_BATCH_SIZE = 1000
+
     def __init__(
             self,
             dataset: Dataset,
@@ -61,6 +63,10 @@ class DatesetDocumentStore:
     def add_documents(
             self, docs: Sequence[Document], allow_update: bool = True
     ) -> None:
+        for doc in docs:
+            if not isinstance(doc, Document):
+                raise ValueError("doc must be a Document")
+
         max_position = db.session.query(func.max(DocumentSegment.position)).filter(
             DocumentSegment.document_id == self._document_id
         ).scalar()
@@ -75,11 +81,18 @@ class DatesetDocumentStore:
                 model_name=self._dataset.embedding_model
             )
 
-        for doc in docs:
-            if not isinstance(doc, Document):
-                raise ValueError("doc must be a Document")
+        # check existence of all docs with one query
+        exist_segments = self.get_document_segments([doc.metadata['doc_id'] for doc in docs])
+
+        # calc embedding use tokens
+        if embedding_model:
+            doc_tokens = embedding_model.get_num_tokens_batch([doc.page_content for doc in docs])
+        else:
+            doc_tokens = [0] * len(docs)
 
-            segment_document = self.get_document(doc_id=doc.metadata['doc_id'], raise_error=False)
+        new_segments = []
+        for doc, tokens in zip(docs, doc_tokens):
+            segment_document = exist_segments.get(doc.metadata['doc_id'])
 
             # NOTE: doc could already exist in the store, but we overwrite it
             if not allow_update and segment_document:
@@ -88,29 +101,27 @@ class DatesetDocumentStore:
                     "Set allow_update to True to overwrite."
                 )
 
-            # calc embedding use tokens
-            tokens = embedding_model.get_num_tokens(doc.page_content) if embedding_model else 0
-
             if not segment_document:
                 max_position += 1
 
-                segment_document = DocumentSegment(
-                    tenant_id=self._dataset.tenant_id,
-                    dataset_id=self._dataset.id,
-                    document_id=self._document_id,
-                    index_node_id=doc.metadata['doc_id'],
-                    index_node_hash=doc.metadata['doc_hash'],
-                    position=max_position,
-                    content=doc.page_content,
-                    word_count=len(doc.page_content),
-                    tokens=tokens,
-                    enabled=False,
-                    created_by=self._user_id,
-                )
+                new_segment = {
+                    'tenant_id': self._dataset.tenant_id,
+                    'dataset_id': self._dataset.id,
+                    'document_id': self._document_id,
+                    'index_node_id': doc.metadata['doc_id'],
+                    'index_node_hash': doc.metadata['doc_hash'],
+                    'position': max_position,
+                    'content': doc.page_content,
+                    'answer': None,
+                    'word_count': len(doc.page_content),
+                    'tokens': tokens,
+                    'enabled': False,
+                    'created_by': self._user_id,
+                }
                 if 'answer' in doc.metadata and doc.metadata['answer']:
-                    segment_document.answer = doc.metadata.pop('answer', '')
+                    new_segment['answer'] = doc.metadata.pop('answer', '')
 
-                db.session.add(segment_document)
+                new_segments.append(new_segment)
             else:
                 segment_document.content = doc.page_content
                 if 'answer' in doc.metadata and doc.metadata['answer']:
@@ -119,6 +130,14 @@ class DatesetDocumentStore:
                 segment_document.word_count = len(doc.page_content)
                 segment_document.tokens = tokens
 
+        # flush updated segments, then insert new segments with multi-row INSERTs
+        db.session.commit()
+
+        for i in range(0, len(new_segments), self.BULK_INSERT_BATCH_SIZE):
+            db.session.execute(
+                DocumentSegment.__table__.insert(),
+                new_segments[i:i + self.BULK_INSERT_BATCH_SIZE]
+            )
             db.session.commit()
 
     def document_exists(self, doc_id: str) -> bool:
@@ -185,3 +204,14 @@ class DatesetDocumentStore:
         ).first()
 
         return document_segment
+
+    def get_document_segments(self, doc_ids: List[str]) -> Dict[str, DocumentSegment]:
+        if not doc_ids:
+            return {}
+
+        document_segments = db.session.query(DocumentSegment).filter(
+            DocumentSegment.dataset_id == self._dataset.id,
+            DocumentSegment.index_node_id.in_(doc_ids)
+        ).all()
+
+        return {document_segment.index_node_id: document_segment for document_segment in document_segments}
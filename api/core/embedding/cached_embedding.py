@@ -1,77 +1,274 @@
 import logging
-from typing import List
+import threading
+import time
+from typing import List, Optional, Dict, Union
 
 import numpy as np
+from cachetools import LRUCache
+from flask import current_app
 from langchain.embeddings.base import Embeddings
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError
 
+from core.embedding.query_batcher import get_query_batcher
+from core.embedding.rate_limiter import get_rate_limiter
+from core.model_providers.error import LLMRateLimitError
 from core.model_providers.models.embedding.base import BaseEmbedding
 from extensions.ext_database import db
+from extensions.ext_redis import redis_client
 from libs import helper
 from models.dataset import Embedding
 
 
+class EmbeddingCache:
+    """
+    Layered cache of normalized embeddings in front of the embeddings table:
+    a bounded in-process LRU, then redis with a ttl, then the embeddings table.
+    """
+    TIERS = ['memory', 'redis', 'database']
+
+    def __init__(self, maxsize: int, redis_ttl: int):
+        self._memory = LRUCache(maxsize=maxsize)
+        self._redis_ttl = redis_ttl
+        self._lock = threading.Lock()
+        self._stats = {tier: {'hits': 0, 'misses': 0} for tier in self.TIERS}
+
+    def get_many(self, model_name: str, hashes: List[str]) -> Dict[str, List[float]]:
+        # the tiers pass the decoded arrays along, they are only converted to lists once for the caller
+        results = {}
+        hashes = list(dict.fromkeys(hashes))
+
+        # memory tier
+        with self._lock:
+            for hash in hashes:
+                vector = self._memory.get((model_name, hash))
+                if vector is not None:
+                    results[hash] = vector
+        self._record('memory', len(results), len(hashes) - len(results))
+
+        # redis tier
+        missed_hashes = [hash for hash in hashes if hash not in results]
+        if missed_hashes:
+            redis_results = self._get_from_redis(model_name, missed_hashes)
+            self._record('redis', len(redis_results), len(missed_hashes) - len(redis_results))
+            self._set_memory(model_name, redis_results)
+            results.update(redis_results)
+
+        # database tier
+        missed_hashes = [hash for hash in hashes if hash not in results]
+        if missed_hashes:
+            embeddings = db.session.query(Embedding).filter(
+                Embedding.model_name == model_name,
+                Embedding.hash.in_(missed_hashes)
+            ).all()
+            database_results = {embedding.hash: embedding.get_embedding_array() for embedding in embeddings}
+            self._record('database', len(database_results), len(missed_hashes) - len(database_results))
+            self.set_many(model_name, database_results)
+            results.update(database_results)
+
+        return {hash: vector.tolist() for hash, vector in results.items()}
+
+    def set_many(self, model_name: str, embeddings: Dict[str, Union[List[float], np.ndarray]]) -> None:
+        """Put embeddings into the memory and redis tiers, the embeddings table is written by the caller."""
+        if not embeddings:
+            return
+
+        self._set_memory(model_name, embeddings)
+
+        try:
+            pipeline = redis_client.pipeline(transaction=False)
+            for hash, embedding in embeddings.items():
+                pipeline.setex(
+                    self._redis_key(model_name, hash),
+                    self._redis_ttl,
+                    Embedding.encode_embedding(embedding)
+                )
+            pipeline.execute()
+        except Exception:
+            logging.exception('Failed to add embeddings to redis')
+
+    def stats(self) -> dict:
+        """Get hit and miss counters and hit rate of each tier."""
+        with self._lock:
+            stats = {}
+            for tier, counter in self._stats.items():
+                total = counter['hits'] + counter['misses']
+                stats[tier] = {
+                    'hits': counter['hits'],
+                    'misses': counter['misses'],
+                    'hit_rate': counter['hits'] / total if total else 0.0
+                }
+
+            return stats
+
+    def _get_from_redis(self, model_name: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        try:
+            values = redis_client.mget([self._redis_key(model_name, hash) for hash in hashes])
+        except Exception:
+            logging.exception('Failed to get embeddings from redis')
+            return {}
+
+        return {hash: Embedding.decode_embedding(value) for hash, value in zip(hashes, values) if value}
+
+    def _set_memory(self, model_name: str, embeddings: Dict[str, Union[List[float], np.ndarray]]) -> None:
+        with self._lock:
+            for hash, embedding in embeddings.items():
+                self._memory[(model_name, hash)] = np.asarray(embedding)
+
+    def _record(self, tier: str, hits: int, misses: int) -> None:
+        with self._lock:
+            self._stats[tier]['hits'] += hits
+            self._stats[tier]['misses'] += misses
+
+    @staticmethod
+    def _redis_key(model_name: str, hash: str) -> str:
+        return 'embedding:{}:{}'.format(model_name, hash)
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(
+                    maxsize=int(current_app.config.get('EMBEDDING_CACHE_LRU_SIZE')),
+                    redis_ttl=int(current_app.config.get('EMBEDDING_CACHE_REDIS_TTL'))
+                )
+
+    return _embedding_cache
+
+
 class CacheEmbedding(Embeddings):
+    MAX_RATE_LIMIT_RETRIES = 5
+
     def __init__(self, embeddings: BaseEmbedding):
         self._embeddings = embeddings
 
+    @property
+    def max_concurrency(self) -> int:
+        """Max embed_documents calls that may run at the same time for this model."""
+        return get_rate_limiter(self._embeddings).max_concurrency
+
+    @classmethod
+    def cache_stats(cls) -> dict:
+        return get_embedding_cache().stats()
+
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """Embed search docs."""
         # use doc embedding cache or store if not exists
-        text_embeddings = []
-        embedding_queue_texts = []
-        for text in texts:
-            hash = helper.generate_text_hash(text)
-            embedding = db.session.query(Embedding).filter_by(model_name=self._embeddings.name, hash=hash).first()
-            if embedding:
-                text_embeddings.append(embedding.get_embedding())
-            else:
-                embedding_queue_texts.append(text)
-
-        if embedding_queue_texts:
+        embedding_cache = get_embedding_cache()
+        text_embeddings = [None for _ in range(len(texts))]
+        text_hashes = [helper.generate_text_hash(text) for text in texts]
+
+        cache_embeddings = embedding_cache.get_many(self._embeddings.name, text_hashes) if text_hashes else {}
+
+        embedding_queue_hashes = {}
+        for i, hash in enumerate(text_hashes):
+            if hash in cache_embeddings:
+                text_embeddings[i] = cache_embeddings[hash]
+            elif hash not in embedding_queue_hashes:
+                embedding_queue_hashes[hash] = texts[i]
+
+        if embedding_queue_hashes:
+            embedding_results = self._embed_with_rate_limit(list(embedding_queue_hashes.values()))
+
+            new_embeddings = []
+            normalized_embeddings = {}
+            for hash, vector in zip(embedding_queue_hashes.keys(), embedding_results):
+                normalized_embedding = (vector / np.linalg.norm(vector)).tolist()
+                normalized_embeddings[hash] = normalized_embedding
+
+                embedding = Embedding(model_name=self._embeddings.name, hash=hash)
+                embedding.set_embedding(normalized_embedding)
+                new_embeddings.append({
+                    'model_name': embedding.model_name,
+                    'hash': embedding.hash,
+                    'embedding': embedding.embedding
+                })
+
+            for i, hash in enumerate(text_hashes):
+                if text_embeddings[i] is None:
+                    text_embeddings[i] = normalized_embeddings[hash]
+
             try:
-                embedding_results = self._embeddings.client.embed_documents(embedding_queue_texts)
-            except Exception as ex:
-                raise self._embeddings.handle_exceptions(ex)
-            i = 0
-            normalized_embedding_results = []
-            for text in embedding_queue_texts:
-                hash = helper.generate_text_hash(text)
-
-                try:
-                    embedding = Embedding(model_name=self._embeddings.name, hash=hash)
-                    vector = embedding_results[i]
-                    normalized_embedding = (vector / np.linalg.norm(vector)).tolist()
-                    normalized_embedding_results.append(normalized_embedding)
-                    embedding.set_embedding(normalized_embedding)
-                    db.session.add(embedding)
-                    db.session.commit()
-                except IntegrityError:
-                    db.session.rollback()
-                    continue
-                except:
-                    logging.exception('Failed to add embedding to db')
-                    continue
-                finally:
-                    i += 1
-
-            text_embeddings.extend(normalized_embedding_results)
+                db.session.execute(
+                    insert(Embedding).values(new_embeddings).on_conflict_do_nothing(
+                        index_elements=['model_name', 'hash']
+                    )
+                )
+                db.session.commit()
+            except:
+                db.session.rollback()
+                logging.exception('Failed to add embeddings to db')
+
+            embedding_cache.set_many(self._embeddings.name, normalized_embeddings)
+
         return text_embeddings
 
+    def _embed_with_rate_limit(self, texts: List[str]) -> List[List[float]]:
+        rate_limiter = get_rate_limiter(self._embeddings)
+        for retry in range(self.MAX_RATE_LIMIT_RETRIES + 1):
+            rate_limiter.acquire()
+            try:
+                embedding_results = self._embeddings.client.embed_documents(texts)
+            except Exception as ex:
+                ex = self._embeddings.handle_exceptions(ex)
+                if not isinstance(ex, LLMRateLimitError) or retry >= self.MAX_RATE_LIMIT_RETRIES:
+                    raise ex
+
+                wait = rate_limiter.on_rate_limited() * (2 ** retry)
+                logging.warning(f'Embedding rate limited, retry in {wait:.2f}s')
+                time.sleep(wait)
+                continue
+
+            rate_limiter.on_success()
+            return embedding_results
+
     def embed_query(self, text: str) -> List[float]:
         """Embed query text."""
         # use doc embedding cache or store if not exists
+        embedding_cache = get_embedding_cache()
         hash = helper.generate_text_hash(text)
-        embedding = db.session.query(Embedding).filter_by(model_name=self._embeddings.name, hash=hash).first()
-        if embedding:
-            return embedding.get_embedding()
+        cache_embeddings = embedding_cache.get_many(self._embeddings.name, [hash])
+        if hash in cache_embeddings:
+            return cache_embeddings[hash]
 
         try:
-            embedding_results = self._embeddings.client.embed_query(text)
+            embedding_results = get_query_batcher().embed_query(self._embeddings, text)
             embedding_results = (embedding_results / np.linalg.norm(embedding_results)).tolist()
         except Exception as ex:
             raise self._embeddings.handle_exceptions(ex)
 
+        self._save_query_embedding(hash, embedding_results)
+
+        return embedding_results
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Embed query text with the async client of the model, cache lookups run in the executor."""
+        embedding_cache = get_embedding_cache()
+        hash = helper.generate_text_hash(text)
+        cache_embeddings = await helper.run_in_app_context(embedding_cache.get_many, self._embeddings.name, [hash])
+        if hash in cache_embeddings:
+            return cache_embeddings[hash]
+
+        try:
+            embedding_results = await self._embeddings.client.aembed_query(text)
+        except NotImplementedError:
+            # clients without async support embed through the query batcher
+            return await helper.run_in_app_context(self.embed_query, text)
+        except Exception as ex:
+            raise self._embeddings.handle_exceptions(ex)
+
+        embedding_results = (embedding_results / np.linalg.norm(embedding_results)).tolist()
+        await helper.run_in_app_context(self._save_query_embedding, hash, embedding_results)
+
+        return embedding_results
+
+    def _save_query_embedding(self, hash: str, embedding_results: List[float]) -> None:
         try:
             embedding = Embedding(model_name=self._embeddings.name, hash=hash)
             embedding.set_embedding(embedding_results)
@@ -82,5 +279,4 @@ class CacheEmbedding(Embeddings):
         except:
             logging.exception('Failed to add embedding to db')
 
-        return embedding_results
-
+        get_embedding_cache().set_many(self._embeddings.name, {hash: embedding_results})
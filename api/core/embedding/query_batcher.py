@@ -0,0 +1,117 @@
+import threading
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+from flask import current_app
+
+from core.model_providers.models.embedding.base import BaseEmbedding
+
+
+class _QueryBatch:
+    def __init__(self, embeddings: BaseEmbedding):
+        self.embeddings = embeddings
+        self.texts: List[str] = []
+        self.futures: List[Future] = []
+        self.full = threading.Event()
+
+    def add(self, text: str) -> Future:
+        future = Future()
+        self.texts.append(text)
+        self.futures.append(future)
+        return future
+
+
+class EmbeddingQueryBatcher:
+    """
+    Gather concurrent query embeddings of the same model into one embed_documents call.
+
+    Only models whose client embeds a query exactly as a document are batched, the others
+    embed each query with embed_query. The first caller of a batch becomes its leader.
+    While another batch of the model is being embedded, the leader waits up to max_wait_ms
+    for other callers (or until the batch is full), otherwise it sends its batch at once,
+    so that a lone query is never delayed. Every caller gets its own vector, as the provider made it.
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: int):
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._lock = threading.Lock()
+        self._batches = {}
+        self._in_flight = {}
+
+    def embed_query(self, embeddings: BaseEmbedding, text: str) -> List[float]:
+        if self._max_batch_size <= 1 or self._max_wait <= 0 or not embeddings.query_batchable:
+            return embeddings.client.embed_query(text)
+
+        key = self._batch_key(embeddings)
+        with self._lock:
+            batch = self._batches.get(key)
+            is_leader = batch is None
+            if is_leader:
+                batch = _QueryBatch(embeddings)
+                self._batches[key] = batch
+                # only wait for other callers under load, when a batch of the model is already in flight
+                wait = self._in_flight.get(key, 0) > 0
+
+            future = batch.add(text)
+            if len(batch.texts) >= self._max_batch_size:
+                # close the batch so that later callers start a new one
+                del self._batches[key]
+                batch.full.set()
+
+        if is_leader:
+            if wait:
+                batch.full.wait(self._max_wait)
+
+            with self._lock:
+                if self._batches.get(key) is batch:
+                    del self._batches[key]
+                self._in_flight[key] = self._in_flight.get(key, 0) + 1
+
+            try:
+                self._flush(batch)
+            finally:
+                with self._lock:
+                    self._in_flight[key] -= 1
+                    if not self._in_flight[key]:
+                        del self._in_flight[key]
+
+        return future.result()
+
+    @staticmethod
+    def _flush(batch: _QueryBatch) -> None:
+        texts = list(dict.fromkeys(batch.texts))
+        try:
+            if len(texts) == 1:
+                vectors = {texts[0]: batch.embeddings.client.embed_query(texts[0])}
+            else:
+                vectors = dict(zip(texts, batch.embeddings.client.embed_documents(texts)))
+        except Exception as ex:
+            for future in batch.futures:
+                future.set_exception(ex)
+            return
+
+        for text, future in zip(batch.texts, batch.futures):
+            future.set_result(vectors[text])
+
+    @staticmethod
+    def _batch_key(embeddings: BaseEmbedding) -> Tuple[str, str, str]:
+        provider = embeddings.model_provider.provider
+        return provider.tenant_id, provider.provider_name, embeddings.name
+
+
+_query_batcher: Optional[EmbeddingQueryBatcher] = None
+_query_batcher_lock = threading.Lock()
+
+
+def get_query_batcher() -> EmbeddingQueryBatcher:
+    global _query_batcher
+    if _query_batcher is None:
+        with _query_batcher_lock:
+            if _query_batcher is None:
+                _query_batcher = EmbeddingQueryBatcher(
+                    max_batch_size=int(current_app.config.get('EMBEDDING_QUERY_BATCH_MAX_SIZE')),
+                    max_wait_ms=int(current_app.config.get('EMBEDDING_QUERY_BATCH_MAX_WAIT_MS'))
+                )
+
+    return _query_batcher
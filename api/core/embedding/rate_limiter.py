@@ -0,0 +1,98 @@
+import threading
+import time
+from typing import Optional, Dict, Tuple
+
+from flask import current_app
+
+from core.model_providers.models.embedding.base import BaseEmbedding
+
+
+class EmbeddingRateLimiter:
+    """
+    Token bucket shared by all embedding requests of one tenant to one provider.
+
+    The refill rate starts at the provider's requests per minute. It is halved on every
+    rate limit error and recovers step by step on successful requests, so parallel
+    indexing backs off on its own when the provider pushes back.
+    """
+
+    MIN_RATE_FACTOR = 0.05
+    RECOVERY_STEP = 0.05
+
+    def __init__(self, requests_per_minute: int, max_concurrency: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self._rate = requests_per_minute / 60
+        self._capacity = max(1.0, float(self.max_concurrency))
+        self._tokens = self._capacity
+        self._rate_factor = 1.0
+        self._last_refill_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a request may be sent."""
+        if self._rate <= 0:
+            return
+
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / (self._rate * self._rate_factor)
+
+            time.sleep(wait)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._rate_factor = min(1.0, self._rate_factor + self.RECOVERY_STEP)
+
+    def on_rate_limited(self) -> float:
+        """
+        Slow down the refill rate after a rate limit error.
+
+        :return: seconds the caller should wait before retrying
+        """
+        with self._lock:
+            self._refill()
+            self._rate_factor = max(self.MIN_RATE_FACTOR, self._rate_factor / 2)
+            self._tokens = 0
+            return 1 / (self._rate * self._rate_factor) if self._rate > 0 else 1.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last_refill_at
+        self._last_refill_at = now
+        self._tokens = min(self._capacity, self._tokens + elapsed * self._rate * self._rate_factor)
+
+
+_rate_limiters: Dict[Tuple[str, str], EmbeddingRateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(embeddings: BaseEmbedding) -> EmbeddingRateLimiter:
+    """
+    Get the rate limiter of the tenant and provider of the embedding model.
+
+    Limits come from `embedding_rate_limit` in the provider rules, falling back to
+    EMBEDDING_RATE_LIMIT_RPM. The concurrency is capped by EMBEDDING_MAX_CONCURRENCY.
+    """
+    provider = embeddings.model_provider.provider
+    key = (provider.tenant_id, provider.provider_name)
+
+    rate_limiter: Optional[EmbeddingRateLimiter] = _rate_limiters.get(key)
+    if rate_limiter is None:
+        with _rate_limiters_lock:
+            rate_limiter = _rate_limiters.get(key)
+            if rate_limiter is None:
+                rules = embeddings.model_provider.get_rules().get('embedding_rate_limit', {})
+                max_concurrency = int(current_app.config.get('EMBEDDING_MAX_CONCURRENCY'))
+                rate_limiter = EmbeddingRateLimiter(
+                    requests_per_minute=int(rules.get(
+                        'requests_per_minute', current_app.config.get('EMBEDDING_RATE_LIMIT_RPM'))),
+                    max_concurrency=min(int(rules.get('max_concurrency', max_concurrency)), max_concurrency)
+                )
+                _rate_limiters[key] = rate_limiter
+
+    return rate_limiter
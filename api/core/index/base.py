@@ -4,10 +4,12 @@ from typing import List, Any
 
 from langchain.schema import Document, BaseRetriever
 
+from libs import helper
 from models.dataset import Dataset
 
 
 class BaseIndex(ABC):
+    DUPLICATE_CHECK_BATCH_SIZE = 1000
 
     def __init__(self, dataset: Dataset):
         self.dataset = dataset
@@ -43,17 +45,27 @@ class BaseIndex(ABC):
     ) -> List[Document]:
         raise NotImplementedError
 
+    async def asearch(
+            self, query: str,
+            **kwargs: Any
+    ) -> List[Document]:
+        """Search without blocking the event loop, indexes with async clients override it."""
+        return await helper.run_in_app_context(self.search, query, **kwargs)
+
     def delete(self) -> None:
         raise NotImplementedError
 
+    def get_existing_ids(self, ids: list[str]) -> set[str]:
+        """Get the ids that exist in the index, indexes that can look up many ids at once override it."""
+        return {id for id in ids if self.text_exists(id)}
+
     def _filter_duplicate_texts(self, texts: list[Document]) -> list[Document]:
-        for text in texts:
-            doc_id = text.metadata['doc_id']
-            exists_duplicate_node = self.text_exists(doc_id)
-            if exists_duplicate_node:
-                texts.remove(text)
+        uuids = self._get_uuids(texts)
+        existing_ids = set()
+        for i in range(0, len(uuids), self.DUPLICATE_CHECK_BATCH_SIZE):
+            existing_ids.update(self.get_existing_ids(uuids[i:i + self.DUPLICATE_CHECK_BATCH_SIZE]))
 
-        return texts
+        return [text for text in texts if text.metadata['doc_id'] not in existing_ids]
 
     def _get_uuids(self, texts: list[Document]) -> list[str]:
         return [text.metadata['doc_id'] for text in texts]
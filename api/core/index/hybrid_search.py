@@ -0,0 +1,188 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Optional, Dict, Tuple
+
+from flask import current_app, Flask
+from langchain.schema import Document
+from pydantic import BaseModel
+
+from core.index.base import BaseIndex
+
+# shared by the searches of the process, a search only waits for its sides up to its latency budget
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='hybrid_search')
+
+
+class HybridSearchConfig(BaseModel):
+    fusion: str = 'rrf'
+    vector_weight: float = 0.5
+    keyword_weight: float = 0.5
+    rrf_k: int = 60
+    latency_budget_ms: Optional[int] = None
+
+    @classmethod
+    def from_retrieval_config(cls, retrieval_config: Optional[dict]) -> Optional['HybridSearchConfig']:
+        """Get the hybrid search config of a dataset's retrieval config, None when it does not use hybrid search."""
+        if not retrieval_config or retrieval_config.get('search_method') != 'hybrid':
+            return None
+
+        return cls(**{key: value for key, value in retrieval_config.items() if key in cls.__fields__})
+
+
+class HybridSearch:
+    """
+    Search a dataset's vector and keyword indexes concurrently and fuse the two rankings.
+
+    Fusion is reciprocal rank fusion (rrf), or a weighted sum of the min-max normalized
+    scores of each side (weighted). The results are sorted by their fused score, kept in
+    metadata['fused_score'], and keep the scores of their sides. When the latency budget
+    runs out, the results of the sides that finished in time are fused, the others are dropped.
+    """
+
+    FUSION_LIST = ['rrf', 'weighted']
+
+    def __init__(self, vector_index: BaseIndex, keyword_index: BaseIndex, config: HybridSearchConfig):
+        if config.fusion not in self.FUSION_LIST:
+            raise ValueError(f"Hybrid search fusion {config.fusion} is not supported.")
+
+        self._vector_index = vector_index
+        self._keyword_index = keyword_index
+        self._config = config
+        # whether the last search dropped a side that missed the latency budget
+        self.timed_out = False
+
+    def search(self, query: str, k: int = 4) -> List[Document]:
+        if k <= 0:
+            return []
+
+        latency_budget_ms = self._config.latency_budget_ms
+        if latency_budget_ms is None:
+            latency_budget_ms = current_app.config['HYBRID_SEARCH_LATENCY_BUDGET_MS']
+
+        flask_app = current_app._get_current_object()
+        vector_future = _executor.submit(self._search_vector, flask_app, query, k)
+        keyword_future = _executor.submit(self._search_keyword, flask_app, query, k)
+        futures = [vector_future, keyword_future]
+
+        done, not_done = wait(futures, timeout=latency_budget_ms / 1000 if latency_budget_ms > 0 else None)
+        self.timed_out = len(not_done) > 0
+        if not done:
+            # nothing finished in time, take whichever side comes first
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+
+        return self._fuse(vector_future, keyword_future, done, k)
+
+    async def asearch(self, query: str, k: int = 4) -> List[Document]:
+        if k <= 0:
+            return []
+
+        latency_budget_ms = self._config.latency_budget_ms
+        if latency_budget_ms is None:
+            latency_budget_ms = current_app.config['HYBRID_SEARCH_LATENCY_BUDGET_MS']
+
+        vector_task = asyncio.ensure_future(self._vector_index.asearch(
+            query,
+            search_type='similarity_score_threshold',
+            search_kwargs={
+                'k': k
+            }
+        ))
+        keyword_task = asyncio.ensure_future(self._keyword_index.asearch(query, search_kwargs={'k': k}))
+        tasks = [vector_task, keyword_task]
+
+        done, not_done = await asyncio.wait(tasks, timeout=latency_budget_ms / 1000 if latency_budget_ms > 0 else None)
+        self.timed_out = len(not_done) > 0
+        if not done:
+            # nothing finished in time, take whichever side comes first
+            done, not_done = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+
+        for task in not_done:
+            task.cancel()
+
+        return self._fuse(vector_task, keyword_task, done, k)
+
+    def _fuse(self, vector_future, keyword_future, done: set, k: int) -> List[Document]:
+        """Fuse the rankings of the finished sides, the futures are concurrent futures or asyncio tasks."""
+        rankings = []
+        for future, weight, score_key in ((vector_future, self._config.vector_weight, 'score'),
+                                          (keyword_future, self._config.keyword_weight, 'bm25_score')):
+            if future not in done:
+                continue
+
+            try:
+                rankings.append((future.result(), weight, score_key))
+            except Exception:
+                logging.exception('Hybrid search failed on one side')
+
+        if self._config.fusion == 'weighted':
+            return self._fuse_weighted(rankings, k)
+
+        return self._fuse_rrf(rankings, k)
+
+    def _search_vector(self, flask_app: Flask, query: str, k: int) -> List[Document]:
+        with flask_app.app_context():
+            return self._vector_index.search(
+                query,
+                search_type='similarity_score_threshold',
+                search_kwargs={
+                    'k': k
+                }
+            )
+
+    def _search_keyword(self, flask_app: Flask, query: str, k: int) -> List[Document]:
+        with flask_app.app_context():
+            return self._keyword_index.search(query, search_kwargs={'k': k})
+
+    def _fuse_rrf(self, rankings: List[Tuple[List[Document], float, str]], k: int) -> List[Document]:
+        scores: Dict[str, float] = {}
+        documents: Dict[str, Document] = {}
+        for ranking, weight, _ in rankings:
+            for rank, document in enumerate(ranking, start=1):
+                doc_id = document.metadata['doc_id']
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight / (self._config.rrf_k + rank)
+                documents.setdefault(doc_id, document)
+
+        return self._top_documents(documents, scores, k)
+
+    def _fuse_weighted(self, rankings: List[Tuple[List[Document], float, str]], k: int) -> List[Document]:
+        scores: Dict[str, float] = {}
+        documents: Dict[str, Document] = {}
+        for ranking, weight, score_key in rankings:
+            for doc_id, score in self._normalize_scores(ranking, score_key).items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight * score
+
+            for document in ranking:
+                documents.setdefault(document.metadata['doc_id'], document)
+
+        return self._top_documents(documents, scores, k)
+
+    @staticmethod
+    def _normalize_scores(ranking: List[Document], score_key: str) -> Dict[str, float]:
+        """Min-max normalize the scores of a ranking, or derive them from the ranks when it has none."""
+        if not ranking:
+            return {}
+
+        if any(document.metadata.get(score_key) is None for document in ranking):
+            return {document.metadata['doc_id']: 1 - rank / len(ranking) for rank, document in enumerate(ranking)}
+
+        raw_scores = [document.metadata[score_key] for document in ranking]
+        min_score, max_score = min(raw_scores), max(raw_scores)
+        if max_score == min_score:
+            return {document.metadata['doc_id']: 1.0 for document in ranking}
+
+        return {
+            document.metadata['doc_id']: (document.metadata[score_key] - min_score) / (max_score - min_score)
+            for document in ranking
+        }
+
+    @staticmethod
+    def _top_documents(documents: Dict[str, Document], scores: Dict[str, float], k: int) -> List[Document]:
+        top_documents = []
+        for doc_id in sorted(scores, key=lambda doc_id: (-scores[doc_id], doc_id))[:k]:
+            document = documents[doc_id]
+            top_documents.append(Document(
+                page_content=document.page_content,
+                metadata={**document.metadata, 'fused_score': scores[doc_id]}
+            ))
+
+        return top_documents
@@ -42,7 +42,8 @@ class IndexBuilder:
             return KeywordTableIndex(
                 dataset=dataset,
                 config=KeywordTableConfig(
-                    max_keywords_per_chunk=10
+                    max_keywords_per_chunk=10,
+                    scoring_mode=current_app.config['KEYWORD_TABLE_SCORING_MODE']
                 )
             )
         else:
@@ -1,11 +1,21 @@
+import logging
+import math
+import multiprocessing
+import os
 import re
-from typing import Set
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Set, List, Optional
 
 import jieba
 from jieba.analyse import default_tfidf
 
 from core.index.keyword_table_index.stopwords import STOPWORDS
 
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+_extraction_pool_pid: Optional[int] = None
+_extraction_pool_lock = threading.Lock()
+
 
 class JiebaKeywordTableHandler:
 
@@ -21,6 +31,29 @@ class JiebaKeywordTableHandler:
 
         return set(self._expand_tokens_with_subtokens(keywords))
 
+    def extract_keywords_batch(self, texts: List[str], max_keywords_per_chunk: int = 10,
+                               processes: int = 0) -> List[Set[str]]:
+        """
+        Extract keywords of many texts, fanned out to a process pool when processes is above 0.
+
+        Falls back to extracting in the current process when the pool can not be used.
+        """
+        pool = _get_extraction_pool(processes) if processes > 0 and len(texts) > 1 else None
+        if pool:
+            chunksize = max(1, math.ceil(len(texts) / (processes * 4)))
+            try:
+                return list(pool.map(
+                    _extract_keywords_in_worker,
+                    texts,
+                    [max_keywords_per_chunk] * len(texts),
+                    chunksize=chunksize
+                ))
+            except Exception:
+                logging.exception('Failed to extract keywords in process pool')
+                _shutdown_extraction_pool()
+
+        return [self.extract_keywords(text, max_keywords_per_chunk) for text in texts]
+
     def _expand_tokens_with_subtokens(self, tokens: Set[str]) -> Set[str]:
         """Get subtokens from a list of tokens., filtering for stopwords."""
         results = set()
@@ -30,4 +63,59 @@ class JiebaKeywordTableHandler:
             if len(sub_tokens) > 1:
                 results.update({w for w in sub_tokens if w not in list(STOPWORDS)})
 
-        return results
\ No newline at end of file
+        return results
+
+
+def warm_up_keyword_extraction(processes: int = 0) -> None:
+    """
+    Build the jieba dictionary of the current process and start the extraction pool,
+    so that the first indexing task does not pay for it.
+    """
+    _init_extraction_worker()
+
+    pool = _get_extraction_pool(processes) if processes > 0 else None
+    if pool:
+        try:
+            # every worker runs the initializer when it is started
+            for future in [pool.submit(os.getpid) for _ in range(processes)]:
+                future.result()
+        except Exception:
+            logging.exception('Failed to warm up keyword extraction pool')
+            _shutdown_extraction_pool()
+
+
+def _init_extraction_worker() -> None:
+    jieba.initialize()
+    default_tfidf.stop_words = STOPWORDS
+
+
+def _extract_keywords_in_worker(text: str, max_keywords_per_chunk: int) -> Set[str]:
+    return JiebaKeywordTableHandler().extract_keywords(text, max_keywords_per_chunk)
+
+
+def _get_extraction_pool(processes: int) -> Optional[ProcessPoolExecutor]:
+    global _extraction_pool, _extraction_pool_pid
+
+    # daemonic processes, such as prefork celery workers, are not allowed to have children
+    if multiprocessing.current_process().daemon:
+        return None
+
+    with _extraction_pool_lock:
+        # a pool inherited through fork belongs to the parent process
+        if _extraction_pool is None or _extraction_pool_pid != os.getpid():
+            _extraction_pool = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_extraction_worker
+            )
+            _extraction_pool_pid = os.getpid()
+
+        return _extraction_pool
+
+
+def _shutdown_extraction_pool() -> None:
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is not None and _extraction_pool_pid == os.getpid():
+            _extraction_pool.shutdown(wait=False, cancel_futures=True)
+        _extraction_pool = None
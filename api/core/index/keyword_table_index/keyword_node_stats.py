@@ -0,0 +1,108 @@
+import logging
+from typing import Dict, List, Tuple
+
+from sqlalchemy import func
+
+from extensions.ext_database import db
+from extensions.ext_redis import redis_client
+from models.dataset import DocumentSegment
+
+
+class KeywordNodeStats:
+    """
+    Node count and total node length of a dataset's keyword index, kept in a redis hash for BM25 scoring.
+
+    The totals are updated with HINCRBY as nodes are added to or removed from the index. When the
+    hash is missing, it is rebuilt from the word counts of the dataset's segments on the next read.
+    The hash expires after STATS_TTL, so that drift from updates racing a rebuild does not last.
+    """
+
+    STATS_TTL = 3600
+    # set by the rebuild, increments on a missing hash create one without it, which is rebuilt
+    BUILT_FIELD = b'built'
+
+    def __init__(self, dataset_id: str):
+        self._dataset_id = dataset_id
+        self._totals_key = 'keyword_node_totals:{}'.format(dataset_id)
+
+    def add(self, node_lengths: Dict[str, int]) -> None:
+        self._increment(len(node_lengths), sum(node_lengths.values()))
+
+    def remove(self, node_lengths: Dict[str, int]) -> None:
+        self._increment(-len(node_lengths), -sum(node_lengths.values()))
+
+    def get(self) -> Tuple[int, float]:
+        """
+        Get the node count and average node length of the dataset.
+
+        :return: node count, average node length
+        """
+        try:
+            totals = redis_client.hgetall(self._totals_key)
+            if self.BUILT_FIELD not in totals:
+                totals = self._rebuild()
+
+            node_count = int(totals[b'node_count'])
+            total_length = int(totals[b'total_length'])
+        except Exception:
+            logging.exception('Failed to get keyword node stats')
+            node_count, total_length = self._get_totals()
+
+        average_length = total_length / node_count if node_count > 0 else 0.0
+        return node_count, average_length
+
+    def get_node_lengths(self, node_ids: List[str]) -> Dict[str, int]:
+        """Get the lengths of the given nodes, the word counts of their segments."""
+        if not node_ids:
+            return {}
+
+        segments = db.session.query(DocumentSegment.index_node_id, DocumentSegment.word_count).filter(
+            DocumentSegment.dataset_id == self._dataset_id,
+            DocumentSegment.index_node_id.in_(node_ids)
+        ).all()
+
+        return {segment.index_node_id: segment.word_count for segment in segments}
+
+    def clear(self) -> None:
+        try:
+            redis_client.delete(self._totals_key)
+        except Exception:
+            logging.exception('Failed to clear keyword node stats')
+
+    def _increment(self, node_count: int, total_length: int) -> None:
+        if not node_count:
+            return
+
+        try:
+            pipeline = redis_client.pipeline()
+            pipeline.hincrby(self._totals_key, 'node_count', node_count)
+            pipeline.hincrby(self._totals_key, 'total_length', total_length)
+            pipeline.execute()
+        except Exception:
+            logging.exception('Failed to update keyword node stats')
+            self.clear()
+
+    def _get_totals(self) -> Tuple[int, int]:
+        node_count, total_length = db.session.query(
+            func.count(DocumentSegment.id),
+            func.coalesce(func.sum(DocumentSegment.word_count), 0)
+        ).filter(
+            DocumentSegment.dataset_id == self._dataset_id,
+            DocumentSegment.index_node_id.isnot(None),
+            DocumentSegment.status == 'completed',
+            DocumentSegment.enabled == True
+        ).one()
+
+        return int(node_count), int(total_length)
+
+    def _rebuild(self) -> dict:
+        node_count, total_length = self._get_totals()
+        totals = {b'node_count': node_count, b'total_length': total_length, self.BUILT_FIELD: 1}
+
+        pipeline = redis_client.pipeline()
+        pipeline.delete(self._totals_key)
+        pipeline.hset(self._totals_key, mapping=totals)
+        pipeline.expire(self._totals_key, self.STATS_TTL)
+        pipeline.execute()
+
+        return totals
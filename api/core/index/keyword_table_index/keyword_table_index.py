@@ -1,71 +1,82 @@
 import json
+import logging
+import math
+import threading
+import uuid
 from collections import defaultdict
-from typing import Any, List, Optional, Dict
+from typing import Any, List, Optional, Dict, Tuple, Set
 
+from cachetools import TTLCache
+from flask import current_app
 from langchain.schema import Document, BaseRetriever
 from pydantic import BaseModel, Field, Extra
+from sqlalchemy.dialects.postgresql import insert
 
 from core.index.base import BaseIndex
 from core.index.keyword_table_index.jieba_keyword_table_handler import JiebaKeywordTableHandler
+from core.index.keyword_table_index.keyword_node_stats import KeywordNodeStats
 from extensions.ext_database import db
-from models.dataset import Dataset, DocumentSegment, DatasetKeywordTable
+from extensions.ext_redis import redis_client
+from models.dataset import Dataset, DocumentSegment, DatasetKeywordTable, DatasetKeywordNode
+
+
+_keyword_table_cache: Optional[TTLCache] = None
+_keyword_table_cache_lock = threading.Lock()
 
 
 class KeywordTableConfig(BaseModel):
     max_keywords_per_chunk: int = 10
+    scoring_mode: str = 'keyword_count'
 
 
 class KeywordTableIndex(BaseIndex):
+    KEYWORD_NODE_BATCH_SIZE = 1000
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+
     def __init__(self, dataset: Dataset, config: KeywordTableConfig = KeywordTableConfig()):
         super().__init__(dataset)
         self._config = config
 
     def create(self, texts: list[Document], **kwargs) -> BaseIndex:
-        keyword_table_handler = JiebaKeywordTableHandler()
-        keyword_table = {}
-        for text in texts:
-            keywords = keyword_table_handler.extract_keywords(text.page_content, self._config.max_keywords_per_chunk)
+        node_keywords = {}
+        for text, keywords in zip(texts, self._extract_texts_keywords(texts)):
             self._update_segment_keywords(self.dataset.id, text.metadata['doc_id'], list(keywords))
-            keyword_table = self._add_text_to_keyword_table(keyword_table, text.metadata['doc_id'], list(keywords))
+            node_keywords[text.metadata['doc_id']] = list(keywords)
 
-        dataset_keyword_table = DatasetKeywordTable(
-            dataset_id=self.dataset.id,
-            keyword_table=json.dumps({
-                '__type__': 'keyword_table',
-                '__data__': {
-                    "index_id": self.dataset.id,
-                    "summary": None,
-                    "table": {}
-                }
-            }, cls=SetEncoder)
-        )
-        db.session.add(dataset_keyword_table)
-        db.session.commit()
-
-        self._save_dataset_keyword_table(keyword_table)
+        self._create_dataset_keyword_table()
+        self._add_node_keywords(node_keywords)
+        KeywordNodeStats(self.dataset.id).add({text.metadata['doc_id']: len(text.page_content) for text in texts})
 
         return self
 
     def add_texts(self, texts: list[Document], **kwargs):
-        keyword_table_handler = JiebaKeywordTableHandler()
-
-        keyword_table = self._get_dataset_keyword_table()
-        for text in texts:
-            keywords = keyword_table_handler.extract_keywords(text.page_content, self._config.max_keywords_per_chunk)
+        node_keywords = {}
+        for text, keywords in zip(texts, self._extract_texts_keywords(texts)):
             self._update_segment_keywords(self.dataset.id, text.metadata['doc_id'], list(keywords))
-            keyword_table = self._add_text_to_keyword_table(keyword_table, text.metadata['doc_id'], list(keywords))
+            node_keywords[text.metadata['doc_id']] = list(keywords)
 
-        self._save_dataset_keyword_table(keyword_table)
+        self._add_node_keywords(node_keywords)
+        KeywordNodeStats(self.dataset.id).add({text.metadata['doc_id']: len(text.page_content) for text in texts})
 
     def text_exists(self, id: str) -> bool:
-        keyword_table = self._get_dataset_keyword_table()
-        return id in set.union(*keyword_table.values())
+        if self._is_normalized():
+            return db.session.query(
+                db.session.query(DatasetKeywordNode).filter(
+                    DatasetKeywordNode.dataset_id == self.dataset.id,
+                    DatasetKeywordNode.node_id == id
+                ).exists()
+            ).scalar()
 
-    def delete_by_ids(self, ids: list[str]) -> None:
-        keyword_table = self._get_dataset_keyword_table()
-        keyword_table = self._delete_ids_from_keyword_table(keyword_table, ids)
+        keyword_table = self._get_cached_dataset_keyword_table()
+        node_keywords = self._get_node_keywords([id])
+        if id in node_keywords:
+            return any(id in keyword_table.get(keyword, set()) for keyword in node_keywords[id])
 
-        self._save_dataset_keyword_table(keyword_table)
+        return any(id in node_idxs for node_idxs in keyword_table.values())
+
+    def delete_by_ids(self, ids: list[str]) -> None:
+        self._delete_node_ids(ids)
 
     def delete_by_document_id(self, document_id: str):
         # get segment ids by document_id
@@ -76,10 +87,7 @@ class KeywordTableIndex(BaseIndex):
 
         ids = [segment.index_node_id for segment in segments]
 
-        keyword_table = self._get_dataset_keyword_table()
-        keyword_table = self._delete_ids_from_keyword_table(keyword_table, ids)
-
-        self._save_dataset_keyword_table(keyword_table)
+        self._delete_node_ids(ids)
 
     def get_retriever(self, **kwargs: Any) -> BaseRetriever:
         return KeywordTableRetriever(index=self, **kwargs)
@@ -88,37 +96,147 @@ class KeywordTableIndex(BaseIndex):
             self, query: str,
             **kwargs: Any
     ) -> List[Document]:
-        keyword_table = self._get_dataset_keyword_table()
-
         search_kwargs = kwargs.get('search_kwargs') if kwargs.get('search_kwargs') else {}
         k = search_kwargs.get('k') if search_kwargs.get('k') else 4
 
-        sorted_chunk_indices = self._retrieve_ids_by_query(keyword_table, query, k)
+        keywords = self._extract_query_keywords(query)
+        keyword_table = self._get_keyword_table_by_keywords(keywords)
 
-        documents = []
-        for chunk_index in sorted_chunk_indices:
-            segment = db.session.query(DocumentSegment).filter(
+        if self._config.scoring_mode == 'bm25':
+            scored_chunk_indices = self._retrieve_ids_by_bm25(keyword_table, keywords, k)
+        else:
+            scored_chunk_indices = [
+                (chunk_index, None) for chunk_index in self._retrieve_ids_by_keywords(keyword_table, keywords, k)
+            ]
+
+        segments = {}
+        if scored_chunk_indices:
+            segments = {segment.index_node_id: segment for segment in db.session.query(DocumentSegment).filter(
                 DocumentSegment.dataset_id == self.dataset.id,
-                DocumentSegment.index_node_id == chunk_index
-            ).first()
+                DocumentSegment.index_node_id.in_([chunk_index for chunk_index, _ in scored_chunk_indices])
+            ).all()}
 
+        documents = []
+        for chunk_index, score in scored_chunk_indices:
+            segment = segments.get(chunk_index)
             if segment:
+                metadata = {
+                    "doc_id": chunk_index,
+                    "document_id": segment.document_id,
+                    "dataset_id": segment.dataset_id,
+                }
+                if score is not None:
+                    # bm25 scores are unbounded, unlike the similarity scores of vector search
+                    metadata['bm25_score'] = score
+
                 documents.append(Document(
                     page_content=segment.content,
-                    metadata={
-                        "doc_id": chunk_index,
-                        "document_id": segment.document_id,
-                        "dataset_id": segment.dataset_id,
-                    }
+                    metadata=metadata
                 ))
 
         return documents
 
     def delete(self) -> None:
+        db.session.query(DatasetKeywordNode).filter(DatasetKeywordNode.dataset_id == self.dataset.id).delete()
+
         dataset_keyword_table = self.dataset.dataset_keyword_table
         if dataset_keyword_table:
             db.session.delete(dataset_keyword_table)
+
+        db.session.commit()
+
+        self._bump_keyword_table_version()
+        KeywordNodeStats(self.dataset.id).clear()
+
+    def _is_normalized(self) -> bool:
+        storage_type = db.session.query(DatasetKeywordTable.storage_type).filter(
+            DatasetKeywordTable.dataset_id == self.dataset.id
+        ).scalar()
+
+        if storage_type is None:
+            storage_type = self._create_dataset_keyword_table().storage_type
+
+        return storage_type == 'normalized'
+
+    def _add_node_keywords(self, node_keywords: Dict[str, List[str]]):
+        keyword_table = None if self._is_normalized() else self._lock_json_keyword_table()
+        if keyword_table is None:
+            keyword_nodes = [
+                {'dataset_id': self.dataset.id, 'keyword': keyword, 'node_id': node_id}
+                for node_id, keywords in node_keywords.items()
+                for keyword in keywords
+            ]
+
+            for i in range(0, len(keyword_nodes), self.KEYWORD_NODE_BATCH_SIZE):
+                db.session.execute(
+                    insert(DatasetKeywordNode).values(
+                        keyword_nodes[i:i + self.KEYWORD_NODE_BATCH_SIZE]
+                    ).on_conflict_do_nothing(
+                        index_elements=['dataset_id', 'keyword', 'node_id']
+                    )
+                )
+
             db.session.commit()
+            return
+
+        for node_id, keywords in node_keywords.items():
+            keyword_table = self._add_text_to_keyword_table(keyword_table, node_id, keywords)
+
+        self._save_dataset_keyword_table(keyword_table)
+
+    def _delete_node_ids(self, ids: list[str]):
+        keyword_node_stats = KeywordNodeStats(self.dataset.id)
+        keyword_node_stats.remove(keyword_node_stats.get_node_lengths(ids))
+
+        keyword_table = None if self._is_normalized() else self._lock_json_keyword_table()
+        if keyword_table is None:
+            for i in range(0, len(ids), self.KEYWORD_NODE_BATCH_SIZE):
+                db.session.query(DatasetKeywordNode).filter(
+                    DatasetKeywordNode.dataset_id == self.dataset.id,
+                    DatasetKeywordNode.node_id.in_(ids[i:i + self.KEYWORD_NODE_BATCH_SIZE])
+                ).delete(synchronize_session=False)
+
+            db.session.commit()
+            return
+
+        keyword_table = self._delete_ids_from_keyword_table(keyword_table, ids)
+
+        self._save_dataset_keyword_table(keyword_table)
+
+    def _lock_json_keyword_table(self) -> Optional[dict]:
+        """
+        Lock the keyword table row until the write commits, and get its json table.
+
+        The storage type is checked again under the lock, None when the table has been
+        migrated to the normalized storage since it was read.
+        """
+        dataset_keyword_table = db.session.query(DatasetKeywordTable).filter(
+            DatasetKeywordTable.dataset_id == self.dataset.id
+        ).with_for_update().populate_existing().first()
+
+        if dataset_keyword_table.storage_type == 'normalized':
+            db.session.commit()
+            return None
+
+        keyword_table_dict = dataset_keyword_table.keyword_table_dict
+        return keyword_table_dict['__data__']['table'] if keyword_table_dict else {}
+
+    def _get_keyword_table_by_keywords(self, keywords: List[str]) -> dict:
+        """Get the keyword table restricted to the given keywords."""
+        if self._is_normalized():
+            keyword_table = {}
+            if keywords:
+                keyword_nodes = db.session.query(DatasetKeywordNode.keyword, DatasetKeywordNode.node_id).filter(
+                    DatasetKeywordNode.dataset_id == self.dataset.id,
+                    DatasetKeywordNode.keyword.in_(keywords)
+                ).all()
+
+                for keyword, node_id in keyword_nodes:
+                    keyword_table.setdefault(keyword, set()).add(node_id)
+
+            return keyword_table
+
+        return self._get_cached_dataset_keyword_table()
 
     def _save_dataset_keyword_table(self, keyword_table):
         keyword_table_dict = {
@@ -132,28 +250,99 @@ class KeywordTableIndex(BaseIndex):
         self.dataset.dataset_keyword_table.keyword_table = json.dumps(keyword_table_dict, cls=SetEncoder)
         db.session.commit()
 
+        self._bump_keyword_table_version()
+
+    def _create_dataset_keyword_table(self) -> DatasetKeywordTable:
+        dataset_keyword_table = DatasetKeywordTable(
+            dataset_id=self.dataset.id,
+            keyword_table=json.dumps({
+                '__type__': 'keyword_table',
+                '__data__': {
+                    "index_id": self.dataset.id,
+                    "summary": None,
+                    "table": {}
+                }
+            }, cls=SetEncoder),
+            storage_type=current_app.config['KEYWORD_TABLE_STORAGE']
+        )
+        db.session.add(dataset_keyword_table)
+        db.session.commit()
+
+        return dataset_keyword_table
+
     def _get_dataset_keyword_table(self) -> Optional[dict]:
         dataset_keyword_table = self.dataset.dataset_keyword_table
         if dataset_keyword_table:
             if dataset_keyword_table.keyword_table_dict:
                 return dataset_keyword_table.keyword_table_dict['__data__']['table']
         else:
-            dataset_keyword_table = DatasetKeywordTable(
-                dataset_id=self.dataset.id,
-                keyword_table=json.dumps({
-                    '__type__': 'keyword_table',
-                    '__data__': {
-                        "index_id": self.dataset.id,
-                        "summary": None,
-                        "table": {}
-                    }
-                }, cls=SetEncoder)
-            )
-            db.session.add(dataset_keyword_table)
-            db.session.commit()
+            self._create_dataset_keyword_table()
 
         return {}
 
+    def _get_cached_dataset_keyword_table(self) -> dict:
+        """
+        Get the decoded keyword table for reading, reusing the one decoded by this process
+        while the version in redis is unchanged. The returned table must not be modified.
+
+        Versions are random, so a version key lost from redis comes back as a version no process
+        has cached. Cached tables expire after KEYWORD_TABLE_CACHE_TTL, which bounds how long
+        a table is served stale when bumping its version failed.
+        """
+        try:
+            version = self._get_keyword_table_version()
+        except Exception:
+            logging.exception('Failed to get keyword table version')
+            return self._get_dataset_keyword_table()
+
+        if version is None:
+            return self._get_dataset_keyword_table()
+
+        cache = self._get_keyword_table_cache()
+        with _keyword_table_cache_lock:
+            cached = cache.get(self.dataset.id)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        # the version is read before the table, a table changed in between is reloaded next time
+        keyword_table = self._get_dataset_keyword_table()
+        with _keyword_table_cache_lock:
+            cache[self.dataset.id] = (version, keyword_table)
+
+        return keyword_table
+
+    def _get_keyword_table_version(self) -> Optional[bytes]:
+        version_key = self._keyword_table_version_key(self.dataset.id)
+        version = redis_client.get(version_key)
+        if version is None:
+            redis_client.set(version_key, uuid.uuid4().hex, nx=True)
+            version = redis_client.get(version_key)
+
+        return version
+
+    def _bump_keyword_table_version(self):
+        try:
+            redis_client.set(self._keyword_table_version_key(self.dataset.id), uuid.uuid4().hex)
+        except Exception:
+            logging.exception('Failed to bump keyword table version')
+
+    @staticmethod
+    def _get_keyword_table_cache() -> TTLCache:
+        global _keyword_table_cache
+        if _keyword_table_cache is None:
+            with _keyword_table_cache_lock:
+                if _keyword_table_cache is None:
+                    _keyword_table_cache = TTLCache(
+                        maxsize=int(current_app.config.get('KEYWORD_TABLE_CACHE_SIZE')),
+                        ttl=int(current_app.config.get('KEYWORD_TABLE_CACHE_TTL'))
+                    )
+
+        return _keyword_table_cache
+
+    @staticmethod
+    def _keyword_table_version_key(dataset_id: str) -> str:
+        return 'keyword_table_version:{}'.format(dataset_id)
+
     def _add_text_to_keyword_table(self, keyword_table: dict, id: str, keywords: list[str]) -> dict:
         for keyword in keywords:
             if keyword not in keyword_table:
@@ -165,10 +354,18 @@ class KeywordTableIndex(BaseIndex):
         # get set of ids that correspond to node
         node_idxs_to_delete = set(ids)
 
+        # only visit the keywords of the nodes, unless a node has no keywords recorded on its segment
+        node_keywords = self._get_node_keywords(ids)
+        if node_idxs_to_delete.issubset(node_keywords.keys()):
+            keywords = set().union(*node_keywords.values())
+        else:
+            keywords = set(keyword_table.keys())
+
         # delete node_idxs from keyword to node idxs mapping
         keywords_to_delete = set()
-        for keyword, node_idxs in keyword_table.items():
-            if node_idxs_to_delete.intersection(node_idxs):
+        for keyword in keywords:
+            node_idxs = keyword_table.get(keyword)
+            if node_idxs and node_idxs_to_delete.intersection(node_idxs):
                 keyword_table[keyword] = node_idxs.difference(
                     node_idxs_to_delete
                 )
@@ -180,10 +377,38 @@ class KeywordTableIndex(BaseIndex):
 
         return keyword_table
 
+    def _get_node_keywords(self, ids: list[str]) -> Dict[str, List[str]]:
+        """Get the keywords of the nodes from their segments, the reverse of the keyword table."""
+        if not ids:
+            return {}
+
+        segments = db.session.query(DocumentSegment.index_node_id, DocumentSegment.keywords).filter(
+            DocumentSegment.dataset_id == self.dataset.id,
+            DocumentSegment.index_node_id.in_(ids)
+        ).all()
+
+        return {segment.index_node_id: segment.keywords for segment in segments if segment.keywords is not None}
+
     def _retrieve_ids_by_query(self, keyword_table: dict, query: str, k: int = 4):
+        keywords = self._extract_query_keywords(query)
+        if self._config.scoring_mode == 'bm25':
+            return [chunk_index for chunk_index, _ in self._retrieve_ids_by_bm25(keyword_table, keywords, k)]
+
+        return self._retrieve_ids_by_keywords(keyword_table, keywords, k)
+
+    def _extract_texts_keywords(self, texts: list[Document]) -> List[Set[str]]:
+        keyword_table_handler = JiebaKeywordTableHandler()
+        return keyword_table_handler.extract_keywords_batch(
+            [text.page_content for text in texts],
+            self._config.max_keywords_per_chunk,
+            processes=int(current_app.config.get('KEYWORD_EXTRACTION_PROCESSES'))
+        )
+
+    def _extract_query_keywords(self, query: str) -> List[str]:
         keyword_table_handler = JiebaKeywordTableHandler()
-        keywords = keyword_table_handler.extract_keywords(query)
+        return list(keyword_table_handler.extract_keywords(query))
 
+    def _retrieve_ids_by_keywords(self, keyword_table: dict, keywords: List[str], k: int = 4):
         # go through text chunks in order of most matching keywords
         chunk_indices_count: Dict[str, int] = defaultdict(int)
         keywords = [keyword for keyword in keywords if keyword in set(keyword_table.keys())]
@@ -199,6 +424,41 @@ class KeywordTableIndex(BaseIndex):
 
         return sorted_chunk_indices[: k]
 
+    def _retrieve_ids_by_bm25(self, keyword_table: dict, keywords: List[str], k: int = 4) -> List[Tuple[str, float]]:
+        """
+        Rank text chunks by BM25 over the query keywords.
+
+        Each keyword appears at most once per chunk, so a chunk scores the sum of the idf of its
+        matching keywords, normalized by the chunk length against the average chunk length.
+        """
+        keywords = [keyword for keyword in set(keywords) if keyword in keyword_table]
+        if not keywords:
+            return []
+
+        chunk_indices = set.union(*[set(keyword_table[keyword]) for keyword in keywords])
+        keyword_node_stats = KeywordNodeStats(self.dataset.id)
+        node_count, average_length = keyword_node_stats.get()
+        node_lengths = keyword_node_stats.get_node_lengths(list(chunk_indices))
+        node_count = max(node_count, len(chunk_indices))
+
+        chunk_idf: Dict[str, float] = defaultdict(float)
+        for keyword in keywords:
+            document_frequency = len(keyword_table[keyword])
+            idf = math.log(1 + (node_count - document_frequency + 0.5) / (document_frequency + 0.5))
+            for node_id in keyword_table[keyword]:
+                chunk_idf[node_id] += idf
+
+        chunk_scores = {}
+        for node_id, idf in chunk_idf.items():
+            length_ratio = node_lengths.get(node_id, average_length) / average_length if average_length else 1.0
+            chunk_scores[node_id] = idf * (self.BM25_K1 + 1) / (
+                1 + self.BM25_K1 * (1 - self.BM25_B + self.BM25_B * length_ratio)
+            )
+
+        sorted_chunk_indices = sorted(chunk_scores.items(), key=lambda x: (-x[1], x[0]))
+
+        return sorted_chunk_indices[: k]
+
     def _update_segment_keywords(self, dataset_id: str, node_id: str, keywords: List[str]):
         document_segment = db.session.query(DocumentSegment).filter(
             DocumentSegment.dataset_id == dataset_id,
@@ -209,15 +469,15 @@ class KeywordTableIndex(BaseIndex):
             db.session.commit()
 
     def create_segment_keywords(self, node_id: str, keywords: List[str]):
-        keyword_table = self._get_dataset_keyword_table()
         self._update_segment_keywords(self.dataset.id, node_id, keywords)
-        keyword_table = self._add_text_to_keyword_table(keyword_table, node_id, keywords)
-        self._save_dataset_keyword_table(keyword_table)
+        self._add_node_keywords({node_id: keywords})
+        keyword_node_stats = KeywordNodeStats(self.dataset.id)
+        keyword_node_stats.add(keyword_node_stats.get_node_lengths([node_id]))
 
     def update_segment_keywords_index(self, node_id: str, keywords: List[str]):
-        keyword_table = self._get_dataset_keyword_table()
-        keyword_table = self._add_text_to_keyword_table(keyword_table, node_id, keywords)
-        self._save_dataset_keyword_table(keyword_table)
+        self._add_node_keywords({node_id: keywords})
+        keyword_node_stats = KeywordNodeStats(self.dataset.id)
+        keyword_node_stats.add(keyword_node_stats.get_node_lengths([node_id]))
 
 class KeywordTableRetriever(BaseRetriever, BaseModel):
     index: KeywordTableIndex
@@ -241,7 +501,15 @@ class KeywordTableRetriever(BaseRetriever, BaseModel):
         return self.index.search(query, **self.search_kwargs)
 
     async def aget_relevant_documents(self, query: str) -> List[Document]:
-        raise NotImplementedError("KeywordTableRetriever does not support async")
+        """Get documents relevant for a query without blocking the event loop.
+
+        Args:
+            query: string to find relevant documents for
+
+        Returns:
+            List of relevant documents
+        """
+        return await self.index.asearch(query, **self.search_kwargs)
 
 
 class SetEncoder(json.JSONEncoder):
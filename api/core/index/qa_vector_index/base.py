@@ -14,6 +14,7 @@ from models.model import AppModelConfig, AppQADocument
 
 
 class BaseVectorIndex(BaseIndex):
+    DELETE_BATCH_SIZE = 1000
 
     def __init__(self, app_config: AppModelConfig, embeddings: Embeddings):
         self.app_config = app_config
@@ -73,6 +74,15 @@ class BaseVectorIndex(BaseIndex):
             search_kwargs=search_kwargs
         ).get_relevant_documents(query)
 
+    async def asearch(
+            self, query: str,
+            **kwargs: Any
+    ) -> List[Document]:
+        # embed the query with the async client, the search reads it from the embedding cache
+        await self._embeddings.aembed_query(query)
+
+        return await super().asearch(query, **kwargs)
+
     def get_retriever(self, **kwargs: Any) -> BaseRetriever:
         vector_store = self._get_vector_store()
         vector_store = cast(self._get_vector_store_class(), vector_store)
@@ -88,6 +98,8 @@ class BaseVectorIndex(BaseIndex):
 
         if kwargs.get('duplicate_check', False):
             texts = self._filter_duplicate_texts(texts)
+            if not texts:
+                return
 
         uuids = self._get_uuids(texts)
         vector_store.add_documents(texts, uuids=uuids)
@@ -98,6 +110,12 @@ class BaseVectorIndex(BaseIndex):
 
         return vector_store.text_exists(id)
 
+    def get_existing_ids(self, ids: list[str]) -> set[str]:
+        vector_store = self._get_vector_store()
+        vector_store = cast(self._get_vector_store_class(), vector_store)
+
+        return vector_store.get_existing_ids(ids)
+
     def delete_by_ids(self, ids: list[str]) -> None:
         if self._is_origin():
             self.recreate_dataset(self.app_config)
@@ -106,8 +124,8 @@ class BaseVectorIndex(BaseIndex):
         vector_store = self._get_vector_store()
         vector_store = cast(self._get_vector_store_class(), vector_store)
 
-        for node_id in ids:
-            vector_store.del_text(node_id)
+        for i in range(0, len(ids), self.DELETE_BATCH_SIZE):
+            self._delete_texts_by_ids(vector_store, ids[i:i + self.DELETE_BATCH_SIZE])
 
     def delete(self) -> None:
         vector_store = self._get_vector_store()
@@ -115,6 +133,11 @@ class BaseVectorIndex(BaseIndex):
 
         vector_store.delete()
 
+    def _delete_texts_by_ids(self, vector_store: VectorStore, ids: list[str]) -> None:
+        """Delete a batch of nodes, stores that can match many ids in one request override it."""
+        for node_id in ids:
+            vector_store.del_text(node_id)
+
     def _is_origin(self):
         return False
 
@@ -1,7 +1,6 @@
 import os
 from typing import Optional, Any, List, cast
 
-import qdrant_client
 from langchain.embeddings.base import Embeddings
 from langchain.schema import Document, BaseRetriever
 from langchain.vectorstores import VectorStore
@@ -9,6 +8,7 @@ from pydantic import BaseModel
 
 from core.index.base import BaseIndex
 from core.index.qa_vector_index.base import BaseVectorIndex
+from core.vector_store.qdrant_client_registry import get_qdrant_client
 from core.vector_store.qdrant_vector_store import QdrantVectorStore
 from models.model import AppModelConfig
 
@@ -80,7 +80,7 @@ class QdrantVectorIndex(BaseVectorIndex):
         attributes = ['doc_id', 'document_id', 'app_id', 'qa_answer']
         if self._is_origin():
             attributes = ['doc_id']
-        client = qdrant_client.QdrantClient(
+        client = get_qdrant_client(
             **self._client_config.to_qdrant_params()
         )
 
@@ -113,6 +113,20 @@ class QdrantVectorIndex(BaseVectorIndex):
             ],
         ))
 
+    def _delete_texts_by_ids(self, vector_store: VectorStore, ids: list[str]) -> None:
+        vector_store = cast(self._get_vector_store_class(), vector_store)
+
+        from qdrant_client.http import models
+
+        vector_store.del_texts(models.Filter(
+            must=[
+                models.FieldCondition(
+                    key="metadata.doc_id",
+                    match=models.MatchAny(any=ids),
+                ),
+            ],
+        ))
+
     def _is_origin(self):
         if self.app_config.qa_index_struct_dict:
             class_prefix: str = self.app_config.qa_index_struct_dict['vector_store']['class_prefix']
@@ -48,6 +48,20 @@ class VectorIndex:
                 ),
                 embeddings=embeddings
             )
+        elif vector_type == "numpy":
+            from core.index.qa_vector_index.numpy_vector_index import NumpyVectorIndex
+            from core.index.vector_index.numpy_vector_index import NumpyConfig
+
+            return NumpyVectorIndex(
+                app_config=app_config,
+                config=NumpyConfig(
+                    path=config.get('NUMPY_VECTOR_STORE_PATH'),
+                    root_path=current_app.root_path,
+                    ivf_threshold=int(config.get('NUMPY_VECTOR_STORE_IVF_THRESHOLD')),
+                    ivf_nprobe=int(config.get('NUMPY_VECTOR_STORE_IVF_NPROBE'))
+                ),
+                embeddings=embeddings
+            )
         else:
             raise ValueError(f"Vector store {config.get('VECTOR_STORE')} is not supported.")
 
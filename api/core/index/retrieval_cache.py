@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import re
+import uuid
+from typing import List, Optional
+
+from flask import current_app
+from langchain.schema import Document
+
+from extensions.ext_redis import redis_client
+from models.dataset import DocumentSegment
+
+
+class RetrievalCache:
+    """
+    Ranked search results of a dataset, kept in redis.
+
+    Entries hold the node ids and scores of a search, keyed by the dataset's content version,
+    the normalized query, k and the search type. Indexing tasks set a new random version whenever
+    they change the dataset's indexes, so entries of older versions are never read again and expire,
+    even when the version key itself was evicted. On a hit, the documents are loaded from the
+    segments that are still enabled.
+    """
+
+    # the scores of the search methods kept with the node ids
+    SCORE_KEYS = ('score', 'bm25_score', 'fused_score')
+
+    def __init__(self, dataset_id: str):
+        self._dataset_id = dataset_id
+        self._version_key = 'dataset_retrieval_version:{}'.format(dataset_id)
+
+    def get_version(self) -> Optional[str]:
+        """Get the content version of the dataset, None when the cache is disabled or unavailable."""
+        if not self._is_enabled():
+            return None
+
+        try:
+            version = redis_client.get(self._version_key)
+            if version is None:
+                redis_client.set(self._version_key, uuid.uuid4().hex, nx=True)
+                version = redis_client.get(self._version_key)
+        except Exception:
+            logging.exception('Failed to get dataset retrieval version')
+            return None
+
+        return version.decode() if version else None
+
+    def bump_version(self) -> None:
+        try:
+            redis_client.set(self._version_key, uuid.uuid4().hex)
+        except Exception:
+            logging.exception('Failed to bump dataset retrieval version')
+
+    def get(self, version: Optional[str], query: str, k: int, search_type: str) -> Optional[List[Document]]:
+        if version is None or not self._is_enabled():
+            return None
+
+        try:
+            value = redis_client.get(self._cache_key(version, query, k, search_type))
+        except Exception:
+            logging.exception('Failed to get dataset retrieval cache')
+            return None
+
+        if value is None:
+            return None
+
+        return self._load_documents(json.loads(value))
+
+    def set(self, version: Optional[str], query: str, k: int, search_type: str, documents: List[Document]) -> None:
+        if version is None or not self._is_enabled():
+            return
+
+        hits = []
+        for document in documents:
+            scores = {key: document.metadata[key] for key in self.SCORE_KEYS if key in document.metadata}
+            hits.append([document.metadata['doc_id'], scores])
+
+        try:
+            redis_client.setex(
+                self._cache_key(version, query, k, search_type),
+                current_app.config['DATASET_RETRIEVAL_CACHE_TTL'],
+                json.dumps(hits)
+            )
+        except Exception:
+            logging.exception('Failed to set dataset retrieval cache')
+
+    def _cache_key(self, version: str, query: str, k: int, search_type: str) -> str:
+        normalized_query = re.sub(r'\s+', ' ', query).strip()
+        query_hash = hashlib.sha256(normalized_query.encode()).hexdigest()
+
+        return 'dataset_retrieval:{}:{}:{}:{}:{}'.format(self._dataset_id, version, query_hash, k, search_type)
+
+    def _load_documents(self, hits: list) -> List[Document]:
+        if not hits:
+            return []
+
+        segments = DocumentSegment.query.filter(
+            DocumentSegment.dataset_id == self._dataset_id,
+            DocumentSegment.index_node_id.in_([doc_id for doc_id, _ in hits]),
+            DocumentSegment.status == 'completed',
+            DocumentSegment.enabled == True
+        ).all()
+        segment_map = {segment.index_node_id: segment for segment in segments}
+
+        documents = []
+        for doc_id, scores in hits:
+            segment = segment_map.get(doc_id)
+            if not segment:
+                continue
+
+            metadata = {
+                "doc_id": segment.index_node_id,
+                "doc_hash": segment.index_node_hash,
+                "document_id": segment.document_id,
+                "dataset_id": segment.dataset_id,
+            }
+            metadata.update(scores)
+
+            documents.append(Document(page_content=segment.content, metadata=metadata))
+
+        return documents
+
+    @staticmethod
+    def _is_enabled() -> bool:
+        return current_app.config['DATASET_RETRIEVAL_CACHE_TTL'] > 0
@@ -1,7 +1,7 @@
 import json
 import logging
 from abc import abstractmethod
-from typing import List, Any, cast
+from typing import List, Any, Optional, cast
 
 from langchain.embeddings.base import Embeddings
 from langchain.schema import Document, BaseRetriever
@@ -10,11 +10,14 @@ from weaviate import UnexpectedStatusCodeException
 
 from core.index.base import BaseIndex
 from extensions.ext_database import db
+from extensions.ext_redis import redis_client
 from models.dataset import Dataset, DocumentSegment
 from models.dataset import Document as DatasetDocument
 
 
 class BaseVectorIndex(BaseIndex):
+    DELETE_BATCH_SIZE = 1000
+    REBUILD_BATCH_SIZE = 500
 
     def __init__(self, dataset: Dataset, embeddings: Embeddings):
         super().__init__(dataset)
@@ -74,6 +77,15 @@ class BaseVectorIndex(BaseIndex):
             search_kwargs=search_kwargs
         ).get_relevant_documents(query)
 
+    async def asearch(
+            self, query: str,
+            **kwargs: Any
+    ) -> List[Document]:
+        # embed the query with the async client, the search reads it from the embedding cache
+        await self._embeddings.aembed_query(query)
+
+        return await super().asearch(query, **kwargs)
+
     def get_retriever(self, **kwargs: Any) -> BaseRetriever:
         vector_store = self._get_vector_store()
         vector_store = cast(self._get_vector_store_class(), vector_store)
@@ -89,6 +101,8 @@ class BaseVectorIndex(BaseIndex):
 
         if kwargs.get('duplicate_check', False):
             texts = self._filter_duplicate_texts(texts)
+            if not texts:
+                return
 
         uuids = self._get_uuids(texts)
         vector_store.add_documents(texts, uuids=uuids)
@@ -99,6 +113,12 @@ class BaseVectorIndex(BaseIndex):
 
         return vector_store.text_exists(id)
 
+    def get_existing_ids(self, ids: list[str]) -> set[str]:
+        vector_store = self._get_vector_store()
+        vector_store = cast(self._get_vector_store_class(), vector_store)
+
+        return vector_store.get_existing_ids(ids)
+
     def delete_by_ids(self, ids: list[str]) -> None:
         if self._is_origin():
             self.recreate_dataset(self.dataset)
@@ -107,8 +127,8 @@ class BaseVectorIndex(BaseIndex):
         vector_store = self._get_vector_store()
         vector_store = cast(self._get_vector_store_class(), vector_store)
 
-        for node_id in ids:
-            vector_store.del_text(node_id)
+        for i in range(0, len(ids), self.DELETE_BATCH_SIZE):
+            self._delete_texts_by_ids(vector_store, ids[i:i + self.DELETE_BATCH_SIZE])
 
     def delete(self) -> None:
         vector_store = self._get_vector_store()
@@ -116,67 +136,53 @@ class BaseVectorIndex(BaseIndex):
 
         vector_store.delete()
 
+    def _delete_texts_by_ids(self, vector_store: VectorStore, ids: list[str]) -> None:
+        """Delete a batch of nodes, stores that can match many ids in one request override it."""
+        for node_id in ids:
+            vector_store.del_text(node_id)
+
     def _is_origin(self):
         return False
 
-    def recreate_dataset(self, dataset: Dataset):
+    def recreate_dataset(self, dataset: Dataset, resume: bool = False):
         logging.info(f"Recreating dataset {dataset.id}")
 
-        try:
-            self.delete()
-        except UnexpectedStatusCodeException as e:
-            if e.status_code != 400:
-                # 400 means index not exists
-                raise e
-
-        dataset_documents = db.session.query(DatasetDocument).filter(
-            DatasetDocument.dataset_id == dataset.id,
-            DatasetDocument.indexing_status == 'completed',
-            DatasetDocument.enabled == True,
-            DatasetDocument.archived == False,
-        ).all()
-
-        documents = []
-        for dataset_document in dataset_documents:
-            segments = db.session.query(DocumentSegment).filter(
-                DocumentSegment.document_id == dataset_document.id,
-                DocumentSegment.status == 'completed',
-                DocumentSegment.enabled == True
-            ).all()
-
-            for segment in segments:
-                document = Document(
-                    page_content=segment.content,
-                    metadata={
-                        "doc_id": segment.index_node_id,
-                        "doc_hash": segment.index_node_hash,
-                        "document_id": segment.document_id,
-                        "dataset_id": segment.dataset_id,
-                    }
-                )
-
-                documents.append(document)
-
-        origin_index_struct = self.dataset.index_struct[:]
-        self.dataset.index_struct = None
+        progress_key = self._get_rebuild_progress_key(dataset)
+        last_segment_id = self._get_rebuild_progress(dataset, progress_key) if resume else None
+        if not last_segment_id:
+            self._delete_if_exists()
 
-        if documents:
-            try:
-                self.create(documents)
-            except Exception as e:
-                self.dataset.index_struct = origin_index_struct
-                raise e
+        # rebuild for a detached copy without the index struct, the embeddings commit while the
+        # rebuild runs, and the dataset must keep its index struct until the rebuild completes
+        origin_dataset = self.dataset
+        self.dataset = self._copy_without_index_struct(dataset)
+        try:
+            indexed = self._rebuild_from_segments(self.dataset, progress_key, last_segment_id)
+            index_struct = self.to_index_struct()
+        finally:
+            self.dataset = origin_dataset
 
-            dataset.index_struct = json.dumps(self.to_index_struct())
+        if indexed:
+            dataset.index_struct = json.dumps(index_struct)
 
         db.session.commit()
 
         self.dataset = dataset
         logging.info(f"Dataset {dataset.id} recreate successfully.")
 
-    def create_qdrant_dataset(self, dataset: Dataset):
+    def create_qdrant_dataset(self, dataset: Dataset, resume: bool = False):
         logging.info(f"create_qdrant_dataset {dataset.id}")
 
+        progress_key = 'vector_index_create_qdrant:{}'.format(dataset.id)
+        last_segment_id = self._get_rebuild_progress(dataset, progress_key) if resume else None
+        if not last_segment_id:
+            self._delete_if_exists()
+
+        self._rebuild_from_segments(dataset, progress_key, last_segment_id)
+
+        logging.info(f"Dataset {dataset.id} recreate successfully.")
+
+    def _delete_if_exists(self) -> None:
         try:
             self.delete()
         except UnexpectedStatusCodeException as e:
@@ -184,21 +190,54 @@ class BaseVectorIndex(BaseIndex):
                 # 400 means index not exists
                 raise e
 
-        dataset_documents = db.session.query(DatasetDocument).filter(
-            DatasetDocument.dataset_id == dataset.id,
-            DatasetDocument.indexing_status == 'completed',
-            DatasetDocument.enabled == True,
-            DatasetDocument.archived == False,
-        ).all()
-
-        documents = []
-        for dataset_document in dataset_documents:
-            segments = db.session.query(DocumentSegment).filter(
-                DocumentSegment.document_id == dataset_document.id,
-                DocumentSegment.status == 'completed',
-                DocumentSegment.enabled == True
-            ).all()
-
+    def is_rebuild_interrupted(self, dataset: Dataset) -> bool:
+        """Whether a rebuild of the dataset was interrupted, so that recreate_dataset can resume it."""
+        return redis_client.exists(self._get_rebuild_progress_key(dataset)) > 0
+
+    @staticmethod
+    def _get_rebuild_progress_key(dataset: Dataset) -> str:
+        return 'vector_index_rebuild:{}'.format(dataset.id)
+
+    @staticmethod
+    def _copy_without_index_struct(dataset: Dataset) -> Dataset:
+        """Copy the dataset into a transient object, which no commit writes back."""
+        dataset_copy = Dataset(**{column.name: getattr(dataset, column.name) for column in Dataset.__table__.columns})
+        dataset_copy.index_struct = None
+
+        return dataset_copy
+
+    def _get_rebuild_progress(self, dataset: Dataset, progress_key: str) -> Optional[str]:
+        last_segment_id = redis_client.get(progress_key)
+        if not last_segment_id:
+            return None
+
+        logging.info(f"Resuming dataset {dataset.id} rebuild after segment {last_segment_id.decode()}")
+        return last_segment_id.decode()
+
+    def _rebuild_from_segments(self, dataset: Dataset, progress_key: str,
+                               last_segment_id: Optional[str] = None) -> bool:
+        """
+        Rebuild the index from the dataset's segments, embedding and upserting them in batches
+        of REBUILD_BATCH_SIZE read page by page in id order.
+
+        The id of the last upserted segment is kept in redis under progress_key until the rebuild
+        completes, so that an interrupted rebuild can continue after it.
+
+        :param dataset: dataset
+        :param progress_key: redis key of the rebuild progress
+        :param last_segment_id: continue after this segment, into the existing index
+        :return: whether any segment is indexed
+        """
+        indexed = last_segment_id is not None
+        if indexed:
+            self._resume(dataset, last_segment_id)
+
+        while True:
+            segments = self._get_segments_page(dataset, last_segment_id)
+            if not segments:
+                break
+
+            documents = []
             for segment in segments:
                 document = Document(
                     page_content=segment.content,
@@ -212,13 +251,48 @@ class BaseVectorIndex(BaseIndex):
 
                 documents.append(document)
 
-        if documents:
-            try:
+            if indexed:
+                vector_store = self._get_vector_store()
+                vector_store = cast(self._get_vector_store_class(), vector_store)
+                vector_store.add_documents(documents, uuids=self._get_uuids(documents))
+            else:
                 self.create(documents)
-            except Exception as e:
-                raise e
+                indexed = True
+
+            last_segment_id = str(segments[-1].id)
+            redis_client.set(progress_key, last_segment_id)
+
+        redis_client.delete(progress_key)
+
+        return indexed
+
+    def _get_segments_page(self, dataset: Dataset, last_segment_id: Optional[str]) -> list:
+        """Get the next REBUILD_BATCH_SIZE indexable segments of the dataset after last_segment_id, in id order."""
+        # only the needed columns, so that the pages do not pile up in the session
+        query = db.session.query(
+            DocumentSegment.id,
+            DocumentSegment.content,
+            DocumentSegment.index_node_id,
+            DocumentSegment.index_node_hash,
+            DocumentSegment.document_id,
+            DocumentSegment.dataset_id
+        ).join(DatasetDocument, DatasetDocument.id == DocumentSegment.document_id).filter(
+            DocumentSegment.dataset_id == dataset.id,
+            DocumentSegment.status == 'completed',
+            DocumentSegment.enabled == True,
+            DatasetDocument.indexing_status == 'completed',
+            DatasetDocument.enabled == True,
+            DatasetDocument.archived == False,
+        )
 
-        logging.info(f"Dataset {dataset.id} recreate successfully.")
+        if last_segment_id:
+            query = query.filter(DocumentSegment.id > last_segment_id)
+
+        return query.order_by(DocumentSegment.id).limit(self.REBUILD_BATCH_SIZE).all()
+
+    def _resume(self, dataset: Dataset, last_segment_id: str) -> None:
+        """Prepare appending to the index of a resumed rebuild, which skips create."""
+        pass
 
     def update_qdrant_dataset(self, dataset: Dataset):
         logging.info(f"update_qdrant_dataset {dataset.id}")
@@ -0,0 +1,86 @@
+import os
+from typing import Optional, cast
+
+from langchain.embeddings.base import Embeddings
+from langchain.schema import Document
+from langchain.vectorstores import VectorStore
+from pydantic import BaseModel
+
+from core.index.base import BaseIndex
+from core.index.vector_index.base import BaseVectorIndex
+from core.vector_store.numpy_vector_store import NumpyVectorStore
+from models.dataset import Dataset
+
+
+class NumpyConfig(BaseModel):
+    path: str
+    root_path: Optional[str]
+    ivf_threshold: int = 0
+    ivf_nprobe: int = 8
+
+    def get_path(self) -> str:
+        if not os.path.isabs(self.path):
+            return os.path.join(self.root_path, self.path)
+
+        return self.path
+
+
+class NumpyVectorIndex(BaseVectorIndex):
+    def __init__(self, dataset: Dataset, config: NumpyConfig, embeddings: Embeddings):
+        super().__init__(dataset, embeddings)
+        self._client_config = config
+
+    def get_type(self) -> str:
+        return 'numpy'
+
+    def get_index_name(self, dataset: Dataset) -> str:
+        if self.dataset.index_struct_dict:
+            return self.dataset.index_struct_dict['vector_store']['class_prefix']
+
+        dataset_id = dataset.id
+        return "Vector_index_" + dataset_id.replace("-", "_") + '_Node'
+
+    def to_index_struct(self) -> dict:
+        return {
+            "type": self.get_type(),
+            "vector_store": {"class_prefix": self.get_index_name(self.dataset)}
+        }
+
+    def create(self, texts: list[Document], **kwargs) -> BaseIndex:
+        uuids = self._get_uuids(texts)
+        self._vector_store = NumpyVectorStore.from_documents(
+            texts,
+            self._embeddings,
+            ids=uuids,
+            path=os.path.join(self._client_config.get_path(), self.get_index_name(self.dataset)),
+            ivf_threshold=self._client_config.ivf_threshold,
+            ivf_nprobe=self._client_config.ivf_nprobe
+        )
+
+        return self
+
+    def _get_vector_store(self) -> VectorStore:
+        """Only for created index."""
+        if self._vector_store:
+            return self._vector_store
+
+        return NumpyVectorStore(
+            path=os.path.join(self._client_config.get_path(), self.get_index_name(self.dataset)),
+            embedding=self._embeddings,
+            ivf_threshold=self._client_config.ivf_threshold,
+            ivf_nprobe=self._client_config.ivf_nprobe
+        )
+
+    def _get_vector_store_class(self) -> type:
+        return NumpyVectorStore
+
+    def delete_by_document_id(self, document_id: str):
+        vector_store = self._get_vector_store()
+        vector_store = cast(self._get_vector_store_class(), vector_store)
+
+        vector_store.del_texts_by_document_id(document_id)
+
+    def _delete_texts_by_ids(self, vector_store: VectorStore, ids: list[str]) -> None:
+        vector_store = cast(self._get_vector_store_class(), vector_store)
+
+        vector_store.del_texts_by_ids(ids)
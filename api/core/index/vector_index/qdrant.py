@@ -5,6 +5,8 @@ import asyncio
 import functools
 import uuid
 import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from itertools import islice
 from operator import itemgetter
 from typing import (
@@ -816,6 +818,7 @@ class Qdrant(VectorStore):
         k: int = 4,
         fetch_k: int = 20,
         lambda_mult: float = 0.5,
+        filter: Optional[MetadataFilter] = None,
         **kwargs: Any,
     ) -> List[Tuple[Document, float]]:
         """Return docs selected using the maximal marginal relevance.
@@ -830,10 +833,16 @@ class Qdrant(VectorStore):
                         of diversity among the results with 0 corresponding
                         to maximum diversity and 1 to minimum diversity.
                         Defaults to 0.5.
+            filter: Filter by metadata. Defaults to None.
         Returns:
             List of Documents selected by maximal marginal relevance and distance for
             each.
         """
+        if filter is not None and isinstance(filter, dict):
+            qdrant_filter = self._qdrant_filter_from_dict(filter)
+        else:
+            qdrant_filter = filter
+
         query_vector = embedding
         if self.vector_name is not None:
             query_vector = (self.vector_name, query_vector)  # type: ignore[assignment]
@@ -841,6 +850,7 @@ class Qdrant(VectorStore):
         results = self.client.search(
             collection_name=self.collection_name,
             query_vector=query_vector,
+            query_filter=qdrant_filter,
             with_payload=True,
             with_vectors=True,
             limit=fetch_k,
@@ -1299,6 +1309,13 @@ class Qdrant(VectorStore):
         await qdrant.aadd_texts(texts, metadatas, ids, batch_size)
         return qdrant
 
+    @classmethod
+    def _create_client(cls, **kwargs: Any) -> Any:
+        """Create the client used by the instances built from texts."""
+        import qdrant_client
+
+        return qdrant_client.QdrantClient(**kwargs)
+
     @classmethod
     def _construct_instance(
         cls: Type[Qdrant],
@@ -1350,7 +1367,7 @@ class Qdrant(VectorStore):
         vector_size = len(partial_embeddings[0])
         collection_name = collection_name or uuid.uuid4().hex
         distance_func = distance_func.upper()
-        client = qdrant_client.QdrantClient(
+        client = cls._create_client(
             location=location,
             url=url,
             port=port,
@@ -1657,17 +1674,9 @@ class Qdrant(VectorStore):
     ) -> Generator[Tuple[List[str], List[rest.PointStruct]], None, None]:
         from qdrant_client.http import models as rest
 
-        texts_iterator = iter(texts)
-        metadatas_iterator = iter(metadatas or [])
-        ids_iterator = iter(ids or [uuid.uuid4().hex for _ in iter(texts)])
-        while batch_texts := list(islice(texts_iterator, batch_size)):
-            # Take the corresponding metadata and id for each text in a batch
-            batch_metadatas = list(islice(metadatas_iterator, batch_size)) or None
-            batch_ids = list(islice(ids_iterator, batch_size))
-
-            # Generate the embeddings for all the texts in a batch
-            batch_embeddings = self._embed_texts(batch_texts)
-
+        for batch_texts, batch_metadatas, batch_ids, batch_embeddings in self._embed_batches(
+            self._generate_text_batches(texts, metadatas, ids, batch_size)
+        ):
             points = [
                 rest.PointStruct(
                     id=point_id,
@@ -1689,3 +1698,52 @@ class Qdrant(VectorStore):
             ]
 
             yield batch_ids, points
+
+    def _generate_text_batches(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[Sequence[str]] = None,
+        batch_size: int = 64,
+    ) -> Generator[Tuple[List[str], Optional[List[dict]], List[str]], None, None]:
+        texts_iterator = iter(texts)
+        metadatas_iterator = iter(metadatas or [])
+        ids_iterator = iter(ids or [uuid.uuid4().hex for _ in iter(texts)])
+        while batch_texts := list(islice(texts_iterator, batch_size)):
+            # Take the corresponding metadata and id for each text in a batch
+            batch_metadatas = list(islice(metadatas_iterator, batch_size)) or None
+            batch_ids = list(islice(ids_iterator, batch_size))
+
+            yield batch_texts, batch_metadatas, batch_ids
+
+    def _embed_batches(
+        self,
+        batches: Iterable[Tuple[List[str], Optional[List[dict]], List[str]]],
+    ) -> Generator[Tuple[List[str], Optional[List[dict]], List[str], List[List[float]]], None, None]:
+        """Generate the embeddings of each batch, keeping the batches in order.
+
+        When the embeddings expose a `max_concurrency` above 1, up to that many
+        batches are embedded at the same time in worker threads.
+        """
+        max_concurrency = getattr(self.embeddings, "max_concurrency", 1)
+        if max_concurrency <= 1:
+            for batch_texts, batch_metadatas, batch_ids in batches:
+                yield batch_texts, batch_metadatas, batch_ids, self._embed_texts(batch_texts)
+            return
+
+        embed_texts = self._get_embed_texts_worker()
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            pending = deque()
+            for batch in batches:
+                pending.append((batch, executor.submit(embed_texts, batch[0])))
+                if len(pending) >= max_concurrency:
+                    batch, future = pending.popleft()
+                    yield (*batch, future.result())
+
+            while pending:
+                batch, future = pending.popleft()
+                yield (*batch, future.result())
+
+    def _get_embed_texts_worker(self) -> Callable[[List[str]], List[List[float]]]:
+        """Get the function used to embed texts in worker threads."""
+        return self._embed_texts
@@ -1,7 +1,9 @@
+import json
+import logging
 import os
+import re
 from typing import Optional, Any, List, cast
 
-import qdrant_client
 from langchain.embeddings.base import Embeddings
 from langchain.schema import Document, BaseRetriever
 from langchain.vectorstores import VectorStore
@@ -9,14 +11,17 @@ from pydantic import BaseModel
 
 from core.index.base import BaseIndex
 from core.index.vector_index.base import BaseVectorIndex
+from core.vector_store.qdrant_client_registry import get_qdrant_client
 from core.vector_store.qdrant_vector_store import QdrantVectorStore
-from models.dataset import Dataset
+from extensions.ext_database import db
+from models.dataset import Dataset, DocumentSegment
 
 
 class QdrantConfig(BaseModel):
     endpoint: str
     api_key: Optional[str]
     root_path: Optional[str]
+    shared_collection: bool = False
     
     def to_qdrant_params(self):
         if self.endpoint and self.endpoint.startswith('path:'):
@@ -35,9 +40,12 @@ class QdrantConfig(BaseModel):
 
 
 class QdrantVectorIndex(BaseVectorIndex):
+    MIGRATE_BATCH_SIZE = 500
+
     def __init__(self, dataset: Dataset, config: QdrantConfig, embeddings: Embeddings):
         super().__init__(dataset, embeddings)
         self._client_config = config
+        self._shared_collection_name = None
 
     def get_type(self) -> str:
         return 'qdrant'
@@ -45,23 +53,50 @@ class QdrantVectorIndex(BaseVectorIndex):
     def get_index_name(self, dataset: Dataset) -> str:
         if self.dataset.index_struct_dict:
             class_prefix: str = self.dataset.index_struct_dict['vector_store']['class_prefix']
+            if self._is_shared():
+                return class_prefix
+
             if not class_prefix.endswith('_Node'):
                 # original class_prefix
                 class_prefix += '_Node'
 
             return class_prefix
 
+        if self._is_shared() and self._shared_collection_name:
+            return self._shared_collection_name
+
         dataset_id = dataset.id
         return "Vector_index_" + dataset_id.replace("-", "_") + '_Node'
 
+    def get_shared_collection_name(self, dataset: Dataset, vector_size: int) -> str:
+        """Get the name of the collection shared by the datasets of the embedding model and dimension."""
+        name = "Vector_index_shared_{}_{}_{}".format(
+            dataset.embedding_model_provider, dataset.embedding_model, vector_size
+        )
+
+        return re.sub(r'[^0-9a-zA-Z_]', '_', name)
+
     def to_index_struct(self) -> dict:
-        return {
+        index_struct = {
             "type": self.get_type(),
             "vector_store": {"class_prefix": self.get_index_name(self.dataset)}
         }
 
+        if self._is_shared():
+            index_struct['vector_store']['shared'] = True
+
+        return index_struct
+
     def create(self, texts: list[Document], **kwargs) -> BaseIndex:
         uuids = self._get_uuids(texts)
+        if self._is_shared():
+            self._init_shared_collection(texts[0].page_content)
+
+            self._vector_store = self._get_vector_store()
+            self._vector_store.add_documents(texts, uuids=uuids)
+
+            return self
+
         self._vector_store = QdrantVectorStore.from_documents(
             texts,
             self._embeddings,
@@ -80,7 +115,7 @@ class QdrantVectorIndex(BaseVectorIndex):
         attributes = ['doc_id', 'dataset_id', 'document_id']
         if self._is_origin():
             attributes = ['doc_id']
-        client = qdrant_client.QdrantClient(
+        client = get_qdrant_client(
             **self._client_config.to_qdrant_params()
         )
 
@@ -88,7 +123,8 @@ class QdrantVectorIndex(BaseVectorIndex):
             client=client,
             collection_name=self.get_index_name(self.dataset),
             embeddings=self._embeddings,
-            content_payload_key='page_content'
+            content_payload_key='page_content',
+            dataset_id=self.dataset.id if self._is_shared() else None
         )
 
     def _get_vector_store_class(self) -> type:
@@ -113,26 +149,117 @@ class QdrantVectorIndex(BaseVectorIndex):
             ],
         ))
 
-    def delete_by_ids(self, ids: list[str]) -> None:
-        if self._is_origin():
-            self.recreate_dataset(self.dataset)
-            return
-
-        vector_store = self._get_vector_store()
+    def _delete_texts_by_ids(self, vector_store: VectorStore, ids: list[str]) -> None:
         vector_store = cast(self._get_vector_store_class(), vector_store)
 
         from qdrant_client.http import models
-        for node_id in ids:
-            vector_store.del_texts(models.Filter(
-                must=[
-                    models.FieldCondition(
-                        key="metadata.doc_id",
-                        match=models.MatchValue(value=node_id),
-                    ),
-                ],
-            ))
+
+        vector_store.del_texts(models.Filter(
+            must=[
+                models.FieldCondition(
+                    key="metadata.doc_id",
+                    match=models.MatchAny(any=ids),
+                ),
+            ],
+        ))
+
+    def migrate_to_shared_collection(self, dataset: Dataset):
+        """Copy the points of the dataset's own collection into the shared collection, and drop it."""
+        logging.info(f"migrate_to_shared_collection {dataset.id}")
+
+        from qdrant_client.http import models
+
+        client = get_qdrant_client(**self._client_config.to_qdrant_params())
+        collection_name = self.get_index_name(dataset)
+        vector_size = client.get_collection(collection_name=collection_name).config.params.vectors.size
+
+        shared_collection_name = self.get_shared_collection_name(dataset, vector_size)
+        self._create_shared_collection(shared_collection_name, vector_size)
+
+        offset = None
+        while True:
+            records, offset = client.scroll(
+                collection_name=collection_name,
+                limit=self.MIGRATE_BATCH_SIZE,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+
+            if records:
+                client.upsert(
+                    collection_name=shared_collection_name,
+                    points=[models.PointStruct(
+                        id=record.id,
+                        vector=record.vector,
+                        payload={
+                            **record.payload,
+                            'metadata': {**(record.payload.get('metadata') or {}), 'dataset_id': dataset.id}
+                        }
+                    ) for record in records]
+                )
+
+            if offset is None:
+                break
+
+        dataset.index_struct = json.dumps({
+            "type": self.get_type(),
+            "vector_store": {"class_prefix": shared_collection_name, "shared": True}
+        })
+        db.session.commit()
+
+        client.delete_collection(collection_name=collection_name)
+
+        self.dataset = dataset
+        logging.info(f"Dataset {dataset.id} migrate successfully.")
+
+    def _is_shared(self) -> bool:
+        if self.dataset.index_struct_dict:
+            return self.dataset.index_struct_dict['vector_store'].get('shared', False)
+
+        return self._client_config.shared_collection
+
+    def _resume(self, dataset: Dataset, last_segment_id: str) -> None:
+        # the index struct of a rebuilt dataset is cleared, resolve the shared collection create would use
+        if self._is_shared() and not self.dataset.index_struct_dict:
+            # the last indexed segment was embedded by the interrupted rebuild, its embedding is cached
+            segment = db.session.query(DocumentSegment.content).filter(DocumentSegment.id == last_segment_id).first()
+            self._init_shared_collection(segment.content if segment else dataset.name)
+
+    def _init_shared_collection(self, text: str):
+        vector_size = len(self._embeddings.embed_documents([text])[0])
+        self._shared_collection_name = self.get_shared_collection_name(self.dataset, vector_size)
+        self._create_shared_collection(self._shared_collection_name, vector_size)
+
+    def _create_shared_collection(self, collection_name: str, vector_size: int):
+        from qdrant_client.http import models
+
+        client = get_qdrant_client(**self._client_config.to_qdrant_params())
+        if collection_name in [collection.name for collection in client.get_collections().collections]:
+            return
+
+        try:
+            client.create_collection(
+                collection_name=collection_name,
+                vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE)
+            )
+        except Exception:
+            # created by another process in the meantime
+            if collection_name in [collection.name for collection in client.get_collections().collections]:
+                return
+
+            raise
+
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name='metadata.dataset_id',
+            field_schema=models.PayloadSchemaType.KEYWORD
+        )
 
     def _is_origin(self):
+        if self._is_shared():
+            return False
+
         if self.dataset.index_struct_dict:
             class_prefix: str = self.dataset.index_struct_dict['vector_store']['class_prefix']
             if not class_prefix.endswith('_Node'):
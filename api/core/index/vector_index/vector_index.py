@@ -43,7 +43,21 @@ class VectorIndex:
                 config=QdrantConfig(
                     endpoint=config.get('QDRANT_URL'),
                     api_key=config.get('QDRANT_API_KEY'),
-                    root_path=current_app.root_path
+                    root_path=current_app.root_path,
+                    shared_collection=config.get('QDRANT_SHARED_COLLECTION')
+                ),
+                embeddings=embeddings
+            )
+        elif vector_type == "numpy":
+            from core.index.vector_index.numpy_vector_index import NumpyVectorIndex, NumpyConfig
+
+            return NumpyVectorIndex(
+                dataset=dataset,
+                config=NumpyConfig(
+                    path=config.get('NUMPY_VECTOR_STORE_PATH'),
+                    root_path=current_app.root_path,
+                    ivf_threshold=int(config.get('NUMPY_VECTOR_STORE_IVF_THRESHOLD')),
+                    ivf_nprobe=int(config.get('NUMPY_VECTOR_STORE_IVF_NPROBE'))
                 ),
                 embeddings=embeddings
             )
@@ -126,6 +126,18 @@ class WeaviateVectorIndex(BaseVectorIndex):
             "valueText": document_id
         })
 
+    def _delete_texts_by_ids(self, vector_store: VectorStore, ids: list[str]) -> None:
+        vector_store = cast(self._get_vector_store_class(), vector_store)
+
+        vector_store.del_texts({
+            "operator": "Or",
+            "operands": [{
+                "operator": "Equal",
+                "path": ["doc_id"],
+                "valueText": node_id
+            } for node_id in ids]
+        })
+
     def _is_origin(self):
         if self.dataset.index_struct_dict:
             class_prefix: str = self.dataset.index_struct_dict['vector_store']['class_prefix']
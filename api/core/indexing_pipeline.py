@@ -0,0 +1,336 @@
+import datetime
+import queue
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from flask import Flask, current_app
+from langchain.embeddings.base import Embeddings
+from langchain.schema import Document
+
+from core.docstore.dataset_docstore import DatesetDocumentStore
+from core.embedding.cached_embedding import CacheEmbedding
+from core.index.index import IndexBuilder
+from core.index.retrieval_cache import RetrievalCache
+from core.index.vector_index.vector_index import VectorIndex
+from core.model_providers.model_factory import ModelFactory
+from extensions.ext_database import db
+from libs import helper
+from models.dataset import Document as DatasetDocument
+from models.dataset import Dataset, DocumentSegment, DatasetProcessRule
+
+_END = object()
+
+
+class IndexingPipeline:
+    """
+    Index a document with load, clean, split, embed and upsert running as separate stages.
+
+    Every stage except the last runs in its own thread and hands its output to the next stage
+    through a bounded queue, so embedding requests and vector upserts start while the loader
+    is still parsing the file. The embed stage hands the vectors of each chunk on to the upsert
+    stage, which runs in the calling thread. The first error of any stage stops all of them
+    and is raised by run.
+    """
+
+    def __init__(self, runner, dataset: Dataset, dataset_document: DatasetDocument,
+                 processing_rule: DatasetProcessRule, chunk_size: int = 100, queue_size: int = 4):
+        self._runner = runner
+        self._dataset_id = dataset.id
+        self._document_id = dataset_document.id
+        self._processing_rule_id = processing_rule.id
+        self._chunk_size = chunk_size
+        self._queue_size = queue_size
+
+        self._stop_event = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._threads: List[threading.Thread] = []
+        self._tokens = 0
+
+    def run(self) -> None:
+        flask_app = current_app._get_current_object()
+        indexing_start_at = time.perf_counter()
+
+        load_queue = self._start_stage(flask_app, 'load', self._load, None)
+        clean_queue = self._start_stage(flask_app, 'clean', self._clean, load_queue)
+        split_queue = self._start_stage(flask_app, 'split', self._split, clean_queue)
+        embed_queue = self._start_stage(flask_app, 'embed', self._embed, split_queue)
+
+        try:
+            self._upsert(self._iter_queue(embed_queue))
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._stop_event.set()
+            for thread in self._threads:
+                thread.join()
+
+        if self._error:
+            raise self._error
+
+        indexing_end_at = time.perf_counter()
+
+        # update document status to completed
+        self._runner._update_document_index_status(
+            document_id=self._document_id,
+            after_indexing_status="completed",
+            extra_update_params={
+                DatasetDocument.tokens: self._tokens,
+                DatasetDocument.completed_at: datetime.datetime.utcnow(),
+                DatasetDocument.indexing_latency: indexing_end_at - indexing_start_at,
+            }
+        )
+
+    def _start_stage(self, flask_app: Flask, name: str, func: Callable[..., Iterable],
+                     upstream: Optional[queue.Queue]) -> queue.Queue:
+        downstream = queue.Queue(maxsize=self._queue_size)
+        thread = threading.Thread(target=self._run_stage, name=f'indexing-{name}-{self._document_id}', kwargs={
+            'flask_app': flask_app, 'func': func, 'upstream': upstream, 'downstream': downstream
+        })
+        thread.daemon = True
+        self._threads.append(thread)
+        thread.start()
+
+        return downstream
+
+    def _run_stage(self, flask_app: Flask, func: Callable[..., Iterable],
+                   upstream: Optional[queue.Queue], downstream: queue.Queue) -> None:
+        with flask_app.app_context():
+            try:
+                outputs = func(self._iter_queue(upstream)) if upstream is not None else func()
+                for output in outputs:
+                    if not self._put(downstream, output):
+                        break
+            except BaseException as e:
+                self._fail(e)
+            finally:
+                self._put(downstream, _END)
+
+    def _iter_queue(self, q: queue.Queue) -> Iterator:
+        while True:
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop_event.is_set():
+                    return
+                continue
+
+            if item is _END or self._stop_event.is_set():
+                return
+
+            yield item
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        while True:
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if self._stop_event.is_set():
+                    return False
+
+    def _fail(self, e: BaseException) -> None:
+        if self._error is None:
+            self._error = e
+        self._stop_event.set()
+
+    def _get_dataset(self) -> Dataset:
+        return db.session.query(Dataset).filter(Dataset.id == self._dataset_id).first()
+
+    def _get_dataset_document(self) -> DatasetDocument:
+        return db.session.query(DatasetDocument).filter(DatasetDocument.id == self._document_id).first()
+
+    def _load(self) -> Iterator[Document]:
+        # the loaded text docs are split as they are parsed
+        self._runner._update_document_index_status(
+            document_id=self._document_id,
+            after_indexing_status="splitting"
+        )
+
+        word_count = 0
+        for text_doc in self._runner._lazy_load_data(self._get_dataset_document()):
+            word_count += len(text_doc.page_content)
+            yield text_doc
+
+        # the document is indexing by now, only record the parsing
+        DatasetDocument.query.filter_by(id=self._document_id).update({
+            DatasetDocument.word_count: word_count,
+            DatasetDocument.parsing_completed_at: datetime.datetime.utcnow()
+        })
+        db.session.commit()
+
+    def _clean(self, text_docs: Iterable[Document]) -> Iterator[Document]:
+        processing_rule = db.session.query(DatasetProcessRule). \
+            filter(DatasetProcessRule.id == self._processing_rule_id). \
+            first()
+
+        for text_doc in text_docs:
+            # document clean
+            text_doc.page_content = self._runner._document_clean(text_doc.page_content, processing_rule)
+            yield text_doc
+
+    def _split(self, text_docs: Iterable[Document]) -> Iterator[List[Document]]:
+        """
+        Split the cleaned documents and save each full chunk of nodes to the document segment.
+        """
+        processing_rule = db.session.query(DatasetProcessRule). \
+            filter(DatasetProcessRule.id == self._processing_rule_id). \
+            first()
+        splitter = self._runner._get_splitter(processing_rule)
+        dataset = self._get_dataset()
+        dataset_document = self._get_dataset_document()
+
+        doc_store = DatesetDocumentStore(
+            dataset=dataset,
+            user_id=dataset_document.created_by,
+            document_id=dataset_document.id
+        )
+
+        pending_documents = []
+        indexing_started = False
+        for text_doc in text_docs:
+            # parse document to nodes
+            for document_node in splitter.split_documents([text_doc]):
+                if not document_node.page_content.strip():
+                    continue
+
+                document_node.metadata['doc_id'] = str(uuid.uuid4())
+                document_node.metadata['doc_hash'] = helper.generate_text_hash(document_node.page_content)
+                pending_documents.append(document_node)
+
+                if len(pending_documents) >= self._chunk_size:
+                    self._save_segments(doc_store, pending_documents, indexing_started)
+                    indexing_started = True
+                    yield pending_documents
+                    pending_documents = []
+
+        if pending_documents:
+            self._save_segments(doc_store, pending_documents, indexing_started)
+            indexing_started = True
+            yield pending_documents
+
+        cur_time = datetime.datetime.utcnow()
+        self._runner._update_document_index_status(
+            document_id=self._document_id,
+            after_indexing_status="indexing",
+            extra_update_params={
+                DatasetDocument.cleaning_completed_at: cur_time,
+                DatasetDocument.splitting_completed_at: cur_time,
+            }
+        )
+
+    def _save_segments(self, doc_store: DatesetDocumentStore, documents: List[Document], indexing_started: bool):
+        doc_store.add_documents(documents)
+
+        if not indexing_started:
+            # update document status to indexing once the first chunk can be indexed
+            self._runner._update_document_index_status(
+                document_id=self._document_id,
+                after_indexing_status="indexing"
+            )
+
+        # update segment status to indexing
+        db.session.query(DocumentSegment).filter(
+            DocumentSegment.document_id == self._document_id,
+            DocumentSegment.index_node_id.in_([document.metadata['doc_id'] for document in documents])
+        ).update({
+            DocumentSegment.status: "indexing",
+            DocumentSegment.indexing_at: datetime.datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+
+    def _embed(self, chunks: Iterable[List[Document]]) -> Iterator[Tuple[List[Document], Optional[List[List[float]]]]]:
+        """
+        Embed each chunk ahead of the upsert stage, and hand the chunk on with its vectors.
+        """
+        dataset = self._get_dataset()
+        embedding_model = None
+        if dataset.indexing_technique == 'high_quality':
+            embedding_model = ModelFactory.get_embedding_model(
+                tenant_id=dataset.tenant_id,
+                model_provider_name=dataset.embedding_model_provider,
+                model_name=dataset.embedding_model
+            )
+
+        embeddings = CacheEmbedding(embedding_model) if embedding_model else None
+        for chunk_documents in chunks:
+            vectors = None
+            if embeddings:
+                self._tokens += self._runner._get_segments_tokens(self._document_id, chunk_documents)
+                vectors = embeddings.embed_documents([document.page_content for document in chunk_documents])
+
+            yield chunk_documents, vectors
+
+    def _upsert(self, chunks: Iterable[Tuple[List[Document], Optional[List[List[float]]]]]) -> None:
+        dataset = self._get_dataset()
+        keyword_table_index = IndexBuilder.get_index(dataset, 'economy')
+
+        vector_index = None
+        chunk_embeddings = None
+        if dataset.indexing_technique == 'high_quality':
+            embedding_model = ModelFactory.get_embedding_model(
+                tenant_id=dataset.tenant_id,
+                model_provider_name=dataset.embedding_model_provider,
+                model_name=dataset.embedding_model
+            )
+            chunk_embeddings = ChunkEmbeddings(CacheEmbedding(embedding_model))
+            vector_index = VectorIndex(
+                dataset=dataset,
+                config=current_app.config,
+                embeddings=chunk_embeddings
+            )
+
+        for chunk_documents, vectors in chunks:
+            # check document is paused
+            self._runner._check_document_paused_status(self._document_id)
+
+            # save vector index
+            if vector_index:
+                chunk_embeddings.set_chunk(chunk_documents, vectors)
+                vector_index.add_texts(chunk_documents)
+
+            # save keyword index
+            keyword_table_index.add_texts(chunk_documents)
+
+            document_ids = [document.metadata['doc_id'] for document in chunk_documents]
+            db.session.query(DocumentSegment).filter(
+                DocumentSegment.document_id == self._document_id,
+                DocumentSegment.index_node_id.in_(document_ids),
+                DocumentSegment.status == "indexing"
+            ).update({
+                DocumentSegment.status: "completed",
+                DocumentSegment.enabled: True,
+                DocumentSegment.completed_at: datetime.datetime.utcnow()
+            }, synchronize_session=False)
+
+            db.session.commit()
+            RetrievalCache(dataset.id).bump_version()
+
+
+class ChunkEmbeddings(Embeddings):
+    """
+    Embeddings of the chunk being upserted, handed on by the embed stage.
+
+    Texts outside the chunk, such as the segments embedded when an index is recreated,
+    are embedded by the wrapped embeddings.
+    """
+
+    def __init__(self, embeddings: Embeddings):
+        self._embeddings = embeddings
+        self._chunk_vectors: Dict[str, List[float]] = {}
+
+    def set_chunk(self, documents: List[Document], vectors: Optional[List[List[float]]]) -> None:
+        self._chunk_vectors = {
+            document.page_content: vector for document, vector in zip(documents, vectors or [])
+        }
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        missing_texts = [text for text in texts if text not in self._chunk_vectors]
+        missing_vectors = dict(zip(missing_texts, self._embeddings.embed_documents(missing_texts))) \
+            if missing_texts else {}
+
+        return [self._chunk_vectors[text] if text in self._chunk_vectors else missing_vectors[text] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embeddings.embed_query(text)
@@ -5,18 +5,21 @@ import re
 import threading
 import time
 import uuid
-from typing import Optional, List, cast
+from typing import Iterator, Optional, List
 
 from flask import current_app, Flask
 from flask_login import current_user
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter, TextSplitter
+from sqlalchemy import func
 
 from core.data_loader.file_extractor import FileExtractor
 from core.data_loader.loader.notion import NotionLoader
 from core.docstore.dataset_docstore import DatesetDocumentStore
 from core.generator.llm_generator import LLMGenerator
 from core.index.index import IndexBuilder
+from core.index.retrieval_cache import RetrievalCache
+from core.indexing_pipeline import IndexingPipeline
 from core.model_providers.error import ProviderTokenNotInitError
 from core.model_providers.model_factory import ModelFactory
 from core.model_providers.models.entity.message import MessageType
@@ -48,14 +51,18 @@ class IndexingRunner:
                 if not dataset:
                     raise ValueError("no dataset found")
 
-                # load file
-                text_docs = self._load_data(dataset_document)
-
                 # get the process rule
                 processing_rule = db.session.query(DatasetProcessRule). \
                     filter(DatasetProcessRule.id == dataset_document.dataset_process_rule_id). \
                     first()
 
+                if self._use_pipeline(dataset_document):
+                    self._run_pipeline(dataset, dataset_document, processing_rule)
+                    continue
+
+                # load file
+                text_docs = self._load_data(dataset_document)
+
                 # get splitter
                 splitter = self._get_splitter(processing_rule)
 
@@ -86,6 +93,27 @@ class IndexingRunner:
                 dataset_document.stopped_at = datetime.datetime.utcnow()
                 db.session.commit()
 
+    def _use_pipeline(self, dataset_document: DatasetDocument) -> bool:
+        """
+        Whether the document can be indexed by the pipelined engine,
+        qa documents need the whole split result to generate questions, so they stay sequential.
+        """
+        if not current_app.config.get('INDEXING_PIPELINE_ENABLED'):
+            return False
+
+        return dataset_document.doc_form != 'qa_model'
+
+    def _run_pipeline(self, dataset: Dataset, dataset_document: DatasetDocument,
+                      processing_rule: DatasetProcessRule) -> None:
+        """Load, clean, split, embed and upsert the document concurrently."""
+        IndexingPipeline(
+            runner=self,
+            dataset=dataset,
+            dataset_document=dataset_document,
+            processing_rule=processing_rule,
+            queue_size=int(current_app.config.get('INDEXING_PIPELINE_QUEUE_SIZE'))
+        ).run()
+
     def format_split_text(self, text):
         regex = r"Q\d+:\s*(.*?)\s*A\d+:\s*([\s\S]*?)(?=Q|$)"
         matches = re.findall(regex, text, re.MULTILINE)
@@ -122,14 +150,18 @@ class IndexingRunner:
             db.session.delete(document_segments)
             db.session.commit()
 
-            # load file
-            text_docs = self._load_data(dataset_document)
-
             # get the process rule
             processing_rule = db.session.query(DatasetProcessRule). \
                 filter(DatasetProcessRule.id == dataset_document.dataset_process_rule_id). \
                 first()
 
+            if self._use_pipeline(dataset_document):
+                self._run_pipeline(dataset, dataset_document, processing_rule)
+                return
+
+            # load file
+            text_docs = self._load_data(dataset_document)
+
             # get splitter
             splitter = self._get_splitter(processing_rule)
 
@@ -267,8 +299,11 @@ class IndexingRunner:
             for document in documents:
                 if len(preview_texts) < 5:
                     preview_texts.append(document.page_content)
-                if indexing_technique == 'high_quality' or embedding_model:
-                    tokens += embedding_model.get_num_tokens(self.filter_string(document.page_content))
+
+            if indexing_technique == 'high_quality' or embedding_model:
+                tokens += sum(embedding_model.get_num_tokens_batch(
+                    [self.filter_string(document.page_content) for document in documents]
+                ))
 
         if doc_form and doc_form == 'qa_model':
             text_generation_model = ModelFactory.get_text_generation_model(
@@ -363,8 +398,11 @@ class IndexingRunner:
                 for document in documents:
                     if len(preview_texts) < 5:
                         preview_texts.append(document.page_content)
-                    if indexing_technique == 'high_quality' or embedding_model:
-                        tokens += embedding_model.get_num_tokens(document.page_content)
+
+                if indexing_technique == 'high_quality' or embedding_model:
+                    tokens += sum(embedding_model.get_num_tokens_batch(
+                        [document.page_content for document in documents]
+                    ))
 
         if doc_form and doc_form == 'qa_model':
             text_generation_model = ModelFactory.get_text_generation_model(
@@ -393,8 +431,24 @@ class IndexingRunner:
 
     def _load_data(self, dataset_document: DatasetDocument) -> List[Document]:
         # load file
+        text_docs = list(self._lazy_load_data(dataset_document))
+
+        # update document status to splitting
+        self._update_document_index_status(
+            document_id=dataset_document.id,
+            after_indexing_status="splitting",
+            extra_update_params={
+                DatasetDocument.word_count: sum([len(text_doc.page_content) for text_doc in text_docs]),
+                DatasetDocument.parsing_completed_at: datetime.datetime.utcnow()
+            }
+        )
+
+        return text_docs
+
+    def _lazy_load_data(self, dataset_document: DatasetDocument) -> Iterator[Document]:
+        """Load the text docs of the document one by one, as the loader parses them."""
         if dataset_document.data_source_type not in ["upload_file", "notion_import"]:
-            return []
+            return
 
         data_source_info = dataset_document.data_source_info_dict
         text_docs = []
@@ -407,30 +461,18 @@ class IndexingRunner:
                 one_or_none()
 
             if file_detail:
-                text_docs = FileExtractor.load(file_detail)
+                text_docs = FileExtractor.lazy_load(file_detail)
         elif dataset_document.data_source_type == 'notion_import':
             loader = NotionLoader.from_document(dataset_document)
             text_docs = loader.load()
 
-        # update document status to splitting
-        self._update_document_index_status(
-            document_id=dataset_document.id,
-            after_indexing_status="splitting",
-            extra_update_params={
-                DatasetDocument.word_count: sum([len(text_doc.page_content) for text_doc in text_docs]),
-                DatasetDocument.parsing_completed_at: datetime.datetime.utcnow()
-            }
-        )
-
         # replace doc id to document model id
-        text_docs = cast(List[Document], text_docs)
         for text_doc in text_docs:
             # remove invalid symbol
             text_doc.page_content = self.filter_string(text_doc.page_content)
             text_doc.metadata['document_id'] = dataset_document.id
             text_doc.metadata['dataset_id'] = dataset_document.dataset_id
-
-        return text_docs
+            yield text_doc
 
     def filter_string(self, text):
         text = re.sub(r'<\|', '<', text)
@@ -682,10 +724,7 @@ class IndexingRunner:
             self._check_document_paused_status(dataset_document.id)
             chunk_documents = documents[i:i + chunk_size]
             if dataset.indexing_technique == 'high_quality' or embedding_model:
-                tokens += sum(
-                    embedding_model.get_num_tokens(document.page_content)
-                    for document in chunk_documents
-                )
+                tokens += self._get_segments_tokens(dataset_document.id, chunk_documents)
 
             # save vector index
             if vector_index:
@@ -706,6 +745,7 @@ class IndexingRunner:
             })
 
             db.session.commit()
+            RetrievalCache(dataset.id).bump_version()
 
         indexing_end_at = time.perf_counter()
 
@@ -720,6 +760,18 @@ class IndexingRunner:
             }
         )
 
+    def _get_segments_tokens(self, document_id: str, documents: List[Document]) -> int:
+        """
+        Get the tokens of the documents counted when their segments were saved.
+        """
+        document_ids = [document.metadata['doc_id'] for document in documents]
+        tokens = db.session.query(func.sum(DocumentSegment.tokens)).filter(
+            DocumentSegment.document_id == document_id,
+            DocumentSegment.index_node_id.in_(document_ids)
+        ).scalar()
+
+        return tokens or 0
+
     def _check_document_paused_status(self, document_id: str):
         indexing_cache_key = 'document_{}_is_paused'.format(document_id)
         result = redis_client.get(indexing_cache_key)
@@ -778,6 +830,8 @@ class IndexingRunner:
         if index:
             index.add_texts(documents)
 
+        RetrievalCache(dataset.id).bump_version()
+
 
 class DocumentIsPausedException(Exception):
     pass
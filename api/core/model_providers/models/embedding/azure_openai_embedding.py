@@ -1,5 +1,6 @@
 import decimal
 import logging
+from typing import List
 
 import openai
 import tiktoken
@@ -14,6 +15,9 @@ AZURE_OPENAI_API_VERSION = '2023-07-01-preview'
 
 
 class AzureOpenAIEmbedding(BaseEmbedding):
+    # OpenAIEmbeddings.embed_query is embed_documents of the single text
+    query_batchable = True
+
     def __init__(self, model_provider: BaseModelProvider, name: str):
         self.credentials = model_provider.get_model_credentials(
             model_name=name,
@@ -58,6 +62,17 @@ class AzureOpenAIEmbedding(BaseEmbedding):
         # calculate the number of tokens in the encoded text
         return len(tokenized_text)
 
+    def get_num_tokens_batch(self, texts: List[str]) -> List[int]:
+        """
+        get num tokens of each text, in input order.
+
+        :param texts:
+        :return:
+        """
+        enc = tiktoken.encoding_for_model(self.credentials.get('base_model_name'))
+
+        return self._get_num_tokens_batch_by_encoding(enc, texts)
+
     def handle_exceptions(self, ex: Exception) -> Exception:
         if isinstance(ex, openai.error.InvalidRequestError):
             logging.warning("Invalid request to Azure OpenAI API.")
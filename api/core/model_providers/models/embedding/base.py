@@ -1,5 +1,6 @@
+import os
 from abc import abstractmethod
-from typing import Any
+from typing import Any, List
 import decimal
 
 import tiktoken
@@ -14,6 +15,8 @@ logger = logging.getLogger(__name__)
 class BaseEmbedding(BaseProviderModel):
     name: str
     type: ModelType = ModelType.EMBEDDINGS
+    # whether the client embeds a query exactly as a document, so that queries can be embedded in batches
+    query_batchable: bool = False
 
     def __init__(self, model_provider: BaseModelProvider, client: Any, name: str):
         super().__init__(model_provider, client)
@@ -88,6 +91,39 @@ class BaseEmbedding(BaseProviderModel):
 
         return len(_get_token_ids_default_method(text))
 
+    def get_num_tokens_batch(self, texts: List[str]) -> List[int]:
+        """
+        get num tokens of each text, in input order.
+
+        :param texts:
+        :return:
+        """
+        return [self.get_num_tokens(text) for text in texts]
+
+    def _get_num_tokens_batch_by_encoding(self, enc: tiktoken.Encoding, texts: List[str]) -> List[int]:
+        """
+        get num tokens of each text with tiktoken batch encode,
+        which encodes in a thread pool outside the GIL.
+
+        :param enc:
+        :param texts:
+        :return:
+        """
+        non_empty_indexes = [i for i, text in enumerate(texts) if len(text) > 0]
+        if not non_empty_indexes:
+            return [0] * len(texts)
+
+        tokenized_texts = enc.encode_batch(
+            [texts[i] for i in non_empty_indexes],
+            num_threads=os.cpu_count() or 1
+        )
+
+        num_tokens = [0] * len(texts)
+        for i, tokenized_text in zip(non_empty_indexes, tokenized_texts):
+            num_tokens[i] = len(tokenized_text)
+
+        return num_tokens
+
     def get_currency(self):
         """
         get token currency.
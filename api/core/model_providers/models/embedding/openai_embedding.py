@@ -1,5 +1,6 @@
 import decimal
 import logging
+from typing import List
 
 import openai
 import tiktoken
@@ -12,6 +13,9 @@ from core.model_providers.providers.base import BaseModelProvider
 
 
 class OpenAIEmbedding(BaseEmbedding):
+    # OpenAIEmbeddings.embed_query is embed_documents of the single text
+    query_batchable = True
+
     def __init__(self, model_provider: BaseModelProvider, name: str):
         credentials = model_provider.get_model_credentials(
             model_name=name,
@@ -42,6 +46,17 @@ class OpenAIEmbedding(BaseEmbedding):
         # calculate the number of tokens in the encoded text
         return len(tokenized_text)
 
+    def get_num_tokens_batch(self, texts: List[str]) -> List[int]:
+        """
+        get num tokens of each text, in input order.
+
+        :param texts:
+        :return:
+        """
+        enc = tiktoken.encoding_for_model(self.name)
+
+        return self._get_num_tokens_batch_by_encoding(enc, texts)
+
     def handle_exceptions(self, ex: Exception) -> Exception:
         if isinstance(ex, openai.error.InvalidRequestError):
             logging.warning("Invalid request to OpenAI API.")
@@ -21,6 +21,7 @@ from core.model_providers.models.entity.model_params import ModelKwargs, ModelMo
 from core.model_providers.models.llm.base import BaseLLM
 from core.tool.current_datetime_tool import DatetimeTool
 from core.tool.dataset_retriever_tool import DatasetRetrieverTool
+from core.tool.multi_dataset_retriever_tool import MultiDatasetRetrieverTool
 from core.tool.provider.serpapi_provider import SerpAPIToolProvider
 from core.tool.serpapi_wrapper import OptimizedSerpAPIWrapper, OptimizedSerpAPIInput
 from core.tool.web_reader_tool import WebReaderTool
@@ -210,6 +211,17 @@ class OrchestratorRuleParser:
                 tool.callbacks.extend(callbacks)
                 tools.append(tool)
 
+        dataset_tools = [tool for tool in tools if isinstance(tool, DatasetRetrieverTool)]
+        if current_app.config['DATASET_RETRIEVAL_FANOUT_ENABLED'] and len(dataset_tools) > 1:
+            # query all the datasets at once instead of one tool call per dataset
+            tool = MultiDatasetRetrieverTool.from_dataset_tools(
+                dataset_tools,
+                deadline_ms=current_app.config['DATASET_RETRIEVAL_DEADLINE_MS'],
+                callbacks=[]
+            )
+            tool.callbacks.extend(callbacks)
+            tools = [tool] + [tool for tool in tools if not isinstance(tool, DatasetRetrieverTool)]
+
         return tools
 
     def to_dataset_retriever_tool(self, tool_config: dict, conversation_message_task: ConversationMessageTask,
@@ -1,19 +1,25 @@
+import hashlib
 import json
-from typing import Type
+from typing import Type, List, Tuple, Optional
 
 from flask import current_app
+from langchain.schema import Document
 from langchain.tools import BaseTool
 from pydantic import Field, BaseModel
 
 from core.callback_handler.index_tool_callback_handler import DatasetIndexToolCallbackHandler
 from core.conversation_message_task import ConversationMessageTask
 from core.embedding.cached_embedding import CacheEmbedding
+from core.index.hybrid_search import HybridSearch, HybridSearchConfig
 from core.index.keyword_table_index.keyword_table_index import KeywordTableIndex, KeywordTableConfig
+from core.index.retrieval_cache import RetrievalCache
 from core.index.vector_index.vector_index import VectorIndex
 from core.model_providers.error import LLMBadRequestError, ProviderTokenNotInitError
 from core.model_providers.model_factory import ModelFactory
 from extensions.ext_database import db
-from models.dataset import Dataset, DocumentSegment, Document
+from libs import helper
+from models.dataset import Dataset, DocumentSegment
+from models.dataset import Document as DatasetDocument
 
 
 class DatasetRetrieverToolInput(BaseModel):
@@ -50,117 +56,248 @@ class DatasetRetrieverTool(BaseTool):
         )
 
     def _run(self, query: str) -> str:
-        dataset = db.session.query(Dataset).filter(
+        dataset = self._get_dataset()
+
+        if not dataset:
+            return f'[{self.name} failed to find dataset with id {self.dataset_id}.]'
+
+        if dataset.indexing_technique == "economy":
+            # use keyword table query
+            documents = self.search_dataset(dataset, query, self.k)
+            return str("\n".join([document.page_content for document in documents]))
+        else:
+            try:
+                documents = self.search_dataset(dataset, query, self.k)
+            except LLMBadRequestError:
+                return ''
+            except ProviderTokenNotInitError:
+                return ''
+
+            return self._to_context(dataset, documents)
+
+    def _get_dataset(self) -> Dataset:
+        return db.session.query(Dataset).filter(
             Dataset.tenant_id == self.tenant_id,
             Dataset.id == self.dataset_id
         ).first()
 
+    def _to_context(self, dataset: Dataset, documents: List[Document]) -> str:
+        hit_callback = DatasetIndexToolCallbackHandler(dataset.id, self.conversation_message_task)
+        hit_callback.on_tool_end(documents)
+        document_score_list = {}
+        if dataset.indexing_technique != "economy":
+            for item in documents:
+                # hybrid search hits found by keyword only have no similarity score
+                document_score_list[item.metadata['doc_id']] = item.metadata.get('score')
+        document_context_list = []
+        index_node_ids = [document.metadata['doc_id'] for document in documents]
+        segments = DocumentSegment.query.filter(DocumentSegment.dataset_id == self.dataset_id,
+                                                DocumentSegment.completed_at.isnot(None),
+                                                DocumentSegment.status == 'completed',
+                                                DocumentSegment.enabled == True,
+                                                DocumentSegment.index_node_id.in_(index_node_ids)
+                                                ).all()
+
+        if segments:
+            index_node_id_to_position = {id: position for position, id in enumerate(index_node_ids)}
+            sorted_segments = sorted(segments,
+                                     key=lambda segment: index_node_id_to_position.get(segment.index_node_id,
+                                                                                       float('inf')))
+            for segment in sorted_segments:
+                if segment.answer:
+                    document_context_list.append(f'question:{segment.content} answer:{segment.answer}')
+                else:
+                    document_context_list.append(segment.content)
+            if self.return_resource:
+                context_list = []
+                resource_number = 1
+                for segment in sorted_segments:
+                    context = {}
+                    document = DatasetDocument.query.filter(DatasetDocument.id == segment.document_id,
+                                                            DatasetDocument.enabled == True,
+                                                            DatasetDocument.archived == False,
+                                                            ).first()
+                    if dataset and document:
+                        source = {
+                            'position': resource_number,
+                            'dataset_id': dataset.id,
+                            'dataset_name': dataset.name,
+                            'document_id': document.id,
+                            'document_name': document.name,
+                            'data_source_type': document.data_source_type,
+                            'segment_id': segment.id,
+                            'retriever_from': self.retriever_from
+                        }
+                        if dataset.indexing_technique != "economy":
+                            source['score'] = document_score_list.get(segment.index_node_id)
+                        if self.retriever_from == 'dev':
+                            source['hit_count'] = segment.hit_count
+                            source['word_count'] = segment.word_count
+                            source['segment_position'] = segment.position
+                            source['index_node_hash'] = segment.index_node_hash
+                        if segment.answer:
+                            source['content'] = f'question:{segment.content} \nanswer:{segment.answer}'
+                        else:
+                            source['content'] = segment.content
+                        context_list.append(source)
+                    resource_number += 1
+                hit_callback.return_retriever_resource_info(context_list)
+
+        return str("\n".join(document_context_list))
+
+    @classmethod
+    def search_dataset(cls, dataset: Dataset, query: str, k: int) -> List[Document]:
+        """
+        Search a dataset with the method of its indexing technique and retrieval config.
+
+        :param dataset: dataset
+        :param query: query
+        :param k: max documents
+        :return: documents, with scores in metadata except for keyword count ranking
+        """
+        if k <= 0:
+            return []
+
+        search_type, hybrid_search_config = cls._get_search_type(dataset)
+
+        # read the version before searching, a search racing an indexing task is cached under the old version
+        retrieval_cache = RetrievalCache(dataset.id)
+        version = retrieval_cache.get_version()
+        documents = retrieval_cache.get(version, query, k, search_type)
+        if documents is not None:
+            return documents
+
+        kw_table_index = cls._get_keyword_table_index(dataset)
+
+        if dataset.indexing_technique == "economy":
+            documents = kw_table_index.search(query, search_kwargs={'k': k})
+            retrieval_cache.set(version, query, k, search_type, documents)
+            return documents
+
+        vector_index = cls._get_vector_index(dataset)
+
+        if hybrid_search_config:
+            hybrid_search = HybridSearch(vector_index, kw_table_index, hybrid_search_config)
+            documents = hybrid_search.search(query, k)
+            # results missing a side cut by the latency budget are not cached
+            if not hybrid_search.timed_out:
+                retrieval_cache.set(version, query, k, search_type, documents)
+
+            return documents
+
+        documents = vector_index.search(
+            query,
+            search_type='similarity_score_threshold',
+            search_kwargs={
+                'k': k
+            }
+        )
+        retrieval_cache.set(version, query, k, search_type, documents)
+
+        return documents
+
+    @classmethod
+    async def asearch_dataset(cls, dataset: Dataset, query: str, k: int) -> List[Document]:
+        """
+        Search a dataset like search_dataset, without blocking the event loop.
+
+        :param dataset: dataset
+        :param query: query
+        :param k: max documents
+        :return: documents, with scores in metadata except for keyword count ranking
+        """
+        if k <= 0:
+            return []
+
+        search_type, hybrid_search_config = cls._get_search_type(dataset)
+
+        retrieval_cache = RetrievalCache(dataset.id)
+        version = await helper.run_in_app_context(retrieval_cache.get_version)
+        documents = await helper.run_in_app_context(retrieval_cache.get, version, query, k, search_type)
+        if documents is not None:
+            return documents
+
+        kw_table_index = cls._get_keyword_table_index(dataset)
+
+        if dataset.indexing_technique == "economy":
+            documents = await kw_table_index.asearch(query, search_kwargs={'k': k})
+            await helper.run_in_app_context(retrieval_cache.set, version, query, k, search_type, documents)
+            return documents
+
+        vector_index = await helper.run_in_app_context(cls._get_vector_index, dataset)
+
+        if hybrid_search_config:
+            hybrid_search = HybridSearch(vector_index, kw_table_index, hybrid_search_config)
+            documents = await hybrid_search.asearch(query, k)
+            if not hybrid_search.timed_out:
+                await helper.run_in_app_context(retrieval_cache.set, version, query, k, search_type, documents)
+
+            return documents
+
+        documents = await vector_index.asearch(
+            query,
+            search_type='similarity_score_threshold',
+            search_kwargs={
+                'k': k
+            }
+        )
+        await helper.run_in_app_context(retrieval_cache.set, version, query, k, search_type, documents)
+
+        return documents
+
+    @classmethod
+    def _get_search_type(cls, dataset: Dataset) -> Tuple[str, Optional[HybridSearchConfig]]:
+        if dataset.indexing_technique == "economy":
+            return 'keyword_table_{}'.format(current_app.config['KEYWORD_TABLE_SCORING_MODE']), None
+
+        hybrid_search_config = HybridSearchConfig.from_retrieval_config(dataset.retrieval_config_dict)
+        if hybrid_search_config:
+            search_type = 'hybrid_{}'.format(hashlib.md5(hybrid_search_config.json().encode()).hexdigest())
+            return search_type, hybrid_search_config
+
+        return 'semantic_search', None
+
+    @classmethod
+    def _get_keyword_table_index(cls, dataset: Dataset) -> KeywordTableIndex:
+        return KeywordTableIndex(
+            dataset=dataset,
+            config=KeywordTableConfig(
+                max_keywords_per_chunk=5,
+                scoring_mode=current_app.config['KEYWORD_TABLE_SCORING_MODE']
+            )
+        )
+
+    @classmethod
+    def _get_vector_index(cls, dataset: Dataset) -> VectorIndex:
+        embedding_model = ModelFactory.get_embedding_model(
+            tenant_id=dataset.tenant_id,
+            model_provider_name=dataset.embedding_model_provider,
+            model_name=dataset.embedding_model
+        )
+        embeddings = CacheEmbedding(embedding_model)
+
+        return VectorIndex(
+            dataset=dataset,
+            config=current_app.config,
+            embeddings=embeddings
+        )
+
+    async def _arun(self, query: str) -> str:
+        dataset = await helper.run_in_app_context(self._get_dataset)
+
         if not dataset:
             return f'[{self.name} failed to find dataset with id {self.dataset_id}.]'
 
         if dataset.indexing_technique == "economy":
             # use keyword table query
-            kw_table_index = KeywordTableIndex(
-                dataset=dataset,
-                config=KeywordTableConfig(
-                    max_keywords_per_chunk=5
-                )
-            )
-
-            documents = kw_table_index.search(query, search_kwargs={'k': self.k})
+            documents = await self.asearch_dataset(dataset, query, self.k)
             return str("\n".join([document.page_content for document in documents]))
         else:
-
             try:
-                embedding_model = ModelFactory.get_embedding_model(
-                    tenant_id=dataset.tenant_id,
-                    model_provider_name=dataset.embedding_model_provider,
-                    model_name=dataset.embedding_model
-                )
+                documents = await self.asearch_dataset(dataset, query, self.k)
             except LLMBadRequestError:
                 return ''
             except ProviderTokenNotInitError:
                 return ''
-            embeddings = CacheEmbedding(embedding_model)
-
-            vector_index = VectorIndex(
-                dataset=dataset,
-                config=current_app.config,
-                embeddings=embeddings
-            )
 
-            if self.k > 0:
-                documents = vector_index.search(
-                    query,
-                    search_type='similarity_score_threshold',
-                    search_kwargs={
-                        'k': self.k
-                    }
-                )
-            else:
-                documents = []
-
-            hit_callback = DatasetIndexToolCallbackHandler(dataset.id, self.conversation_message_task)
-            hit_callback.on_tool_end(documents)
-            document_score_list = {}
-            if dataset.indexing_technique != "economy":
-                for item in documents:
-                    document_score_list[item.metadata['doc_id']] = item.metadata['score']
-            document_context_list = []
-            index_node_ids = [document.metadata['doc_id'] for document in documents]
-            segments = DocumentSegment.query.filter(DocumentSegment.dataset_id == self.dataset_id,
-                                                    DocumentSegment.completed_at.isnot(None),
-                                                    DocumentSegment.status == 'completed',
-                                                    DocumentSegment.enabled == True,
-                                                    DocumentSegment.index_node_id.in_(index_node_ids)
-                                                    ).all()
-
-            if segments:
-                index_node_id_to_position = {id: position for position, id in enumerate(index_node_ids)}
-                sorted_segments = sorted(segments,
-                                         key=lambda segment: index_node_id_to_position.get(segment.index_node_id,
-                                                                                           float('inf')))
-                for segment in sorted_segments:
-                    if segment.answer:
-                        document_context_list.append(f'question:{segment.content} answer:{segment.answer}')
-                    else:
-                        document_context_list.append(segment.content)
-                if self.return_resource:
-                    context_list = []
-                    resource_number = 1
-                    for segment in sorted_segments:
-                        context = {}
-                        document = Document.query.filter(Document.id == segment.document_id,
-                                                         Document.enabled == True,
-                                                         Document.archived == False,
-                                                         ).first()
-                        if dataset and document:
-                            source = {
-                                'position': resource_number,
-                                'dataset_id': dataset.id,
-                                'dataset_name': dataset.name,
-                                'document_id': document.id,
-                                'document_name': document.name,
-                                'data_source_type': document.data_source_type,
-                                'segment_id': segment.id,
-                                'retriever_from': self.retriever_from
-                            }
-                            if dataset.indexing_technique != "economy":
-                                source['score'] = document_score_list.get(segment.index_node_id)
-                            if self.retriever_from == 'dev':
-                                source['hit_count'] = segment.hit_count
-                                source['word_count'] = segment.word_count
-                                source['segment_position'] = segment.position
-                                source['index_node_hash'] = segment.index_node_hash
-                            if segment.answer:
-                                source['content'] = f'question:{segment.content} \nanswer:{segment.answer}'
-                            else:
-                                source['content'] = segment.content
-                            context_list.append(source)
-                        resource_number += 1
-                    hit_callback.return_retriever_resource_info(context_list)
-
-            return str("\n".join(document_context_list))
-
-    async def _arun(self, tool_input: str) -> str:
-        raise NotImplementedError()
+            return await helper.run_in_app_context(self._to_context, dataset, documents)
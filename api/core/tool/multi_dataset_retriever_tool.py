@@ -0,0 +1,301 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Type, List, Tuple, Optional
+
+from flask import current_app, Flask
+from langchain.schema import Document
+from langchain.tools import BaseTool
+from pydantic import BaseModel
+
+from core.callback_handler.index_tool_callback_handler import DatasetIndexToolCallbackHandler
+from core.conversation_message_task import ConversationMessageTask, DatasetQueryObj
+from core.embedding.cached_embedding import CacheEmbedding
+from core.index.hybrid_search import HybridSearchConfig
+from core.model_providers.model_factory import ModelFactory
+from core.tool.dataset_retriever_tool import DatasetRetrieverTool, DatasetRetrieverToolInput
+from extensions.ext_database import db
+from libs import helper
+from models.dataset import Dataset, DocumentSegment
+from models.dataset import Document as DatasetDocument
+
+# the rank constant of reciprocal rank fusion across datasets
+RRF_K = 60
+
+
+class MultiDatasetRetrieverTool(BaseTool):
+    """
+    Tool for querying several datasets at once.
+
+    The datasets are searched concurrently, the query is embedded once per embedding model
+    beforehand. The hits are merged by score, or by rank when the datasets score on different
+    scales, and deduplicated. Datasets that do not answer before the deadline are left out.
+    """
+    name: str = "datasets"
+    args_schema: Type[BaseModel] = DatasetRetrieverToolInput
+    description: str = "use this to retrieve datasets. "
+
+    tenant_id: str
+    dataset_ids: List[str]
+    k: int = 3
+    deadline_ms: int = 0
+    conversation_message_task: ConversationMessageTask
+    return_resource: str
+    retriever_from: str
+
+    @classmethod
+    def from_dataset_tools(cls, tools: List[DatasetRetrieverTool], **kwargs):
+        description = 'useful for when you want to answer queries about any of these: ' \
+                      + '; '.join([tool.description for tool in tools])
+
+        return cls(
+            tenant_id=tools[0].tenant_id,
+            dataset_ids=[tool.dataset_id for tool in tools],
+            k=min([tool.k for tool in tools]),
+            description=description,
+            conversation_message_task=tools[0].conversation_message_task,
+            return_resource=tools[0].return_resource,
+            retriever_from=tools[0].retriever_from,
+            **kwargs
+        )
+
+    def _run(self, query: str) -> str:
+        datasets = self._get_datasets()
+
+        if not datasets:
+            return f'[{self.name} failed to find datasets with ids {", ".join(self.dataset_ids)}.]'
+
+        for dataset in datasets:
+            self.conversation_message_task.on_dataset_query_end(DatasetQueryObj(dataset_id=dataset.id, query=query))
+
+        self._embed_query(datasets, query)
+
+        flask_app = current_app._get_current_object()
+        executor = ThreadPoolExecutor(max_workers=len(datasets))
+        try:
+            futures = {
+                executor.submit(self._search_dataset, flask_app, dataset.id, query): dataset
+                for dataset in datasets
+            }
+
+            done, not_done = wait(futures.keys(), timeout=self.deadline_ms / 1000 if self.deadline_ms > 0 else None)
+        finally:
+            executor.shutdown(wait=False)
+
+        for future in not_done:
+            logging.warning(f'Dataset {futures[future].id} missed the retrieval deadline of {self.deadline_ms}ms')
+
+        dataset_documents = []
+        for future in done:
+            try:
+                dataset_documents.append((futures[future], future.result()))
+            except Exception:
+                logging.exception(f'Failed to retrieve dataset {futures[future].id}')
+
+        hits = self._merge_documents(dataset_documents)
+        self._on_hits(datasets, hits)
+
+        return self._to_context(hits)
+
+    def _get_datasets(self) -> List[Dataset]:
+        return db.session.query(Dataset).filter(
+            Dataset.tenant_id == self.tenant_id,
+            Dataset.id.in_(self.dataset_ids)
+        ).all()
+
+    def _get_embedding_datasets(self, datasets: List[Dataset]) -> List[Dataset]:
+        """Get one of the datasets of each embedding model."""
+        embedding_models = {
+            (dataset.embedding_model_provider, dataset.embedding_model): dataset
+            for dataset in datasets if dataset.indexing_technique == 'high_quality'
+        }
+
+        return list(embedding_models.values())
+
+    def _embed_query(self, datasets: List[Dataset], query: str) -> None:
+        """Embed the query once per embedding model, the dataset searches then read it from the embedding cache."""
+        for dataset in self._get_embedding_datasets(datasets):
+            try:
+                embedding_model = ModelFactory.get_embedding_model(
+                    tenant_id=dataset.tenant_id,
+                    model_provider_name=dataset.embedding_model_provider,
+                    model_name=dataset.embedding_model
+                )
+                CacheEmbedding(embedding_model).embed_query(query)
+            except Exception:
+                # the dataset search reports it
+                logging.debug(f'Failed to embed query for dataset {dataset.id}', exc_info=True)
+
+    async def _aembed_query(self, datasets: List[Dataset], query: str) -> None:
+        """Embed the query once per embedding model concurrently, like _embed_query."""
+        async def embed_query(dataset: Dataset):
+            try:
+                embedding_model = await helper.run_in_app_context(
+                    ModelFactory.get_embedding_model,
+                    tenant_id=dataset.tenant_id,
+                    model_provider_name=dataset.embedding_model_provider,
+                    model_name=dataset.embedding_model
+                )
+                await CacheEmbedding(embedding_model).aembed_query(query)
+            except Exception:
+                # the dataset search reports it
+                logging.debug(f'Failed to embed query for dataset {dataset.id}', exc_info=True)
+
+        await asyncio.gather(*[embed_query(dataset) for dataset in self._get_embedding_datasets(datasets)])
+
+    def _search_dataset(self, flask_app: Flask, dataset_id: str, query: str) -> List[Document]:
+        with flask_app.app_context():
+            dataset = db.session.query(Dataset).filter(Dataset.id == dataset_id).first()
+            return DatasetRetrieverTool.search_dataset(dataset, query, self.k)
+
+    def _merge_documents(self, dataset_documents: List[Tuple[Dataset, List[Document]]]) \
+            -> List[Tuple[Dataset, Document, Optional[float]]]:
+        """
+        Merge the hits of the datasets, keeping the first of duplicated contents.
+
+        The hits of semantic search datasets are all scored by cosine similarity, so they are merged
+        by score. The scores of keyword and hybrid search are on other scales, so once such a dataset
+        takes part, the hits of all datasets are fused by their rank in their dataset (rrf) instead.
+        The merged hits keep their own score.
+        """
+        hits = []
+        if all(self._is_semantic_search(dataset) for dataset, _ in dataset_documents):
+            for dataset, documents in dataset_documents:
+                for document in documents:
+                    hits.append((dataset, document, document.metadata.get('score') or 0.0))
+        else:
+            for dataset, documents in dataset_documents:
+                for rank, document in enumerate(documents, start=1):
+                    hits.append((dataset, document, 1 / (RRF_K + rank)))
+
+        hits.sort(key=lambda hit: -hit[2])
+
+        merged_hits = []
+        seen_keys = set()
+        for dataset, document, _ in hits:
+            key = document.metadata.get('doc_hash') or document.metadata['doc_id']
+            if key in seen_keys:
+                continue
+
+            seen_keys.add(key)
+            merged_hits.append((dataset, document, document.metadata.get('score')))
+            if len(merged_hits) >= self.k:
+                break
+
+        return merged_hits
+
+    @staticmethod
+    def _is_semantic_search(dataset: Dataset) -> bool:
+        return dataset.indexing_technique == 'high_quality' \
+            and HybridSearchConfig.from_retrieval_config(dataset.retrieval_config_dict) is None
+
+    def _on_hits(self, datasets: List[Dataset], hits: List[Tuple[Dataset, Document, Optional[float]]]) -> None:
+        for dataset in datasets:
+            documents = [document for hit_dataset, document, _ in hits if hit_dataset.id == dataset.id]
+            if documents:
+                DatasetIndexToolCallbackHandler(dataset.id, self.conversation_message_task).on_tool_end(documents)
+
+    def _to_context(self, hits: List[Tuple[Dataset, Document, Optional[float]]]) -> str:
+        if not hits:
+            return ''
+
+        index_node_ids = [document.metadata['doc_id'] for _, document, _ in hits]
+        segments = DocumentSegment.query.filter(DocumentSegment.dataset_id.in_([dataset.id for dataset, _, _ in hits]),
+                                                DocumentSegment.completed_at.isnot(None),
+                                                DocumentSegment.status == 'completed',
+                                                DocumentSegment.enabled == True,
+                                                DocumentSegment.index_node_id.in_(index_node_ids)
+                                                ).all()
+        segment_map = {(segment.dataset_id, segment.index_node_id): segment for segment in segments}
+
+        sorted_hits = []
+        for dataset, document, score in hits:
+            segment = segment_map.get((dataset.id, document.metadata['doc_id']))
+            if segment:
+                sorted_hits.append((dataset, segment, score))
+
+        document_context_list = []
+        for _, segment, _ in sorted_hits:
+            if segment.answer:
+                document_context_list.append(f'question:{segment.content} answer:{segment.answer}')
+            else:
+                document_context_list.append(segment.content)
+
+        if self.return_resource and sorted_hits:
+            documents = DatasetDocument.query.filter(
+                DatasetDocument.id.in_([segment.document_id for _, segment, _ in sorted_hits]),
+                DatasetDocument.enabled == True,
+                DatasetDocument.archived == False,
+            ).all()
+            document_map = {document.id: document for document in documents}
+
+            context_list = []
+            for resource_number, (dataset, segment, score) in enumerate(sorted_hits, start=1):
+                document = document_map.get(segment.document_id)
+                if not document:
+                    continue
+
+                source = {
+                    'position': resource_number,
+                    'dataset_id': dataset.id,
+                    'dataset_name': dataset.name,
+                    'document_id': document.id,
+                    'document_name': document.name,
+                    'data_source_type': document.data_source_type,
+                    'segment_id': segment.id,
+                    'retriever_from': self.retriever_from
+                }
+                if dataset.indexing_technique != "economy":
+                    source['score'] = score
+                if self.retriever_from == 'dev':
+                    source['hit_count'] = segment.hit_count
+                    source['word_count'] = segment.word_count
+                    source['segment_position'] = segment.position
+                    source['index_node_hash'] = segment.index_node_hash
+                if segment.answer:
+                    source['content'] = f'question:{segment.content} \nanswer:{segment.answer}'
+                else:
+                    source['content'] = segment.content
+                context_list.append(source)
+
+            DatasetIndexToolCallbackHandler(sorted_hits[0][0].id, self.conversation_message_task) \
+                .return_retriever_resource_info(context_list)
+
+        return str("\n".join(document_context_list))
+
+    async def _arun(self, query: str) -> str:
+        datasets = await helper.run_in_app_context(self._get_datasets)
+
+        if not datasets:
+            return f'[{self.name} failed to find datasets with ids {", ".join(self.dataset_ids)}.]'
+
+        for dataset in datasets:
+            self.conversation_message_task.on_dataset_query_end(DatasetQueryObj(dataset_id=dataset.id, query=query))
+
+        await self._aembed_query(datasets, query)
+
+        tasks = {
+            asyncio.ensure_future(DatasetRetrieverTool.asearch_dataset(dataset, query, self.k)): dataset
+            for dataset in datasets
+        }
+
+        done, not_done = await asyncio.wait(
+            tasks.keys(),
+            timeout=self.deadline_ms / 1000 if self.deadline_ms > 0 else None
+        )
+
+        for task in not_done:
+            task.cancel()
+            logging.warning(f'Dataset {tasks[task].id} missed the retrieval deadline of {self.deadline_ms}ms')
+
+        dataset_documents = []
+        for task in done:
+            try:
+                dataset_documents.append((tasks[task], task.result()))
+            except Exception:
+                logging.exception(f'Failed to retrieve dataset {tasks[task].id}')
+
+        hits = self._merge_documents(dataset_documents)
+        await helper.run_in_app_context(self._on_hits, datasets, hits)
+
+        return await helper.run_in_app_context(self._to_context, hits)
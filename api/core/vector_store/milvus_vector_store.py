@@ -1,3 +1,6 @@
+import json
+from typing import List, Set
+
 from langchain.vectorstores import  Milvus
 
 
@@ -34,5 +37,16 @@ class MilvusVectorStore(Milvus):
 
         return True
 
+    def get_existing_ids(self, uuids: List[str]) -> Set[str]:
+        if self.col is None:
+            return set()
+
+        result = self.col.query(
+            expr='doc_id in {}'.format(json.dumps(uuids)),
+            output_fields=['doc_id']
+        )
+
+        return {entry['doc_id'] for entry in result}
+
     def delete(self):
         self._client.schema.delete_class(self._index_name)
@@ -0,0 +1,509 @@
+import json
+import math
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import portalocker
+from langchain.embeddings.base import Embeddings
+from langchain.schema import Document
+from langchain.vectorstores import VectorStore
+
+
+class _Collection:
+    """Arrays of a collection loaded by a process, for one generation of its files."""
+
+    def __init__(self, generation: str, dim: int, count: int, vectors: Optional[np.ndarray],
+                 ids: np.ndarray, document_ids: np.ndarray, offsets: np.ndarray,
+                 centroids: Optional[np.ndarray], assignments: Optional[np.ndarray], ivf_count: int):
+        self.generation = generation
+        self.dim = dim
+        self.count = count
+        self.vectors = vectors
+        self.ids = ids
+        self.document_ids = document_ids
+        self.offsets = offsets
+        self.centroids = centroids
+        self.assignments = assignments
+        self.ivf_count = ivf_count
+        self.alive = ids != ''
+        self.rows = {node_id: row for row, node_id in enumerate(ids.tolist()) if node_id}
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Vectors of an index in memory-mapped files of a local directory, searched with NumPy dot products.
+
+    The normalized float32 vectors are appended to a raw file, next to arrays of the node ids,
+    document ids and payload offsets of each row. Deleted rows are blanked in the id array and
+    dropped by compaction once they outnumber the live rows. Past `ivf_threshold` live rows, the
+    rows are clustered by spherical k-means into an inverted file, and searches only score the
+    rows of the `ivf_nprobe` clusters closest to the query.
+
+    Every call takes a file lock on the directory, shared for reads and exclusive for writes,
+    so several processes can share it. Writers set a new unique generation in the meta file last,
+    and processes reload their arrays when it changes, also after the index was deleted and recreated.
+    """
+
+    META_FILENAME = 'meta.json'
+    LOCK_FILENAME = '.lock'
+    VECTORS_FILENAME = 'vectors.f32'
+    PAYLOADS_FILENAME = 'payloads.jsonl'
+    IDS_FILENAME = 'ids.npy'
+    DOCUMENT_IDS_FILENAME = 'document_ids.npy'
+    OFFSETS_FILENAME = 'offsets.npy'
+    CENTROIDS_FILENAME = 'centroids.npy'
+    ASSIGNMENTS_FILENAME = 'assignments.npy'
+
+    LOCK_RETRY_INTERVAL = 0.01
+    SCAN_BATCH_SIZE = 10000
+    KMEANS_ITERATIONS = 10
+    KMEANS_SAMPLES_PER_CLUSTER = 64
+    MAX_IVF_LISTS = 4096
+
+    _collections: Dict[str, _Collection] = {}
+    _collections_lock = threading.RLock()
+
+    def __init__(self, path: str, embedding: Embeddings, ivf_threshold: int = 0, ivf_nprobe: int = 8):
+        self._path = path
+        self._embedding = embedding
+        self._ivf_threshold = ivf_threshold
+        self._ivf_nprobe = ivf_nprobe
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding
+
+    def add_texts(
+            self,
+            texts: Iterable[str],
+            metadatas: Optional[List[dict]] = None,
+            ids: Optional[List[str]] = None,
+            **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+
+        if ids is None:
+            ids = kwargs.get('uuids') or [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+
+        vectors = self._normalize(np.asarray(self._embedding.embed_documents(texts), dtype=np.float32))
+        payloads = [json.dumps({'page_content': text, 'metadata': metadata}, ensure_ascii=False).encode() + b'\n'
+                    for text, metadata in zip(texts, metadatas)]
+        document_ids = [str(metadata.get('document_id') or '') for metadata in metadatas]
+
+        with self._lock(exclusive=True):
+            collection = self._load()
+
+            if collection.count and collection.dim != vectors.shape[1]:
+                raise ValueError(f"Vector dimension {vectors.shape[1]} does not match the index dimension {collection.dim}.")
+
+            # like an upsert, replaced nodes are deleted
+            node_ids = collection.ids.copy()
+            for node_id in ids:
+                row = collection.rows.get(node_id)
+                if row is not None:
+                    node_ids[row] = ''
+
+            vectors_path = os.path.join(self._path, self.VECTORS_FILENAME)
+            payloads_path = os.path.join(self._path, self.PAYLOADS_FILENAME)
+            offsets = collection.offsets
+            with open(vectors_path, 'ab') as f:
+                # drop the rows of a write that failed before committing
+                f.truncate(collection.count * vectors.shape[1] * 4)
+                f.write(vectors.tobytes())
+            with open(payloads_path, 'ab') as f:
+                f.truncate(int(offsets[-1]))
+                f.write(b''.join(payloads))
+
+            new_offsets = offsets[-1] + np.cumsum([len(payload) for payload in payloads], dtype=np.int64)
+
+            assignments = collection.assignments
+            if collection.centroids is not None:
+                assignments = np.concatenate([assignments, self._assign(vectors, collection.centroids)])
+
+            self._write(
+                dim=vectors.shape[1],
+                count=collection.count + len(texts),
+                ids=np.concatenate([node_ids, np.asarray(ids, dtype=str)]),
+                document_ids=np.concatenate([collection.document_ids, np.asarray(document_ids, dtype=str)]),
+                offsets=np.concatenate([offsets, new_offsets]),
+                centroids=collection.centroids,
+                assignments=assignments,
+                ivf_count=collection.ivf_count
+            )
+
+            self._maintain()
+
+        return list(ids)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        docs_and_scores = self.similarity_search_with_score(query, k, **kwargs)
+        return [doc for doc, _ in docs_and_scores]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        docs_and_scores = self.similarity_search_with_score_by_vector(embedding, k, **kwargs)
+        return [doc for doc, _ in docs_and_scores]
+
+    def similarity_search_with_score_by_vector(
+            self,
+            embedding: List[float],
+            k: int = 4,
+            **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        query = self._normalize(np.asarray([embedding], dtype=np.float32))[0]
+
+        with self._lock(exclusive=False):
+            if not os.path.exists(os.path.join(self._path, self.META_FILENAME)):
+                return []
+
+            collection = self._load()
+            if collection.count == 0 or k <= 0:
+                return []
+
+            rows = self._get_candidate_rows(collection, query, k)
+            if len(rows) == 0:
+                return []
+
+            scores = self._score(collection.vectors, rows, query)
+            top = np.argsort(-scores)[:k] if len(scores) <= k else np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            payloads = self._read_payloads(collection, [int(rows[i]) for i in top])
+
+        return [
+            (Document(page_content=payload['page_content'], metadata=payload['metadata']), float(scores[i]))
+            for i, payload in zip(top, payloads)
+        ]
+
+    def _similarity_search_with_relevance_scores(
+            self,
+            query: str,
+            k: int = 4,
+            **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        # vectors are normalized, the cosine similarity is the relevance score
+        return self.similarity_search_with_score(query, k, **kwargs)
+
+    def del_texts_by_ids(self, ids: List[str]) -> None:
+        self._delete_rows(lambda collection: np.isin(collection.ids, np.asarray(ids, dtype=str)))
+
+    def del_texts_by_document_id(self, document_id: str) -> None:
+        self._delete_rows(lambda collection: collection.document_ids == document_id)
+
+    def del_text(self, uuid: str) -> None:
+        self.del_texts_by_ids([uuid])
+
+    def text_exists(self, uuid: str) -> bool:
+        return len(self.get_existing_ids([uuid])) > 0
+
+    def get_existing_ids(self, uuids: List[str]) -> Set[str]:
+        with self._lock(exclusive=False):
+            if not os.path.exists(os.path.join(self._path, self.META_FILENAME)):
+                return set()
+
+            collection = self._load()
+            return {node_id for node_id in uuids if node_id in collection.rows}
+
+    def delete(self):
+        if not os.path.exists(self._path):
+            return
+
+        with self._lock(exclusive=True):
+            with self._collections_lock:
+                self._collections.pop(self._path, None)
+
+            # keep the lock file, other processes may be waiting on it
+            for filename in os.listdir(self._path):
+                if filename == self.LOCK_FILENAME:
+                    continue
+
+                file_path = os.path.join(self._path, filename)
+                if os.path.isdir(file_path):
+                    shutil.rmtree(file_path, ignore_errors=True)
+                else:
+                    os.remove(file_path)
+
+    @classmethod
+    def from_texts(
+            cls,
+            texts: List[str],
+            embedding: Embeddings,
+            metadatas: Optional[List[dict]] = None,
+            ids: Optional[List[str]] = None,
+            path: Optional[str] = None,
+            ivf_threshold: int = 0,
+            ivf_nprobe: int = 8,
+            **kwargs: Any,
+    ) -> 'NumpyVectorStore':
+        if not path:
+            raise ValueError('path must be specified')
+
+        store = cls(path=path, embedding=embedding, ivf_threshold=ivf_threshold, ivf_nprobe=ivf_nprobe)
+        store.add_texts(texts, metadatas=metadatas, ids=ids or kwargs.get('uuids'))
+
+        return store
+
+    def _delete_rows(self, get_mask) -> None:
+        with self._lock(exclusive=True):
+            if not os.path.exists(os.path.join(self._path, self.META_FILENAME)):
+                return
+
+            collection = self._load()
+            mask = get_mask(collection) & collection.alive
+            if not mask.any():
+                return
+
+            node_ids = collection.ids.copy()
+            node_ids[mask] = ''
+
+            self._write(
+                dim=collection.dim,
+                count=collection.count,
+                ids=node_ids,
+                document_ids=collection.document_ids,
+                offsets=collection.offsets,
+                centroids=collection.centroids,
+                assignments=collection.assignments,
+                ivf_count=collection.ivf_count
+            )
+
+            self._maintain()
+
+    def _maintain(self) -> None:
+        """Compact the files when deleted rows outnumber live rows, and build or rebuild the inverted file."""
+        collection = self._load()
+        alive_count = int(collection.alive.sum())
+
+        if collection.count - alive_count > alive_count:
+            self._compact(collection)
+            collection = self._load()
+
+        if self._ivf_threshold <= 0 or alive_count < self._ivf_threshold:
+            if collection.centroids is not None:
+                self._write_ivf(collection, None, None, 0)
+            return
+
+        # the clusters drift as rows are added, retrain once the rows doubled since training
+        if collection.centroids is None or alive_count > 2 * collection.ivf_count:
+            centroids = self._train_centroids(collection, alive_count)
+            assignments = np.concatenate([
+                self._assign(np.asarray(collection.vectors[i:i + self.SCAN_BATCH_SIZE]), centroids)
+                for i in range(0, collection.count, self.SCAN_BATCH_SIZE)
+            ])
+            self._write_ivf(collection, centroids, assignments, alive_count)
+
+    def _compact(self, collection: _Collection) -> None:
+        rows = np.flatnonzero(collection.alive)
+
+        vectors_path = os.path.join(self._path, self.VECTORS_FILENAME)
+        payloads_path = os.path.join(self._path, self.PAYLOADS_FILENAME)
+        offsets = [0]
+        with open(vectors_path + '.tmp', 'wb') as vectors_file, open(payloads_path + '.tmp', 'wb') as payloads_file:
+            for i in range(0, len(rows), self.SCAN_BATCH_SIZE):
+                batch_rows = rows[i:i + self.SCAN_BATCH_SIZE]
+                vectors_file.write(np.asarray(collection.vectors[batch_rows]).tobytes())
+                for row in batch_rows:
+                    payload = self._read_payload_bytes(collection, int(row))
+                    payloads_file.write(payload)
+                    offsets.append(offsets[-1] + len(payload))
+
+        os.replace(vectors_path + '.tmp', vectors_path)
+        os.replace(payloads_path + '.tmp', payloads_path)
+
+        self._write(
+            dim=collection.dim,
+            count=len(rows),
+            ids=collection.ids[rows],
+            document_ids=collection.document_ids[rows],
+            offsets=np.asarray(offsets, dtype=np.int64),
+            centroids=collection.centroids,
+            assignments=collection.assignments[rows] if collection.assignments is not None else None,
+            ivf_count=collection.ivf_count
+        )
+
+    def _train_centroids(self, collection: _Collection, alive_count: int) -> np.ndarray:
+        """Spherical k-means over a sample of the live rows."""
+        n_lists = min(self.MAX_IVF_LISTS, max(1, int(math.sqrt(alive_count))))
+        rng = np.random.default_rng(0)
+
+        alive_rows = np.flatnonzero(collection.alive)
+        sample_size = min(len(alive_rows), n_lists * self.KMEANS_SAMPLES_PER_CLUSTER)
+        sample_rows = np.sort(rng.choice(alive_rows, size=sample_size, replace=False))
+        sample = np.asarray(collection.vectors[sample_rows])
+
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(self.KMEANS_ITERATIONS):
+            assignments = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            non_empty = np.bincount(assignments, minlength=n_lists) > 0
+            # empty clusters keep their centroid
+            centroids[non_empty] = self._normalize(sums[non_empty])
+
+        return centroids
+
+    def _get_candidate_rows(self, collection: _Collection, query: np.ndarray, k: int) -> np.ndarray:
+        alive = collection.alive
+        if collection.centroids is not None:
+            n_probe = min(self._ivf_nprobe, len(collection.centroids))
+            centroid_scores = collection.centroids @ query
+            probe_lists = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+            candidates = np.flatnonzero(alive & np.isin(collection.assignments, probe_lists))
+            if len(candidates) >= k:
+                return candidates
+
+        return np.flatnonzero(alive)
+
+    def _score(self, vectors: np.ndarray, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        if len(rows) == len(vectors):
+            return np.concatenate([
+                np.asarray(vectors[i:i + self.SCAN_BATCH_SIZE]) @ query
+                for i in range(0, len(vectors), self.SCAN_BATCH_SIZE)
+            ])
+
+        return np.concatenate([
+            np.asarray(vectors[rows[i:i + self.SCAN_BATCH_SIZE]]) @ query
+            for i in range(0, len(rows), self.SCAN_BATCH_SIZE)
+        ])
+
+    def _assign(self, vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+
+    def _read_payloads(self, collection: _Collection, rows: List[int]) -> List[dict]:
+        return [json.loads(self._read_payload_bytes(collection, row)) for row in rows]
+
+    def _read_payload_bytes(self, collection: _Collection, row: int) -> bytes:
+        with open(os.path.join(self._path, self.PAYLOADS_FILENAME), 'rb') as f:
+            f.seek(int(collection.offsets[row]))
+            return f.read(int(collection.offsets[row + 1] - collection.offsets[row]))
+
+    def _load(self) -> _Collection:
+        meta = self._read_meta()
+
+        with self._collections_lock:
+            collection = self._collections.get(self._path)
+            if collection and collection.generation == meta['generation']:
+                return collection
+
+            count = meta['count']
+            dim = meta['dim']
+            vectors = None
+            if count:
+                vectors = np.memmap(os.path.join(self._path, self.VECTORS_FILENAME),
+                                    dtype=np.float32, mode='r', shape=(count, dim))
+
+            centroids = None
+            assignments = None
+            if meta['ivf_count']:
+                centroids = self._load_array(self.CENTROIDS_FILENAME)
+                assignments = self._load_array(self.ASSIGNMENTS_FILENAME)[:count]
+
+            collection = _Collection(
+                generation=meta['generation'],
+                dim=dim,
+                count=count,
+                vectors=vectors,
+                ids=self._load_array(self.IDS_FILENAME, np.asarray([], dtype=str))[:count],
+                document_ids=self._load_array(self.DOCUMENT_IDS_FILENAME, np.asarray([], dtype=str))[:count],
+                offsets=self._load_array(self.OFFSETS_FILENAME, np.zeros(1, dtype=np.int64))[:count + 1],
+                centroids=centroids,
+                assignments=assignments,
+                ivf_count=meta['ivf_count']
+            )
+            self._collections[self._path] = collection
+
+            return collection
+
+    def _write(self, dim: int, count: int, ids: np.ndarray, document_ids: np.ndarray, offsets: np.ndarray,
+               centroids: Optional[np.ndarray], assignments: Optional[np.ndarray], ivf_count: int) -> None:
+        self._save_array(self.IDS_FILENAME, ids)
+        self._save_array(self.DOCUMENT_IDS_FILENAME, document_ids)
+        self._save_array(self.OFFSETS_FILENAME, offsets)
+        if centroids is not None:
+            self._save_array(self.CENTROIDS_FILENAME, centroids)
+            self._save_array(self.ASSIGNMENTS_FILENAME, assignments)
+
+        # the meta file is written last, it commits the write
+        self._write_meta({
+            'dim': dim,
+            'count': count,
+            'generation': uuid.uuid4().hex,
+            'ivf_count': ivf_count if centroids is not None else 0
+        })
+
+    def _write_ivf(self, collection: _Collection, centroids: Optional[np.ndarray],
+                   assignments: Optional[np.ndarray], ivf_count: int) -> None:
+        self._write(
+            dim=collection.dim,
+            count=collection.count,
+            ids=collection.ids,
+            document_ids=collection.document_ids,
+            offsets=collection.offsets,
+            centroids=centroids,
+            assignments=assignments,
+            ivf_count=ivf_count
+        )
+
+    def _read_meta(self) -> dict:
+        try:
+            with open(os.path.join(self._path, self.META_FILENAME), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'dim': 0, 'count': 0, 'generation': '', 'ivf_count': 0}
+
+    def _write_meta(self, meta: dict) -> None:
+        meta_path = os.path.join(self._path, self.META_FILENAME)
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def _load_array(self, filename: str, default: Optional[np.ndarray] = None) -> np.ndarray:
+        try:
+            return np.load(os.path.join(self._path, filename), allow_pickle=False)
+        except FileNotFoundError:
+            return default
+
+    def _save_array(self, filename: str, array: np.ndarray) -> None:
+        path = os.path.join(self._path, filename)
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, array, allow_pickle=False)
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(np.float32)
+
+    @contextmanager
+    def _lock(self, exclusive: bool):
+        if not exclusive and not os.path.exists(self._path):
+            yield
+            return
+
+        os.makedirs(self._path, exist_ok=True)
+        flags = portalocker.LockFlags.EXCLUSIVE if exclusive else portalocker.LockFlags.SHARED
+        with open(os.path.join(self._path, self.LOCK_FILENAME), 'a') as lock_file:
+            # poll instead of blocking, a blocking lock would stall every greenlet of the process
+            while True:
+                try:
+                    portalocker.lock(lock_file, flags | portalocker.LockFlags.NON_BLOCKING)
+                    break
+                except portalocker.exceptions.LockException:
+                    time.sleep(self.LOCK_RETRY_INTERVAL)
+
+            try:
+                yield
+            finally:
+                portalocker.unlock(lock_file)
@@ -0,0 +1,51 @@
+import os
+import threading
+from typing import Any, Dict, Tuple
+
+import httpx
+import qdrant_client
+from flask import current_app
+
+from core.vector_store.qdrant_embedded import EmbeddedQdrantClient
+
+_clients: Dict[Tuple, Tuple[int, qdrant_client.QdrantClient]] = {}
+_clients_lock = threading.Lock()
+
+
+def get_qdrant_client(**params: Any) -> qdrant_client.QdrantClient:
+    """
+    Get the process-wide Qdrant client of the endpoint params, creating it on first use.
+
+    Remote clients keep a pool of keep-alive HTTP connections that is shared by all indexes
+    and requests of the process. Local stores are shared with the other processes using the
+    same path, see EmbeddedQdrantClient. The lock is a gevent lock once the app is monkey patched.
+    Clients inherited through fork are not reused, their connections belong to the parent.
+    """
+    if params.get('path'):
+        params = {'path': params['path']}
+
+    key = tuple(sorted((name, value) for name, value in params.items() if value is not None))
+    pid = os.getpid()
+
+    entry = _clients.get(key)
+    if entry is None or entry[0] != pid:
+        with _clients_lock:
+            entry = _clients.get(key)
+            if entry is None or entry[0] != pid:
+                client_params = dict(params)
+                if client_params.get('path'):
+                    client = EmbeddedQdrantClient(path=client_params['path'])
+                else:
+                    if not client_params.get('location') == ':memory:':
+                        pool_size = int(current_app.config.get('QDRANT_CLIENT_POOL_SIZE'))
+                        client_params['limits'] = httpx.Limits(
+                            max_connections=pool_size,
+                            max_keepalive_connections=pool_size
+                        )
+
+                    client = qdrant_client.QdrantClient(**client_params)
+
+                entry = (pid, client)
+                _clients[key] = entry
+
+    return entry[1]
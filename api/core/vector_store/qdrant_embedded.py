@@ -0,0 +1,230 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+import portalocker
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest_models
+from qdrant_client.local.local_collection import LocalCollection
+from qdrant_client.local.qdrant_local import QdrantLocal
+
+
+class EmbeddedQdrantLocal:
+    """
+    A local Qdrant store shared by several processes through its directory.
+
+    The store is an in-memory QdrantLocal whose collections are persisted in the directory,
+    in the layout of QdrantLocal. Unlike QdrantLocal, it does not lock the directory for its
+    lifetime. Writes take an exclusive file lock on the store and bump the version of the
+    changed collection in a version file next to the data. Reads take a shared file lock and
+    compare the version file with the versions they have loaded, reloading only the collections
+    that changed since. Within a process, only writes and reloads are serialized.
+    """
+
+    LOCK_FILENAME = '.dify.lock'
+    VERSION_FILENAME = '.dify.version'
+    META_FILENAME = 'meta.json'
+    LOCK_RETRY_INTERVAL = 0.01
+
+    # methods changing the collections or aliases themselves, reloaded by reloading the meta
+    META_WRITE_METHODS = {
+        'create_collection', 'recreate_collection', 'delete_collection', 'update_collection',
+        'update_collection_aliases',
+    }
+    # methods changing the points of one collection
+    POINTS_WRITE_METHODS = {
+        'upsert', 'delete', 'set_payload', 'overwrite_payload', 'delete_payload', 'clear_payload',
+        'upload_records', 'upload_collection', 'create_payload_index', 'delete_payload_index',
+    }
+
+    def __init__(self, location: str):
+        self._location = location
+        self._lock_path = os.path.join(location, self.LOCK_FILENAME)
+        self._version_path = os.path.join(location, self.VERSION_FILENAME)
+        self._meta_path = os.path.join(location, self.META_FILENAME)
+        # serializes the writes of the process, their file lock excludes the reads
+        self._write_lock = threading.RLock()
+        # serializes the reloads of the reads, which share the file lock
+        self._reload_lock = threading.Lock()
+
+        os.makedirs(location, exist_ok=True)
+        with self._file_lock(exclusive=False):
+            self._versions = self._read_versions()
+            self._local = self._open()
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._local, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        if name in self.META_WRITE_METHODS or name in self.POINTS_WRITE_METHODS:
+            return self._wrap_write(name)
+
+        return self._wrap_read(name)
+
+    def _wrap_read(self, name: str) -> Callable:
+        def method(*args, **kwargs):
+            with self._file_lock(exclusive=False):
+                self._reload_if_changed()
+                return getattr(self._local, name)(*args, **kwargs)
+
+        return method
+
+    def _wrap_write(self, name: str) -> Callable:
+        is_meta_write = name in self.META_WRITE_METHODS
+
+        def method(*args, **kwargs):
+            with self._write_lock, self._file_lock(exclusive=True):
+                self._reload_if_changed()
+
+                if is_meta_write:
+                    collections = dict(self._local.collections)
+                    result = getattr(self._local, name)(*args, **kwargs)
+                    self._save_meta(collections)
+                    self._bump_version(None)
+                else:
+                    result = getattr(self._local, name)(*args, **kwargs)
+                    self._bump_version(kwargs.get('collection_name', args[0] if args else None))
+
+                return result
+
+        return method
+
+    def _open(self) -> QdrantLocal:
+        local = QdrantLocal(location=':memory:')
+
+        try:
+            with open(self._meta_path, 'r') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return local
+
+        for collection_name, config_json in meta['collections'].items():
+            local.collections[collection_name] = LocalCollection(
+                rest_models.CreateCollection(**config_json),
+                self._get_collection_path(collection_name)
+            )
+        local.aliases = meta['aliases']
+
+        return local
+
+    def _save_meta(self, previous_collections: Dict[str, LocalCollection]) -> None:
+        """Persist the collections changed by a meta write on the in-memory store, and its meta."""
+        # collections deleted or recreated, whose data must be gone before a recreated one opens it
+        for collection_name, collection in previous_collections.items():
+            if self._local.collections.get(collection_name) is not collection:
+                self._close_collection(collection)
+                shutil.rmtree(self._get_collection_path(collection_name), ignore_errors=True)
+
+        # collections created in memory
+        for collection_name, collection in list(self._local.collections.items()):
+            if collection.storage is None:
+                collection_path = self._get_collection_path(collection_name)
+                os.makedirs(collection_path, exist_ok=True)
+                self._local.collections[collection_name] = LocalCollection(collection.config, collection_path)
+
+        meta = {
+            'collections': {
+                collection_name: collection.config.dict()
+                for collection_name, collection in self._local.collections.items()
+            },
+            'aliases': self._local.aliases,
+        }
+        self._write_atomically(self._meta_path, meta)
+
+    def _reload_if_changed(self) -> None:
+        if self._read_versions() == self._versions:
+            return
+
+        with self._reload_lock:
+            # reloaded by another thread meanwhile
+            versions = self._read_versions()
+            if versions == self._versions:
+                return
+
+            if versions['meta'] != self._versions['meta']:
+                previous_local = self._local
+                self._local = self._open()
+                for collection in previous_local.collections.values():
+                    self._close_collection(collection)
+            else:
+                for collection_name, version in versions['collections'].items():
+                    collection = self._local.collections.get(collection_name)
+                    if self._versions['collections'].get(collection_name) != version and collection is not None:
+                        self._local.collections[collection_name] = LocalCollection(
+                            collection.config,
+                            self._get_collection_path(collection_name)
+                        )
+                        self._close_collection(collection)
+
+            self._versions = versions
+
+    def _get_collection_path(self, collection_name: str) -> str:
+        return os.path.join(self._location, 'collection', collection_name)
+
+    @staticmethod
+    def _close_collection(collection: LocalCollection) -> None:
+        """Close the storage of a collection that is replaced, reads in flight only use its loaded vectors."""
+        if collection.storage is None:
+            return
+
+        try:
+            collection.storage.storage.close()
+        except Exception:
+            # connections made by another thread can not be closed here, they are closed when collected
+            logging.debug('Failed to close embedded qdrant collection storage', exc_info=True)
+
+    def _read_versions(self) -> Dict[str, Any]:
+        try:
+            with open(self._version_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'meta': 0, 'collections': {}}
+
+    def _bump_version(self, collection_name: Optional[str]) -> None:
+        versions = self._read_versions()
+        if collection_name is None:
+            versions['meta'] += 1
+        else:
+            versions['collections'][collection_name] = versions['collections'].get(collection_name, 0) + 1
+
+        self._write_atomically(self._version_path, versions)
+        self._versions = versions
+
+    @staticmethod
+    def _write_atomically(path: str, content: dict) -> None:
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(content, f)
+        os.replace(tmp_path, path)
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        flags = portalocker.LockFlags.EXCLUSIVE if exclusive else portalocker.LockFlags.SHARED
+        with open(self._lock_path, 'a') as lock_file:
+            # poll instead of blocking, a blocking lock would stall every greenlet of the process
+            while True:
+                try:
+                    portalocker.lock(lock_file, flags | portalocker.LockFlags.NON_BLOCKING)
+                    break
+                except portalocker.exceptions.LockException:
+                    time.sleep(self.LOCK_RETRY_INTERVAL)
+
+            try:
+                yield
+            finally:
+                portalocker.unlock(lock_file)
+
+
+class EmbeddedQdrantClient(QdrantClient):
+    """Qdrant client of a local store directory shared by several processes."""
+
+    def __init__(self, path: str):
+        # start from an in-memory client, its store is replaced by the shared one
+        super().__init__(location=':memory:')
+        self._client = EmbeddedQdrantLocal(location=path)
@@ -1,29 +1,56 @@
-from typing import cast, Any
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Set, Tuple, Union
 
+from flask import current_app
 from langchain.schema import Document
-from qdrant_client.http.models import Filter, PointIdsList, FilterSelector
-from qdrant_client.local.qdrant_local import QdrantLocal
+from qdrant_client.http.models import Filter, PointIdsList, FilterSelector, FieldCondition, MatchValue
 
 from core.index.vector_index.qdrant import Qdrant
+from core.vector_store.qdrant_client_registry import get_qdrant_client
 
 
 class QdrantVectorStore(Qdrant):
+    """
+    Qdrant store of a dataset's index.
+
+    With a dataset id, the collection is shared with other datasets: points are tagged with the
+    dataset id, and searches and deletes are restricted to the points of the dataset.
+    """
+
+    def __init__(self, *args: Any, dataset_id: Optional[str] = None, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.dataset_id = dataset_id
+
+    def add_texts(
+            self,
+            texts: Iterable[str],
+            metadatas: Optional[List[dict]] = None,
+            ids: Optional[Sequence[str]] = None,
+            batch_size: int = 64,
+            **kwargs: Any,
+    ) -> List[str]:
+        # indexes pass the node ids as uuids, the point ids must be the node ids to look them up
+        if ids is None:
+            ids = kwargs.pop('uuids', None)
+
+        if self.dataset_id:
+            texts = list(texts)
+            metadatas = [{**(metadata or {}), 'dataset_id': self.dataset_id}
+                         for metadata in (metadatas or [None] * len(texts))]
+
+        return super().add_texts(texts, metadatas=metadatas, ids=ids, batch_size=batch_size, **kwargs)
+
     def del_texts(self, filter: Filter):
         if not filter:
             raise ValueError('filter must not be empty')
 
-        self._reload_if_needed()
-
         self.client.delete(
             collection_name=self.collection_name,
             points_selector=FilterSelector(
-                filter=filter
+                filter=self._filter_by_dataset(filter)
             ),
         )
 
     def del_text(self, uuid: str) -> None:
-        self._reload_if_needed()
-
         self.client.delete(
             collection_name=self.collection_name,
             points_selector=PointIdsList(
@@ -32,8 +59,6 @@ class QdrantVectorStore(Qdrant):
         )
 
     def text_exists(self, uuid: str) -> bool:
-        self._reload_if_needed()
-
         response = self.client.retrieve(
             collection_name=self.collection_name,
             ids=[uuid]
@@ -41,11 +66,66 @@ class QdrantVectorStore(Qdrant):
 
         return len(response) > 0
 
+    def get_existing_ids(self, uuids: List[str]) -> Set[str]:
+        response = self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=uuids,
+            with_payload=False,
+            with_vectors=False
+        )
+
+        return {str(record.id) for record in response}
+
     def delete(self):
-        self._reload_if_needed()
+        if self.dataset_id:
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=FilterSelector(
+                    filter=self._filter_by_dataset(None)
+                ),
+            )
+            return
 
         self.client.delete_collection(collection_name=self.collection_name)
 
+    def similarity_search_with_score_by_vector(
+            self,
+            embedding: List[float],
+            k: int = 4,
+            filter: Optional[Union[dict, Filter]] = None,
+            **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        return super().similarity_search_with_score_by_vector(
+            embedding, k=k, filter=self._filter_by_dataset(filter), **kwargs
+        )
+
+    def max_marginal_relevance_search_with_score_by_vector(
+            self,
+            embedding: List[float],
+            k: int = 4,
+            fetch_k: int = 20,
+            lambda_mult: float = 0.5,
+            filter: Optional[Union[dict, Filter]] = None,
+            **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        return super().max_marginal_relevance_search_with_score_by_vector(
+            embedding, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, filter=self._filter_by_dataset(filter), **kwargs
+        )
+
+    def _filter_by_dataset(self, filter: Optional[Union[dict, Filter]]) -> Optional[Filter]:
+        if isinstance(filter, dict):
+            filter = self._qdrant_filter_from_dict(filter)
+
+        if not self.dataset_id:
+            return filter
+
+        condition = FieldCondition(
+            key=f"{self.metadata_payload_key}.dataset_id",
+            match=MatchValue(value=self.dataset_id),
+        )
+
+        return Filter(must=[condition, filter] if filter else [condition])
+
     @classmethod
     def _document_from_scored_point(
             cls,
@@ -64,7 +144,15 @@ class QdrantVectorStore(Qdrant):
             metadata=scored_point.payload.get(metadata_payload_key) or {},
         )
 
-    def _reload_if_needed(self):
-        if isinstance(self.client, QdrantLocal):
-            self.client = cast(QdrantLocal, self.client)
-            self.client._load()
+    @classmethod
+    def _create_client(cls, **kwargs: Any) -> Any:
+        return get_qdrant_client(**kwargs)
+
+    def _get_embed_texts_worker(self) -> Callable[[List[str]], List[List[float]]]:
+        flask_app = current_app._get_current_object()
+
+        def embed_texts(texts: List[str]) -> List[List[float]]:
+            with flask_app.app_context():
+                return self._embed_texts(texts)
+
+        return embed_texts
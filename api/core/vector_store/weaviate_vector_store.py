@@ -1,3 +1,5 @@
+from typing import List, Set
+
 from langchain.vectorstores import Weaviate
 
 
@@ -34,5 +36,20 @@ class WeaviateVectorStore(Weaviate):
 
         return True
 
+    def get_existing_ids(self, uuids: List[str]) -> Set[str]:
+        result = self._client.query.get(self._index_name, ["doc_id"]).with_where({
+            "operator": "Or",
+            "operands": [{
+                "path": ["doc_id"],
+                "operator": "Equal",
+                "valueText": uuid,
+            } for uuid in uuids]
+        }).with_limit(len(uuids)).do()
+
+        if "errors" in result:
+            raise ValueError(f"Error during query: {result['errors']}")
+
+        return {entry["doc_id"] for entry in result["data"]["Get"][self._index_name]}
+
     def delete(self):
         self._client.schema.delete_class(self._index_name)
@@ -1,6 +1,9 @@
 from celery import Task, Celery
+from celery.signals import worker_init
 from flask import Flask
 
+from core.index.keyword_table_index.jieba_keyword_table_handler import warm_up_keyword_extraction
+
 
 def init_app(app: Flask) -> Celery:
     class FlaskTask(Task):
@@ -33,6 +36,14 @@ def init_app(app: Flask) -> Celery:
             broker_use_ssl=ssl_options,  # Add the SSL options to the broker configuration
         )
         
+    # the receiver is local to init_app, a weak reference would let it be collected once init_app returns
+    @worker_init.connect(weak=False)
+    def warm_up_worker(sender=None, **kwargs):
+        # prefork children are daemonic and inherit the warmed jieba dictionary instead
+        processes = 0 if 'prefork' in str(getattr(sender, 'pool_cls', '')) \
+            else int(app.config.get('KEYWORD_EXTRACTION_PROCESSES'))
+        warm_up_keyword_extraction(processes)
+
     celery_app.set_default()
     app.extensions["celery"] = celery_app
     return celery_app
@@ -1,4 +1,5 @@
 # -*- coding:utf-8 -*-
+import asyncio
 import re
 import subprocess
 import uuid
@@ -8,6 +9,7 @@ from zoneinfo import available_timezones
 import random
 import string
 
+from flask import current_app
 from flask_restful import fields
 
 
@@ -153,3 +155,14 @@ def get_remote_ip(request):
 def generate_text_hash(text: str) -> str:
     hash_text = str(text) + 'None'
     return sha256(hash_text.encode()).hexdigest()
+
+
+async def run_in_app_context(func, *args, **kwargs):
+    """Run a blocking call in the default executor of the running event loop, inside an app context."""
+    flask_app = current_app._get_current_object()
+
+    def run_with_app_context():
+        with flask_app.app_context():
+            return func(*args, **kwargs)
+
+    return await asyncio.get_running_loop().run_in_executor(None, run_with_app_context)
@@ -1,7 +1,9 @@
 import json
 import pickle
+import struct
 from json import JSONDecodeError
 
+import numpy as np
 from sqlalchemy import func
 from sqlalchemy.dialects.postgresql import UUID
 
@@ -18,6 +20,7 @@ class Dataset(db.Model):
     )
 
     INDEXING_TECHNIQUE_LIST = ['high_quality', 'economy']
+    SEARCH_METHOD_LIST = ['semantic_search', 'hybrid']
 
     id = db.Column(UUID, server_default=db.text('uuid_generate_v4()'))
     tenant_id = db.Column(UUID, nullable=False)
@@ -38,6 +41,7 @@ class Dataset(db.Model):
                            server_default=db.text('CURRENT_TIMESTAMP(0)'))
     embedding_model = db.Column(db.String(255), nullable=True)
     embedding_model_provider = db.Column(db.String(255), nullable=True)
+    retrieval_config = db.Column(db.Text, nullable=True)
 
     @property
     def dataset_keyword_table(self):
@@ -51,6 +55,10 @@ class Dataset(db.Model):
     @property
     def index_struct_dict(self):
         return json.loads(self.index_struct) if self.index_struct else None
+
+    @property
+    def retrieval_config_dict(self):
+        return json.loads(self.retrieval_config) if self.retrieval_config else None
     
     @property
     def created_by_account(self):
@@ -409,6 +417,7 @@ class DatasetKeywordTable(db.Model):
     id = db.Column(UUID, primary_key=True, server_default=db.text('uuid_generate_v4()'))
     dataset_id = db.Column(UUID, nullable=False, unique=True)
     keyword_table = db.Column(db.Text, nullable=False)
+    storage_type = db.Column(db.String(40), nullable=False, server_default=db.text("'json'::character varying"))
 
     @property
     def keyword_table_dict(self):
@@ -426,6 +435,21 @@ class DatasetKeywordTable(db.Model):
         return json.loads(self.keyword_table, cls=SetDecoder) if self.keyword_table else None
 
 
+class DatasetKeywordNode(db.Model):
+    __tablename__ = 'dataset_keyword_nodes'
+    __table_args__ = (
+        db.PrimaryKeyConstraint('id', name='dataset_keyword_node_pkey'),
+        db.UniqueConstraint('dataset_id', 'keyword', 'node_id', name='dataset_keyword_node_unique'),
+        db.Index('dataset_keyword_node_node_idx', 'dataset_id', 'node_id'),
+    )
+
+    id = db.Column(UUID, primary_key=True, server_default=db.text('uuid_generate_v4()'))
+    dataset_id = db.Column(UUID, nullable=False)
+    keyword = db.Column(db.String(255), nullable=False)
+    node_id = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=db.text('CURRENT_TIMESTAMP(0)'))
+
+
 class Embedding(db.Model):
     __tablename__ = 'embeddings'
     __table_args__ = (
@@ -440,8 +464,41 @@ class Embedding(db.Model):
     embedding = db.Column(db.LargeBinary, nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, server_default=db.text('CURRENT_TIMESTAMP(0)'))
 
+    # binary format: magic, version, 3 padding bytes, then little-endian float32 values
+    EMBEDDING_FORMAT_HEADER = struct.Struct('<4sB3x')
+    EMBEDDING_FORMAT_MAGIC = b'DEMB'
+    EMBEDDING_FORMAT_VERSION = 1
+
     def set_embedding(self, embedding_data: list[float]):
-        self.embedding = pickle.dumps(embedding_data, protocol=pickle.HIGHEST_PROTOCOL)
+        self.embedding = self.encode_embedding(embedding_data)
 
     def get_embedding(self) -> list[float]:
-        return pickle.loads(self.embedding)
+        return self.decode_embedding(self.embedding).tolist()
+
+    def get_embedding_array(self) -> np.ndarray:
+        return self.decode_embedding(self.embedding)
+
+    @property
+    def is_pickled(self) -> bool:
+        return not self.is_binary_format(self.embedding)
+
+    @classmethod
+    def encode_embedding(cls, embedding_data: list[float]) -> bytes:
+        header = cls.EMBEDDING_FORMAT_HEADER.pack(cls.EMBEDDING_FORMAT_MAGIC, cls.EMBEDDING_FORMAT_VERSION)
+        return header + np.asarray(embedding_data, dtype='<f4').tobytes()
+
+    @classmethod
+    def decode_embedding(cls, data: bytes) -> np.ndarray:
+        """Decode the binary format without copying, rows written before it are still pickled lists."""
+        if not cls.is_binary_format(data):
+            return np.asarray(pickle.loads(data))
+
+        return np.frombuffer(data, dtype='<f4', offset=cls.EMBEDDING_FORMAT_HEADER.size)
+
+    @classmethod
+    def is_binary_format(cls, data: bytes) -> bool:
+        if len(data) < cls.EMBEDDING_FORMAT_HEADER.size:
+            return False
+
+        magic, version = cls.EMBEDDING_FORMAT_HEADER.unpack_from(data)
+        return magic == cls.EMBEDDING_FORMAT_MAGIC and version == cls.EMBEDDING_FORMAT_VERSION
@@ -9,7 +9,9 @@ from typing import Optional, List
 from flask import current_app
 from sqlalchemy import func
 
+from core.index.hybrid_search import HybridSearch
 from core.index.index import IndexBuilder
+from core.index.retrieval_cache import RetrievalCache
 from core.model_providers.error import LLMBadRequestError, ProviderTokenNotInitError
 from core.model_providers.model_factory import ModelFactory
 from extensions.ext_redis import redis_client
@@ -163,6 +165,10 @@ class DatasetService:
                 except ProviderTokenNotInitError as ex:
                     raise ValueError(ex.description)
 
+        if 'retrieval_config' in filtered_data:
+            DatasetService.retrieval_config_validate(filtered_data['retrieval_config'])
+            filtered_data['retrieval_config'] = json.dumps(filtered_data['retrieval_config'])
+
         filtered_data['updated_by'] = user.id
         filtered_data['updated_at'] = datetime.datetime.now()
 
@@ -173,6 +179,22 @@ class DatasetService:
             deal_dataset_vector_index_task.delay(dataset_id, action)
         return dataset
 
+    @staticmethod
+    def retrieval_config_validate(retrieval_config: dict):
+        if 'search_method' not in retrieval_config or not retrieval_config['search_method']:
+            raise ValueError("Retrieval search method is required")
+
+        if retrieval_config['search_method'] not in Dataset.SEARCH_METHOD_LIST:
+            raise ValueError("Retrieval search method is invalid")
+
+        if 'fusion' in retrieval_config and retrieval_config['fusion'] not in HybridSearch.FUSION_LIST:
+            raise ValueError("Retrieval fusion is invalid")
+
+        for key in ['vector_weight', 'keyword_weight', 'rrf_k', 'latency_budget_ms']:
+            if key in retrieval_config and retrieval_config[key] is not None:
+                if not isinstance(retrieval_config[key], (int, float)) or retrieval_config[key] < 0:
+                    raise ValueError(f"Retrieval {key} is invalid")
+
     @staticmethod
     def delete_dataset(dataset_id, user):
         # todo: cannot delete dataset if it is being processed
@@ -1008,16 +1030,17 @@ class SegmentService:
                 if document.doc_form == 'qa_model':
                     segment.answer = args['answer']
                 if args['keywords']:
+                    kw_index = IndexBuilder.get_index(dataset, 'economy')
+                    # delete from keyword index while the segment still has its old keywords
+                    kw_index.delete_by_ids([segment.index_node_id])
                     segment.keywords = args['keywords']
                 db.session.add(segment)
                 db.session.commit()
                 # update segment index task
                 if args['keywords']:
-                    kw_index = IndexBuilder.get_index(dataset, 'economy')
-                    # delete from keyword index
-                    kw_index.delete_by_ids([segment.index_node_id])
                     # save keyword index
                     kw_index.update_segment_keywords_index(segment.index_node_id, segment.keywords)
+                    RetrievalCache(dataset.id).bump_version()
             else:
                 segment_hash = helper.generate_text_hash(content)
                 tokens = 0
@@ -78,18 +78,21 @@ class HitTestingService:
 
         query_position = tsne_position_data.pop(0)
 
+        segments = {}
+        if documents:
+            segments = {segment.index_node_id: segment for segment in db.session.query(DocumentSegment).filter(
+                DocumentSegment.dataset_id == dataset.id,
+                DocumentSegment.enabled == True,
+                DocumentSegment.status == 'completed',
+                DocumentSegment.index_node_id.in_([document.metadata['doc_id'] for document in documents])
+            ).all()}
+
         i = 0
         records = []
         for document in documents:
             index_node_id = document.metadata['doc_id']
 
-            segment = db.session.query(DocumentSegment).filter(
-                DocumentSegment.dataset_id == dataset.id,
-                DocumentSegment.enabled == True,
-                DocumentSegment.status == 'completed',
-                DocumentSegment.index_node_id == index_node_id
-            ).first()
-
+            segment = segments.get(index_node_id)
             if not segment:
                 i += 1
                 continue
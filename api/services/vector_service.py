@@ -4,6 +4,7 @@ from typing import Optional, List
 from langchain.schema import Document
 
 from core.index.index import IndexBuilder
+from core.index.retrieval_cache import RetrievalCache
 
 from models.dataset import Dataset, DocumentSegment
 
@@ -37,6 +38,8 @@ class VectorService:
             else:
                 index.add_texts([document])
 
+        RetrievalCache(dataset.id).bump_version()
+
     @classmethod
     def update_segment_vector(cls, keywords: Optional[List[str]], segment: DocumentSegment, dataset: Dataset):
         # update segment index task
@@ -70,6 +73,8 @@ class VectorService:
         else:
             kw_index.add_texts([document])
 
+        RetrievalCache(dataset.id).bump_version()
+
     @classmethod
     def create_qa_document_vector(cls, qa_document: AppQADocument, app: App):
         document = Document(
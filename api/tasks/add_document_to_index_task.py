@@ -8,6 +8,7 @@ from langchain.schema import Document
 from werkzeug.exceptions import NotFound
 
 from core.index.index import IndexBuilder
+from core.index.retrieval_cache import RetrievalCache
 from extensions.ext_database import db
 from extensions.ext_redis import redis_client
 from models.dataset import DocumentSegment
@@ -70,6 +71,8 @@ def add_document_to_index_task(dataset_document_id: str):
         if index:
             index.add_texts(documents)
 
+        RetrievalCache(dataset.id).bump_version()
+
         end_at = time.perf_counter()
         logging.info(
             click.style('Document added to index: {} latency: {}'.format(dataset_document.id, end_at - start_at), fg='green'))
@@ -57,12 +57,16 @@ def batch_create_segment_to_index_task(job_id: str, content: List, dataset_id: s
                 model_name=dataset.embedding_model
             )
 
-        for segment in content:
+        # calc embedding use tokens
+        if embedding_model:
+            segments_tokens = embedding_model.get_num_tokens_batch([segment['content'] for segment in content])
+        else:
+            segments_tokens = [0] * len(content)
+
+        for segment, tokens in zip(content, segments_tokens):
             content = segment['content']
             doc_id = str(uuid.uuid4())
             segment_hash = helper.generate_text_hash(content)
-            # calc embedding use tokens
-            tokens = embedding_model.get_num_tokens(content) if embedding_model else 0
             max_position = db.session.query(func.max(DocumentSegment.position)).filter(
                 DocumentSegment.document_id == dataset_document.id
             ).scalar()
@@ -6,6 +6,7 @@ from celery import shared_task
 from flask import current_app
 
 from core.index.index import IndexBuilder
+from core.index.retrieval_cache import RetrievalCache
 from core.index.vector_index.vector_index import VectorIndex
 from extensions.ext_database import db
 from models.dataset import DocumentSegment, Dataset, DatasetKeywordTable, DatasetQuery, DatasetProcessRule, \
@@ -65,6 +66,8 @@ def clean_dataset_task(dataset_id: str, tenant_id: str, indexing_technique: str,
 
         db.session.commit()
 
+        RetrievalCache(dataset_id).bump_version()
+
         end_at = time.perf_counter()
         logging.info(
             click.style('Cleaned dataset when dataset deleted: {} latency: {}'.format(dataset_id, end_at - start_at), fg='green'))
@@ -5,6 +5,7 @@ import click
 from celery import shared_task
 
 from core.index.index import IndexBuilder
+from core.index.retrieval_cache import RetrievalCache
 from extensions.ext_database import db
 from models.dataset import DocumentSegment, Dataset
 
@@ -45,6 +46,8 @@ def clean_document_task(document_id: str, dataset_id: str):
             db.session.delete(segment)
 
         db.session.commit()
+        RetrievalCache(dataset.id).bump_version()
+
         end_at = time.perf_counter()
         logging.info(
             click.style('Cleaned document when document deleted: {} latency: {}'.format(document_id, end_at - start_at), fg='green'))
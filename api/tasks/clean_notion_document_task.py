@@ -6,6 +6,7 @@ import click
 from celery import shared_task
 
 from core.index.index import IndexBuilder
+from core.index.retrieval_cache import RetrievalCache
 from extensions.ext_database import db
 from models.dataset import DocumentSegment, Dataset, Document
 
@@ -50,6 +51,8 @@ def clean_notion_document_task(document_ids: List[str], dataset_id: str):
             for segment in segments:
                 db.session.delete(segment)
         db.session.commit()
+        RetrievalCache(dataset.id).bump_version()
+
         end_at = time.perf_counter()
         logging.info(
             click.style('Clean document when import form notion document deleted end :: {} latency: {}'.format(
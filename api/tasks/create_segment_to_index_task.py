@@ -9,6 +9,7 @@ from langchain.schema import Document
 from werkzeug.exceptions import NotFound
 
 from core.index.index import IndexBuilder
+from core.index.retrieval_cache import RetrievalCache
 from extensions.ext_database import db
 from extensions.ext_redis import redis_client
 from models.dataset import DocumentSegment
@@ -89,6 +90,8 @@ def create_segment_to_index_task(segment_id: str, keywords: Optional[List[str]]
         DocumentSegment.query.filter_by(id=segment.id).update(update_params)
         db.session.commit()
 
+        RetrievalCache(dataset.id).bump_version()
+
         end_at = time.perf_counter()
         logging.info(click.style('Segment created to index: {} latency: {}'.format(segment.id, end_at - start_at), fg='green'))
     except Exception as e:
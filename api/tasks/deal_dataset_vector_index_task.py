@@ -6,6 +6,7 @@ from celery import shared_task
 from langchain.schema import Document
 
 from core.index.index import IndexBuilder
+from core.index.retrieval_cache import RetrievalCache
 from extensions.ext_database import db
 from models.dataset import DocumentSegment, Dataset
 from models.dataset import Document as DatasetDocument
@@ -67,6 +68,8 @@ def deal_dataset_vector_index_task(dataset_id: str, action: str):
                 # save vector index
                 index.create(documents)
 
+        RetrievalCache(dataset.id).bump_version()
+
         end_at = time.perf_counter()
         logging.info(
             click.style('Deal dataset vector index: {} latency: {}'.format(dataset_id, end_at - start_at), fg='green'))
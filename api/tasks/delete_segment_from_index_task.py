@@ -6,6 +6,7 @@ from celery import shared_task
 from werkzeug.exceptions import NotFound
 
 from core.index.index import IndexBuilder
+from core.index.retrieval_cache import RetrievalCache
 from extensions.ext_database import db
 from extensions.ext_redis import redis_client
 from models.dataset import DocumentSegment, Dataset, Document
@@ -50,6 +51,8 @@ def delete_segment_from_index_task(segment_id: str, index_node_id: str, dataset_
         # delete from keyword index
         kw_index.delete_by_ids([index_node_id])
 
+        RetrievalCache(dataset.id).bump_version()
+
         end_at = time.perf_counter()
         logging.info(click.style('Segment deleted from index: {} latency: {}'.format(segment_id, end_at - start_at), fg='green'))
     except Exception:
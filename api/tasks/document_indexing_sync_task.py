@@ -8,6 +8,7 @@ from werkzeug.exceptions import NotFound
 
 from core.data_loader.loader.notion import NotionLoader
 from core.index.index import IndexBuilder
+from core.index.retrieval_cache import RetrievalCache
 from core.indexing_runner import IndexingRunner, DocumentIsPausedException
 from extensions.ext_database import db
 from models.dataset import Document, Dataset, DocumentSegment
@@ -92,6 +93,8 @@ def document_indexing_sync_task(dataset_id: str, document_id: str):
                 for segment in segments:
                     db.session.delete(segment)
 
+                RetrievalCache(dataset.id).bump_version()
+
                 end_at = time.perf_counter()
                 logging.info(
                     click.style('Cleaned document when document update data source or process rule: {} latency: {}'.format(document_id, end_at - start_at), fg='green'))
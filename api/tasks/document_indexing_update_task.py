@@ -7,6 +7,7 @@ from celery import shared_task
 from werkzeug.exceptions import NotFound
 
 from core.index.index import IndexBuilder
+from core.index.retrieval_cache import RetrievalCache
 from core.indexing_runner import IndexingRunner, DocumentIsPausedException
 from extensions.ext_database import db
 from models.dataset import Document, Dataset, DocumentSegment
@@ -59,6 +60,8 @@ def document_indexing_update_task(dataset_id: str, document_id: str):
         for segment in segments:
             db.session.delete(segment)
         db.session.commit()
+        RetrievalCache(dataset.id).bump_version()
+
         end_at = time.perf_counter()
         logging.info(
             click.style('Cleaned document when document update data source or process rule: {} latency: {}'.format(document_id, end_at - start_at), fg='green'))
@@ -6,6 +6,7 @@ from celery import shared_task
 from werkzeug.exceptions import NotFound
 
 from core.index.index import IndexBuilder
+from core.index.retrieval_cache import RetrievalCache
 from extensions.ext_database import db
 from extensions.ext_redis import redis_client
 from models.dataset import DocumentSegment, Document
@@ -50,6 +51,8 @@ def remove_document_from_index_task(document_id: str):
         if index_node_ids:
             kw_index.delete_by_ids(index_node_ids)
 
+        RetrievalCache(dataset.id).bump_version()
+
         end_at = time.perf_counter()
         logging.info(
             click.style('Document removed from index: {} latency: {}'.format(document.id, end_at - start_at), fg='green'))
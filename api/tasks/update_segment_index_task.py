@@ -9,6 +9,7 @@ from langchain.schema import Document
 from werkzeug.exceptions import NotFound
 
 from core.index.index import IndexBuilder
+from core.index.retrieval_cache import RetrievalCache
 from extensions.ext_database import db
 from extensions.ext_redis import redis_client
 from models.dataset import DocumentSegment
@@ -101,6 +102,8 @@ def update_segment_index_task(segment_id: str, keywords: Optional[List[str]] = N
         DocumentSegment.query.filter_by(id=segment.id).update(update_params)
         db.session.commit()
 
+        RetrievalCache(dataset.id).bump_version()
+
         end_at = time.perf_counter()
         logging.info(click.style('Segment update index: {} latency: {}'.format(segment.id, end_at - start_at), fg='green'))
     except Exception as e:
@@ -9,6 +9,7 @@ from langchain.schema import Document
 from werkzeug.exceptions import NotFound
 
 from core.index.index import IndexBuilder
+from core.index.retrieval_cache import RetrievalCache
 from extensions.ext_database import db
 from extensions.ext_redis import redis_client
 from models.dataset import DocumentSegment
@@ -57,6 +58,8 @@ def update_segment_keyword_index_task(segment_id: str):
         if index:
             index.update_segment_keywords_index(segment.index_node_id, segment.keywords)
 
+        RetrievalCache(dataset.id).bump_version()
+
         end_at = time.perf_counter()
         logging.info(click.style('Segment update index: {} latency: {}'.format(segment.id, end_at - start_at), fg='green'))
     except Exception as e:
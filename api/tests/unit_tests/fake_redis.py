@@ -0,0 +1,92 @@
+from typing import Optional
+
+
+def _to_bytes(value) -> bytes:
+    if isinstance(value, bytes):
+        return value
+
+    return str(value).encode()
+
+
+class FakeRedis:
+    """In-memory stand-in for the commands of redis_client used by the indexes, with decode_responses=False."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.data.get(key)
+
+    def mget(self, keys: list) -> list:
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key: str, value, nx: bool = False, ex: Optional[int] = None):
+        if nx and key in self.data:
+            return None
+
+        self.data[key] = _to_bytes(value)
+        return True
+
+    def setex(self, key: str, ttl: int, value):
+        self.data[key] = _to_bytes(value)
+
+    def incr(self, key: str) -> int:
+        value = int(self.data.get(key, b'0')) + 1
+        self.data[key] = _to_bytes(value)
+        return value
+
+    def delete(self, *keys: str) -> int:
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    def exists(self, *keys: str) -> int:
+        return sum(1 for key in keys if key in self.data)
+
+    def expire(self, key: str, ttl: int) -> bool:
+        return key in self.data
+
+    def hgetall(self, key: str) -> dict:
+        return dict(self.data.get(key, {}))
+
+    def hmget(self, key: str, fields: list) -> list:
+        values = self.data.get(key, {})
+        return [values.get(_to_bytes(field)) for field in fields]
+
+    def hset(self, key: str, field=None, value=None, mapping: Optional[dict] = None) -> int:
+        values = self.data.setdefault(key, {})
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+
+        for item_field, item_value in items.items():
+            values[_to_bytes(item_field)] = _to_bytes(item_value)
+
+        return len(items)
+
+    def hincrby(self, key: str, field, amount: int = 1) -> int:
+        values = self.data.setdefault(key, {})
+        value = int(values.get(_to_bytes(field), b'0')) + amount
+        values[_to_bytes(field)] = _to_bytes(value)
+        return value
+
+    def pipeline(self, transaction: bool = True) -> 'FakePipeline':
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queues the commands and runs them in order on execute."""
+
+    def __init__(self, redis: FakeRedis):
+        self._redis = redis
+        self._commands = []
+
+    def __getattr__(self, name: str):
+        def command(*args, **kwargs):
+            self._commands.append((getattr(self._redis, name), args, kwargs))
+            return self
+
+        return command
+
+    def execute(self) -> list:
+        results = [method(*args, **kwargs) for method, args, kwargs in self._commands]
+        self._commands = []
+        return results
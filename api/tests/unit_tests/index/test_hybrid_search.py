@@ -0,0 +1,122 @@
+import asyncio
+import time
+from typing import List, Optional
+
+import pytest
+from flask import Flask
+from langchain.schema import Document
+
+from core.index.hybrid_search import HybridSearch, HybridSearchConfig
+
+
+class FakeIndex:
+    def __init__(self, documents: List[Document], delay: float = 0.0):
+        self._documents = documents
+        self._delay = delay
+
+    def search(self, query: str, **kwargs) -> List[Document]:
+        time.sleep(self._delay)
+        return self._documents[:kwargs['search_kwargs']['k']]
+
+    async def asearch(self, query: str, **kwargs) -> List[Document]:
+        await asyncio.sleep(self._delay)
+        return self._documents[:kwargs['search_kwargs']['k']]
+
+
+def _document(doc_id: str, **scores) -> Document:
+    return Document(page_content=doc_id, metadata={'doc_id': doc_id, **scores})
+
+
+def _vector_index(delay: float = 0.0) -> FakeIndex:
+    return FakeIndex([_document('a', score=0.9), _document('b', score=0.8), _document('c', score=0.2)], delay)
+
+
+def _keyword_index(delay: float = 0.0) -> FakeIndex:
+    return FakeIndex([_document('c', bm25_score=7.0), _document('d', bm25_score=3.0)], delay)
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['HYBRID_SEARCH_LATENCY_BUDGET_MS'] = 0
+    with app.app_context():
+        yield app
+
+
+def _search(vector_index: FakeIndex, keyword_index: FakeIndex, k: int = 4, **config) -> List[Document]:
+    return HybridSearch(vector_index, keyword_index, HybridSearchConfig(**config)).search('query', k)
+
+
+def test_rrf_fusion_keeps_side_scores(app):
+    documents = _search(_vector_index(), _keyword_index())
+
+    # c is found by both sides, a only by the vector side
+    assert [document.metadata['doc_id'] for document in documents] == ['c', 'a', 'b', 'd']
+    assert documents[0].metadata['fused_score'] == pytest.approx(0.5 / 63 + 0.5 / 61)
+    assert documents[1].metadata['fused_score'] == pytest.approx(0.5 / 61)
+
+    # the similarity scores are not replaced by the fused ones
+    assert [document.metadata.get('score') for document in documents] == [0.2, 0.9, 0.8, None]
+    assert documents[3].metadata['bm25_score'] == 3.0
+
+
+def test_weighted_fusion_normalizes_scores(app):
+    documents = _search(_vector_index(), _keyword_index(), fusion='weighted', vector_weight=0.7, keyword_weight=0.3)
+
+    fused_scores = {document.metadata['doc_id']: document.metadata['fused_score'] for document in documents}
+    assert fused_scores == pytest.approx({'a': 0.7, 'b': 0.7 * 6 / 7, 'c': 0.3, 'd': 0.0})
+    assert [document.metadata['doc_id'] for document in documents] == ['a', 'b', 'c', 'd']
+    assert documents[0].metadata['score'] == 0.9
+
+
+def test_fusion_keeps_top_k(app):
+    documents = _search(_vector_index(), _keyword_index(), k=2)
+
+    # each side is searched for k documents, c is not in the top 2 of the vector side
+    assert [document.metadata['doc_id'] for document in documents] == ['a', 'c']
+
+
+def test_latency_budget_drops_slow_side(app):
+    hybrid_search = HybridSearch(
+        _vector_index(),
+        _keyword_index(delay=0.5),
+        HybridSearchConfig(latency_budget_ms=50)
+    )
+
+    documents = hybrid_search.search('query', 4)
+
+    assert hybrid_search.timed_out
+    assert [document.metadata['doc_id'] for document in documents] == ['a', 'b', 'c']
+
+
+def test_failed_side_is_dropped(app, mocker):
+    keyword_index = _keyword_index()
+    mocker.patch.object(keyword_index, 'search', side_effect=RuntimeError('keyword index is down'))
+
+    hybrid_search = HybridSearch(_vector_index(), keyword_index, HybridSearchConfig())
+    documents = hybrid_search.search('query', 4)
+
+    assert not hybrid_search.timed_out
+    assert [document.metadata['doc_id'] for document in documents] == ['a', 'b', 'c']
+
+
+def test_asearch_fuses_like_search(app):
+    hybrid_search = HybridSearch(_vector_index(), _keyword_index(), HybridSearchConfig())
+
+    documents = asyncio.run(hybrid_search.asearch('query', 4))
+
+    assert [document.metadata['doc_id'] for document in documents] == ['c', 'a', 'b', 'd']
+    assert documents[0].metadata['score'] == 0.2
+
+
+def test_asearch_latency_budget_drops_slow_side(app):
+    hybrid_search = HybridSearch(
+        _vector_index(delay=0.5),
+        _keyword_index(),
+        HybridSearchConfig(latency_budget_ms=50)
+    )
+
+    documents = asyncio.run(hybrid_search.asearch('query', 4))
+
+    assert hybrid_search.timed_out
+    assert [document.metadata['doc_id'] for document in documents] == ['c', 'd']
@@ -0,0 +1,68 @@
+import pytest
+
+from core.index.keyword_table_index.keyword_node_stats import KeywordNodeStats
+from core.index.keyword_table_index.keyword_table_index import KeywordTableIndex, KeywordTableConfig
+from models.dataset import Dataset
+from tests.unit_tests.fake_redis import FakeRedis
+
+
+@pytest.fixture
+def redis(mocker):
+    redis = FakeRedis()
+    mocker.patch('core.index.keyword_table_index.keyword_node_stats.redis_client', redis)
+    return redis
+
+
+def test_stats_are_rebuilt_from_segments_when_missing(mocker, redis):
+    get_totals = mocker.patch.object(KeywordNodeStats, '_get_totals', return_value=(4, 400))
+    stats = KeywordNodeStats('dataset-1')
+
+    assert stats.get() == (4, 100.0)
+    assert stats.get() == (4, 100.0)
+    get_totals.assert_called_once()
+
+
+def test_stats_are_incremented_on_add_and_remove(mocker, redis):
+    mocker.patch.object(KeywordNodeStats, '_get_totals', return_value=(2, 100))
+    stats = KeywordNodeStats('dataset-1')
+    stats.get()
+
+    stats.add({'node-3': 30, 'node-4': 70})
+    assert stats.get() == (4, 50.0)
+
+    stats.remove({'node-1': 40})
+    assert stats.get() == (3, 160 / 3)
+
+
+def test_increments_on_missing_stats_do_not_count_as_built(mocker, redis):
+    mocker.patch.object(KeywordNodeStats, '_get_totals', return_value=(3, 90))
+    stats = KeywordNodeStats('dataset-1')
+
+    stats.add({'node-1': 10})
+
+    assert stats.get() == (3, 30.0)
+
+
+def test_stats_fall_back_to_segments_without_redis(mocker, redis):
+    mocker.patch.object(KeywordNodeStats, '_get_totals', return_value=(5, 50))
+    mocker.patch.object(redis, 'hgetall', side_effect=ConnectionError('redis is unavailable'))
+
+    assert KeywordNodeStats('dataset-1').get() == (5, 10.0)
+
+
+def test_bm25_ranks_rare_keywords_and_short_chunks_first(mocker):
+    mocker.patch.object(KeywordNodeStats, 'get', return_value=(10, 100.0))
+    mocker.patch.object(KeywordNodeStats, 'get_node_lengths', return_value={
+        'short': 50, 'long': 200, 'rare': 100, 'other': 100
+    })
+    index = KeywordTableIndex(Dataset(id='dataset-1'), KeywordTableConfig(scoring_mode='bm25'))
+    keyword_table = {
+        'common': {'short', 'long', 'other'},
+        'rare': {'rare'},
+    }
+
+    scored_chunk_indices = index._retrieve_ids_by_bm25(keyword_table, ['common', 'rare', 'missing'], k=3)
+
+    assert [node_id for node_id, _ in scored_chunk_indices] == ['rare', 'short', 'other']
+    scores = dict(scored_chunk_indices)
+    assert scores['rare'] > scores['short'] > scores['other'] > 0
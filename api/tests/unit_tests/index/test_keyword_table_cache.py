@@ -0,0 +1,77 @@
+import pytest
+from cachetools import TTLCache
+
+from core.index.keyword_table_index.keyword_table_index import KeywordTableIndex
+from models.dataset import Dataset
+from tests.unit_tests.fake_redis import FakeRedis
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def redis(mocker):
+    redis = FakeRedis()
+    mocker.patch('core.index.keyword_table_index.keyword_table_index.redis_client', redis)
+    return redis
+
+
+@pytest.fixture
+def timer(mocker):
+    timer = FakeTimer()
+    mocker.patch('core.index.keyword_table_index.keyword_table_index._keyword_table_cache',
+                 TTLCache(maxsize=10, ttl=60, timer=timer))
+    return timer
+
+
+@pytest.fixture
+def index(mocker):
+    index = KeywordTableIndex(Dataset(id='dataset-1'))
+    loads = iter(range(1, 100))
+    mocker.patch.object(index, '_get_dataset_keyword_table', side_effect=lambda: {'load': next(loads)})
+    return index
+
+
+def test_table_is_cached_until_its_version_is_bumped(redis, timer, index):
+    assert index._get_cached_dataset_keyword_table() == {'load': 1}
+    assert index._get_cached_dataset_keyword_table() == {'load': 1}
+
+    index._bump_keyword_table_version()
+
+    assert index._get_cached_dataset_keyword_table() == {'load': 2}
+
+
+def test_lost_version_key_does_not_bring_back_a_cached_version(redis, timer, index):
+    index._bump_keyword_table_version()
+    assert index._get_cached_dataset_keyword_table() == {'load': 1}
+
+    # the key is evicted, and the table changes as many times as it had before
+    redis.delete('keyword_table_version:dataset-1')
+    index._get_keyword_table_version()
+    index._bump_keyword_table_version()
+
+    assert index._get_cached_dataset_keyword_table() == {'load': 2}
+
+
+def test_table_of_failed_version_bump_expires(mocker, redis, timer, index):
+    assert index._get_cached_dataset_keyword_table() == {'load': 1}
+
+    mocker.patch.object(redis, 'set', side_effect=ConnectionError('redis is unavailable'))
+    index._bump_keyword_table_version()
+    assert index._get_cached_dataset_keyword_table() == {'load': 1}
+
+    timer.now += 61
+
+    assert index._get_cached_dataset_keyword_table() == {'load': 2}
+
+
+def test_table_is_read_without_redis(mocker, redis, timer, index):
+    mocker.patch.object(redis, 'get', side_effect=ConnectionError('redis is unavailable'))
+
+    assert index._get_cached_dataset_keyword_table() == {'load': 1}
+    assert index._get_cached_dataset_keyword_table() == {'load': 2}
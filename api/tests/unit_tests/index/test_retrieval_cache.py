@@ -0,0 +1,136 @@
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+from flask import Flask
+from langchain.schema import Document
+
+from core.index.retrieval_cache import RetrievalCache
+from tests.unit_tests.fake_redis import FakeRedis
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['DATASET_RETRIEVAL_CACHE_TTL'] = 60
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def redis(mocker):
+    redis = FakeRedis()
+    mocker.patch('core.index.retrieval_cache.redis_client', redis)
+    return redis
+
+
+@pytest.fixture
+def segments(mocker):
+    """Segments still enabled in the dataset, by index node id."""
+    segments = {}
+    document_segment = mocker.patch('core.index.retrieval_cache.DocumentSegment')
+    document_segment.query.filter.return_value.all.side_effect = lambda: list(segments.values())
+    return segments
+
+
+def _segment(doc_id: str) -> SimpleNamespace:
+    return SimpleNamespace(index_node_id=doc_id, index_node_hash=f'hash-{doc_id}', document_id='document-1',
+                           dataset_id='dataset-1', content=f'content of {doc_id}')
+
+
+def _document(doc_id: str, **scores) -> Document:
+    return Document(page_content=f'content of {doc_id}', metadata={'doc_id': doc_id, **scores})
+
+
+def _doc_ids(documents: List[Document]) -> List[str]:
+    return [document.metadata['doc_id'] for document in documents]
+
+
+def test_hits_are_loaded_with_their_scores(app, redis, segments):
+    segments.update({'a': _segment('a'), 'b': _segment('b')})
+    cache = RetrievalCache('dataset-1')
+    version = cache.get_version()
+
+    assert cache.get(version, 'query', 2, 'semantic_search') is None
+
+    cache.set(version, 'query', 2, 'semantic_search', [
+        _document('b', score=0.9, fused_score=0.03), _document('a', bm25_score=1.5)
+    ])
+    documents = cache.get(version, '  query ', 2, 'semantic_search')
+
+    # the ranking is kept, whatever order the segments are loaded in
+    assert _doc_ids(documents) == ['b', 'a']
+    assert documents[0].page_content == 'content of b'
+    assert documents[0].metadata == {
+        'doc_id': 'b', 'doc_hash': 'hash-b', 'document_id': 'document-1', 'dataset_id': 'dataset-1',
+        'score': 0.9, 'fused_score': 0.03
+    }
+    assert documents[1].metadata['bm25_score'] == 1.5
+
+    # entries are keyed by k and the search type
+    assert cache.get(version, 'query', 3, 'semantic_search') is None
+    assert cache.get(version, 'query', 2, 'keyword_table_bm25') is None
+
+
+def test_hits_of_removed_segments_are_dropped(app, redis, segments):
+    segments.update({'a': _segment('a'), 'b': _segment('b')})
+    cache = RetrievalCache('dataset-1')
+    version = cache.get_version()
+    cache.set(version, 'query', 2, 'semantic_search', [_document('a', score=0.9), _document('b', score=0.8)])
+
+    del segments['a']
+
+    assert _doc_ids(cache.get(version, 'query', 2, 'semantic_search')) == ['b']
+
+
+def test_version_is_stable_until_bumped(app, redis, segments):
+    cache = RetrievalCache('dataset-1')
+    version = cache.get_version()
+
+    assert version is not None
+    assert RetrievalCache('dataset-1').get_version() == version
+    assert RetrievalCache('dataset-2').get_version() != version
+
+    cache.set(version, 'query', 2, 'semantic_search', [])
+    RetrievalCache('dataset-1').bump_version()
+
+    new_version = cache.get_version()
+    assert new_version != version
+    assert cache.get(new_version, 'query', 2, 'semantic_search') is None
+
+
+def test_evicted_version_does_not_revive_entries(app, redis, segments):
+    segments['a'] = _segment('a')
+    cache = RetrievalCache('dataset-1')
+    first_version = cache.get_version()
+    cache.bump_version()
+    version = cache.get_version()
+
+    # entries of both versions are still alive when the version key is evicted
+    cache.set(first_version, 'query', 1, 'semantic_search', [_document('a', score=0.5)])
+    cache.set(version, 'query', 1, 'semantic_search', [_document('a', score=0.9)])
+    redis.delete('dataset_retrieval_version:dataset-1')
+
+    new_version = cache.get_version()
+    assert new_version not in (first_version, version)
+    assert cache.get(new_version, 'query', 1, 'semantic_search') is None
+
+
+def test_disabled_cache(app, redis, segments):
+    app.config['DATASET_RETRIEVAL_CACHE_TTL'] = 0
+    cache = RetrievalCache('dataset-1')
+
+    assert cache.get_version() is None
+    cache.set('version', 'query', 1, 'semantic_search', [_document('a', score=0.9)])
+    assert cache.get('version', 'query', 1, 'semantic_search') is None
+
+
+def test_unavailable_redis_searches_uncached(app, mocker):
+    redis = mocker.patch('core.index.retrieval_cache.redis_client')
+    redis.get.side_effect = ConnectionError('redis is unavailable')
+    cache = RetrievalCache('dataset-1')
+
+    assert cache.get_version() is None
+    assert cache.get(None, 'query', 1, 'semantic_search') is None
+    cache.set(None, 'query', 1, 'semantic_search', [_document('a', score=0.9)])
+    redis.setex.assert_not_called()
@@ -0,0 +1,144 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from core.index.vector_index.base import BaseVectorIndex
+from extensions.ext_database import db
+from models.dataset import Dataset
+from tests.unit_tests.fake_redis import FakeRedis
+
+ORIGIN_INDEX_STRUCT = json.dumps({'type': 'fake', 'vector_store': {'class_prefix': 'Vector_index_dataset_1'}})
+
+
+class FakeVectorStore:
+    def __init__(self):
+        self.texts = {}
+        self.fail_on_add = False
+
+    def add_documents(self, documents, uuids=None):
+        if self.fail_on_add:
+            raise ConnectionError('vector store is unavailable')
+
+        # the embeddings commit the session while the rebuild runs
+        db.session.commit()
+        for uuid, document in zip(uuids, documents):
+            self.texts[uuid] = document
+
+    def delete(self):
+        self.texts.clear()
+
+
+class FakeVectorIndex(BaseVectorIndex):
+    REBUILD_BATCH_SIZE = 2
+
+    def __init__(self, dataset: Dataset, vector_store: FakeVectorStore):
+        super().__init__(dataset, embeddings=None)
+        self._vector_store = vector_store
+
+    def get_index_name(self, dataset: Dataset) -> str:
+        if dataset.index_struct_dict:
+            return dataset.index_struct_dict['vector_store']['class_prefix']
+
+        return 'Vector_index_dataset_1_Node'
+
+    def to_index_struct(self) -> dict:
+        return {'type': 'fake', 'vector_store': {'class_prefix': self.get_index_name(self.dataset)}}
+
+    def create(self, texts, **kwargs):
+        self._vector_store.add_documents(texts, uuids=self._get_uuids(texts))
+        return self
+
+    def delete_by_document_id(self, document_id: str):
+        raise NotImplementedError
+
+    def _get_vector_store(self):
+        return self._vector_store
+
+    def _get_vector_store_class(self) -> type:
+        return FakeVectorStore
+
+    def _is_origin(self):
+        return not self.get_index_name(self.dataset).endswith('_Node')
+
+
+@pytest.fixture
+def segments():
+    return [SimpleNamespace(
+        id=f'segment-{i}',
+        content=f'content {i}',
+        index_node_id=f'node-{i}',
+        index_node_hash=f'hash-{i}',
+        document_id='document-1',
+        dataset_id='dataset-1'
+    ) for i in range(1, 6)]
+
+
+@pytest.fixture
+def redis(mocker):
+    redis = FakeRedis()
+    mocker.patch('core.index.vector_index.base.redis_client', redis)
+    return redis
+
+
+def test_recreate_dataset_resumes_interrupted_rebuild(mocker, redis, segments):
+    dataset = Dataset(id='dataset-1', tenant_id='tenant-1', name='dataset', index_struct=ORIGIN_INDEX_STRUCT)
+    committed_index_structs = []
+    mocker.patch.object(db.session, 'commit', side_effect=lambda: committed_index_structs.append(dataset.index_struct))
+    mocker.patch.object(
+        FakeVectorIndex,
+        '_get_segments_page',
+        side_effect=lambda _, last_segment_id: [s for s in segments if not last_segment_id or s.id > last_segment_id][:2]
+    )
+
+    vector_store = FakeVectorStore()
+    index = FakeVectorIndex(dataset, vector_store)
+    assert index._is_origin()
+
+    original_add_documents = vector_store.add_documents
+
+    def add_documents_then_fail(documents, uuids=None):
+        original_add_documents(documents, uuids=uuids)
+        vector_store.fail_on_add = True
+
+    vector_store.add_documents = add_documents_then_fail
+    with pytest.raises(ConnectionError):
+        index.recreate_dataset(dataset)
+
+    # the first batch is indexed, the dataset keeps its index struct in every commit
+    assert len(vector_store.texts) == 2
+    assert redis.get('vector_index_rebuild:dataset-1') == b'segment-2'
+    assert index.is_rebuild_interrupted(dataset)
+    assert dataset.index_struct == ORIGIN_INDEX_STRUCT
+    assert index.dataset is dataset
+    assert set(committed_index_structs) == {ORIGIN_INDEX_STRUCT}
+
+    vector_store.add_documents = original_add_documents
+    vector_store.fail_on_add = False
+    index.recreate_dataset(dataset, resume=True)
+
+    assert len(vector_store.texts) == 5
+    assert not index.is_rebuild_interrupted(dataset)
+    assert dataset.index_struct_dict['vector_store']['class_prefix'] == 'Vector_index_dataset_1_Node'
+    assert committed_index_structs[-1] == dataset.index_struct
+    assert not index._is_origin()
+
+
+def test_recreate_dataset_without_progress_starts_over(mocker, redis, segments):
+    dataset = Dataset(id='dataset-1', tenant_id='tenant-1', name='dataset', index_struct=ORIGIN_INDEX_STRUCT)
+    mocker.patch.object(db.session, 'commit')
+    mocker.patch.object(
+        FakeVectorIndex,
+        '_get_segments_page',
+        side_effect=lambda _, last_segment_id: [s for s in segments if not last_segment_id or s.id > last_segment_id][:2]
+    )
+
+    vector_store = FakeVectorStore()
+    vector_store.texts['stale'] = None
+    index = FakeVectorIndex(dataset, vector_store)
+
+    index.recreate_dataset(dataset, resume=True)
+
+    assert 'stale' not in vector_store.texts
+    assert len(vector_store.texts) == 5
+    assert redis.get('vector_index_rebuild:dataset-1') is None
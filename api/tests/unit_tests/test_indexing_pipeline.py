@@ -0,0 +1,124 @@
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from flask import Flask
+from langchain.schema import Document
+
+from core.indexing_pipeline import IndexingPipeline, ChunkEmbeddings
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def runner():
+    return MagicMock()
+
+
+def _pipeline(runner, queue_size: int = 2) -> IndexingPipeline:
+    return IndexingPipeline(
+        runner=runner,
+        dataset=SimpleNamespace(id='dataset-1'),
+        dataset_document=SimpleNamespace(id='document-1'),
+        processing_rule=SimpleNamespace(id='rule-1'),
+        queue_size=queue_size
+    )
+
+
+def _stages(pipeline: IndexingPipeline, upserted: list, load_count: int = 20, chunk_size: int = 3,
+            fail_on_chunk: int = None, fail_stage: str = None):
+    def load():
+        for i in range(load_count):
+            # the loader is slower than the other stages now and then
+            if i % 7 == 0:
+                time.sleep(0.01)
+            yield i
+
+    def clean(items):
+        for item in items:
+            yield item
+
+    def split(items):
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def embed(chunks):
+        for chunk_number, chunk in enumerate(chunks):
+            if fail_stage == 'embed' and chunk_number == fail_on_chunk:
+                raise ValueError('embed failed')
+            yield chunk, [[float(item)] for item in chunk]
+
+    def upsert(chunks):
+        for chunk_number, (chunk, vectors) in enumerate(chunks):
+            if fail_stage == 'upsert' and chunk_number == fail_on_chunk:
+                raise ValueError('upsert failed')
+            assert vectors == [[float(item)] for item in chunk]
+            upserted.append(chunk)
+
+    pipeline._load = load
+    pipeline._clean = clean
+    pipeline._split = split
+    pipeline._embed = embed
+    pipeline._upsert = upsert
+
+
+def _stage_threads() -> list:
+    return [thread for thread in threading.enumerate() if thread.name.startswith('indexing-')]
+
+
+def test_chunks_reach_upsert_in_order(app, runner):
+    pipeline = _pipeline(runner)
+    upserted = []
+    _stages(pipeline, upserted)
+
+    pipeline.run()
+
+    assert [item for chunk in upserted for item in chunk] == list(range(20))
+    assert [len(chunk) for chunk in upserted] == [3, 3, 3, 3, 3, 3, 2]
+    assert runner._update_document_index_status.call_args.kwargs['after_indexing_status'] == 'completed'
+    assert not _stage_threads()
+
+
+@pytest.mark.parametrize('fail_stage', ['embed', 'upsert'])
+def test_first_error_stops_the_stages_and_is_raised(app, runner, fail_stage):
+    pipeline = _pipeline(runner)
+    upserted = []
+    _stages(pipeline, upserted, load_count=1000, fail_on_chunk=2, fail_stage=fail_stage)
+
+    with pytest.raises(ValueError, match=f'{fail_stage} failed'):
+        pipeline.run()
+
+    # the chunks before the failed one are upserted in order, unless the stop overtakes them
+    assert upserted == [[0, 1, 2], [3, 4, 5]][:len(upserted)]
+    if fail_stage == 'upsert':
+        assert len(upserted) == 2
+    runner._update_document_index_status.assert_not_called()
+    assert not _stage_threads()
+
+
+def test_chunk_embeddings_pass_the_chunk_vectors_through():
+    embeddings = MagicMock()
+    embeddings.embed_documents.side_effect = lambda texts: [[-1.0] for _ in texts]
+    chunk_embeddings = ChunkEmbeddings(embeddings)
+
+    chunk_embeddings.set_chunk([Document(page_content='a'), Document(page_content='b')], [[1.0], [2.0]])
+
+    assert chunk_embeddings.embed_documents(['b', 'a']) == [[2.0], [1.0]]
+    embeddings.embed_documents.assert_not_called()
+
+    # texts outside the chunk are embedded by the wrapped embeddings
+    assert chunk_embeddings.embed_documents(['a', 'c']) == [[1.0], [-1.0]]
+    embeddings.embed_documents.assert_called_once_with(['c'])
@@ -0,0 +1,152 @@
+import asyncio
+import json
+from typing import List, Optional
+
+import pytest
+from flask import Flask
+from langchain.schema import Document
+
+from core.index.vector_index.base import BaseVectorIndex
+from core.tool.dataset_retriever_tool import DatasetRetrieverTool
+from models.dataset import Dataset
+from tests.unit_tests.fake_redis import FakeRedis
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.queries = []
+
+    async def aembed_query(self, text: str) -> List[float]:
+        self.queries.append(text)
+        return [1.0, 0.0]
+
+
+class FakeVectorStore:
+    def __init__(self, hits: List[tuple]):
+        self.hits = hits
+        self.searches = []
+
+    def similarity_search_with_relevance_scores(self, query: str, k: int, score_threshold: float) -> List[tuple]:
+        self.searches.append((query, k))
+        return [(Document(page_content=doc_id, metadata={'doc_id': doc_id}), score) for doc_id, score in self.hits[:k]]
+
+
+class FakeVectorIndex(BaseVectorIndex):
+    def __init__(self, dataset: Dataset, embeddings: FakeEmbeddings, vector_store: FakeVectorStore):
+        super().__init__(dataset, embeddings)
+        self._vector_store = vector_store
+
+    def get_index_name(self, dataset: Dataset) -> str:
+        return 'Vector_index_dataset_1_Node'
+
+    def to_index_struct(self) -> dict:
+        return {'type': 'fake', 'vector_store': {'class_prefix': self.get_index_name(self.dataset)}}
+
+    def create(self, texts, **kwargs):
+        raise NotImplementedError
+
+    def delete_by_document_id(self, document_id: str):
+        raise NotImplementedError
+
+    def _get_vector_store(self) -> FakeVectorStore:
+        return self._vector_store
+
+    def _get_vector_store_class(self) -> type:
+        return FakeVectorStore
+
+
+class FakeKeywordIndex:
+    def __init__(self, documents: List[Document]):
+        self.documents = documents
+
+    async def asearch(self, query: str, **kwargs) -> List[Document]:
+        return self.documents[:kwargs['search_kwargs']['k']]
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['DATASET_RETRIEVAL_CACHE_TTL'] = 60
+    app.config['HYBRID_SEARCH_LATENCY_BUDGET_MS'] = 0
+    app.config['KEYWORD_TABLE_SCORING_MODE'] = 'bm25'
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def redis(mocker):
+    redis = FakeRedis()
+    mocker.patch('core.index.retrieval_cache.redis_client', redis)
+    return redis
+
+
+def _dataset(indexing_technique: str = 'high_quality', search_method: Optional[str] = None) -> Dataset:
+    retrieval_config = json.dumps({'search_method': search_method}) if search_method else None
+    return Dataset(id='dataset-1', tenant_id='tenant-1', name='dataset', indexing_technique=indexing_technique,
+                   retrieval_config=retrieval_config)
+
+
+def _tool(mocker, dataset: Optional[Dataset], vector_index=None, keyword_index=None, k: int = 2):
+    mocker.patch.object(DatasetRetrieverTool, '_get_dataset', return_value=dataset)
+    mocker.patch.object(DatasetRetrieverTool, '_get_vector_index', return_value=vector_index)
+    mocker.patch.object(DatasetRetrieverTool, '_get_keyword_table_index', return_value=keyword_index)
+    to_context = mocker.patch.object(DatasetRetrieverTool, '_to_context', return_value='context')
+
+    tool = DatasetRetrieverTool.construct(name='dataset-1', tenant_id='tenant-1', dataset_id='dataset-1', k=k)
+    return tool, to_context
+
+
+def test_arun_semantic_search(app, redis, mocker):
+    dataset = _dataset()
+    embeddings = FakeEmbeddings()
+    vector_store = FakeVectorStore([('a', 0.9), ('b', 0.7), ('c', 0.5)])
+    tool, to_context = _tool(mocker, dataset, vector_index=FakeVectorIndex(dataset, embeddings, vector_store))
+
+    assert asyncio.run(tool._arun('query')) == 'context'
+
+    # the query is embedded with the async client before the search
+    assert embeddings.queries == ['query']
+    assert vector_store.searches == [('query', 2)]
+
+    _, documents = to_context.call_args.args
+    assert [(document.metadata['doc_id'], document.metadata['score']) for document in documents] == [
+        ('a', 0.9), ('b', 0.7)
+    ]
+
+    # the hits are cached with their scores
+    cached = [json.loads(value) for key, value in redis.data.items() if key.startswith('dataset_retrieval:')]
+    assert cached == [[['a', {'score': 0.9}], ['b', {'score': 0.7}]]]
+
+
+def test_arun_hybrid_search(app, redis, mocker):
+    dataset = _dataset(search_method='hybrid')
+    vector_index = FakeVectorIndex(dataset, FakeEmbeddings(), FakeVectorStore([('a', 0.9), ('b', 0.7)]))
+    keyword_index = FakeKeywordIndex([
+        Document(page_content='b', metadata={'doc_id': 'b', 'bm25_score': 4.0}),
+        Document(page_content='c', metadata={'doc_id': 'c', 'bm25_score': 2.0}),
+    ])
+    tool, to_context = _tool(mocker, dataset, vector_index=vector_index, keyword_index=keyword_index)
+
+    assert asyncio.run(tool._arun('query')) == 'context'
+
+    _, documents = to_context.call_args.args
+    assert [document.metadata['doc_id'] for document in documents] == ['b', 'a']
+    assert documents[0].metadata['score'] == 0.7
+    assert 'fused_score' in documents[0].metadata
+
+
+def test_arun_economy_returns_contents(app, redis, mocker):
+    keyword_index = FakeKeywordIndex([
+        Document(page_content='first', metadata={'doc_id': 'a'}),
+        Document(page_content='second', metadata={'doc_id': 'b'}),
+    ])
+    tool, to_context = _tool(mocker, _dataset(indexing_technique='economy'), keyword_index=keyword_index)
+
+    assert asyncio.run(tool._arun('query')) == 'first\nsecond'
+    to_context.assert_not_called()
+
+
+def test_arun_missing_dataset(app, mocker):
+    tool, _ = _tool(mocker, None)
+
+    assert asyncio.run(tool._arun('query')) == '[dataset-1 failed to find dataset with id dataset-1.]'
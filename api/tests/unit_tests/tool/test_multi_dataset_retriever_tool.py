@@ -0,0 +1,68 @@
+import json
+from typing import Optional
+
+from langchain.schema import Document
+
+from core.tool.multi_dataset_retriever_tool import MultiDatasetRetrieverTool
+from models.dataset import Dataset
+
+
+def _dataset(dataset_id: str, indexing_technique: str = 'high_quality', search_method: Optional[str] = None) -> Dataset:
+    retrieval_config = json.dumps({'search_method': search_method}) if search_method else None
+    return Dataset(id=dataset_id, indexing_technique=indexing_technique, retrieval_config=retrieval_config)
+
+
+def _document(doc_id: str, score: Optional[float] = None, doc_hash: Optional[str] = None) -> Document:
+    metadata = {'doc_id': doc_id, 'doc_hash': doc_hash or f'hash-{doc_id}'}
+    if score is not None:
+        metadata['score'] = score
+
+    return Document(page_content=doc_id, metadata=metadata)
+
+
+def _tool(k: int) -> MultiDatasetRetrieverTool:
+    return MultiDatasetRetrieverTool.construct(k=k)
+
+
+def test_merge_semantic_datasets_by_cosine_score():
+    dataset_a, dataset_b = _dataset('a'), _dataset('b')
+
+    hits = _tool(k=3)._merge_documents([
+        (dataset_a, [_document('a1', 0.55), _document('a2', 0.5)]),
+        (dataset_b, [_document('b1', 0.9), _document('b2', 0.8), _document('b3', 0.2)]),
+    ])
+
+    # the weak best hit of a does not outrank the strong hits of b
+    assert [(dataset.id, document.metadata['doc_id'], score) for dataset, document, score in hits] == [
+        ('b', 'b1', 0.9), ('b', 'b2', 0.8), ('a', 'a1', 0.55)
+    ]
+
+
+def test_merge_mixed_scale_datasets_by_rank():
+    semantic = _dataset('semantic')
+    hybrid = _dataset('hybrid', search_method='hybrid')
+    keyword = _dataset('keyword', indexing_technique='economy')
+
+    hits = _tool(k=4)._merge_documents([
+        (semantic, [_document('s1', 0.8), _document('s2', 0.7)]),
+        # hybrid hits are ordered by their fused score, and keyword count ranking has no score at all
+        (hybrid, [_document('h1', 0.016), _document('h2', 0.015)]),
+        (keyword, [_document('k1'), _document('k2')]),
+    ])
+
+    # the best hit of each dataset comes first, whatever the scale of its score
+    assert [document.metadata['doc_id'] for _, document, _ in hits[:3]] == ['s1', 'h1', 'k1']
+    assert hits[3][1].metadata['doc_id'] == 's2'
+    # the merged hits keep their own score
+    assert [score for _, _, score in hits] == [0.8, 0.016, None, 0.7]
+
+
+def test_merge_keeps_first_of_duplicated_contents():
+    dataset_a, dataset_b = _dataset('a'), _dataset('b')
+
+    hits = _tool(k=3)._merge_documents([
+        (dataset_a, [_document('a1', 0.6, doc_hash='same')]),
+        (dataset_b, [_document('b1', 0.9, doc_hash='same'), _document('b2', 0.4)]),
+    ])
+
+    assert [document.metadata['doc_id'] for _, document, _ in hits] == ['b1', 'b2']
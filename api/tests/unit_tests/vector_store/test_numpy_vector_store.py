@@ -0,0 +1,176 @@
+import json
+import os
+from typing import Dict, List
+
+import numpy as np
+import pytest
+
+from core.vector_store.numpy_vector_store import NumpyVectorStore
+
+
+class FakeEmbeddings:
+    def __init__(self, vectors: Dict[str, List[float]]):
+        self.vectors = vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.vectors[text]
+
+
+@pytest.fixture
+def embeddings():
+    return FakeEmbeddings({
+        'apple': [1.0, 0.0, 0.0],
+        'pear': [0.8, 0.6, 0.0],
+        'car': [0.0, 0.0, 2.0],
+        'bus': [0.0, 0.6, 0.8],
+    })
+
+
+def _meta(path) -> dict:
+    with open(os.path.join(path, NumpyVectorStore.META_FILENAME)) as f:
+        return json.load(f)
+
+
+def _doc_ids(docs_and_scores) -> List[str]:
+    return [doc.metadata['doc_id'] for doc, _ in docs_and_scores]
+
+
+def _add(store: NumpyVectorStore, texts: List[str], document_id: str = 'document-1') -> List[str]:
+    return store.add_texts(
+        texts,
+        metadatas=[{'doc_id': text, 'document_id': document_id} for text in texts],
+        ids=texts
+    )
+
+
+def test_add_and_search(tmp_path, embeddings):
+    store = NumpyVectorStore(path=str(tmp_path), embedding=embeddings)
+
+    assert _add(store, ['apple', 'pear', 'car']) == ['apple', 'pear', 'car']
+
+    docs_and_scores = store.similarity_search_with_score('apple', k=2)
+    assert _doc_ids(docs_and_scores) == ['apple', 'pear']
+    assert [score for _, score in docs_and_scores] == pytest.approx([1.0, 0.8])
+    assert docs_and_scores[0][0].page_content == 'apple'
+    assert docs_and_scores[0][0].metadata == {'doc_id': 'apple', 'document_id': 'document-1'}
+
+    # the vectors are normalized, the cosine similarity does not depend on their norm
+    assert store.similarity_search_with_score('car', k=1)[0][1] == pytest.approx(1.0)
+
+
+def test_search_empty_store(tmp_path, embeddings):
+    store = NumpyVectorStore(path=str(tmp_path / 'missing'), embedding=embeddings)
+
+    assert store.similarity_search('apple') == []
+    assert store.get_existing_ids(['apple']) == set()
+
+
+def test_add_replaces_existing_ids(tmp_path, embeddings):
+    store = NumpyVectorStore(path=str(tmp_path), embedding=embeddings)
+    _add(store, ['apple', 'car'])
+
+    store.add_texts(['car'], metadatas=[{'doc_id': 'apple', 'document_id': 'document-1'}], ids=['apple'])
+
+    docs_and_scores = store.similarity_search_with_score('car', k=4)
+    assert [doc.page_content for doc, _ in docs_and_scores] == ['car', 'car']
+    assert store.get_existing_ids(['apple', 'car', 'pear']) == {'apple', 'car'}
+
+
+def test_add_rejects_other_dimensions(tmp_path, embeddings):
+    store = NumpyVectorStore(path=str(tmp_path), embedding=embeddings)
+    _add(store, ['apple'])
+    embeddings.vectors['short'] = [1.0, 0.0]
+
+    with pytest.raises(ValueError):
+        store.add_texts(['short'], ids=['short'])
+
+
+def test_delete_by_ids_and_document_id(tmp_path, embeddings):
+    store = NumpyVectorStore(path=str(tmp_path), embedding=embeddings)
+    _add(store, ['apple', 'pear'], document_id='fruits')
+    _add(store, ['car', 'bus'], document_id='vehicles')
+
+    store.del_texts_by_ids(['pear'])
+    assert not store.text_exists('pear')
+    assert _doc_ids(store.similarity_search_with_score('pear', k=4)) == ['apple', 'bus', 'car']
+
+    store.del_texts_by_document_id('vehicles')
+    assert store.get_existing_ids(['apple', 'pear', 'car', 'bus']) == {'apple'}
+    assert _doc_ids(store.similarity_search_with_score('car', k=4)) == ['apple']
+
+
+def test_compaction_drops_deleted_rows(tmp_path, embeddings):
+    store = NumpyVectorStore(path=str(tmp_path), embedding=embeddings)
+    _add(store, ['apple', 'pear', 'car', 'bus'])
+
+    # deleted rows are blanked until they outnumber the live rows
+    store.del_texts_by_ids(['apple', 'pear'])
+    assert _meta(tmp_path)['count'] == 4
+
+    store.del_texts_by_ids(['car'])
+    assert _meta(tmp_path)['count'] == 1
+    assert os.path.getsize(tmp_path / NumpyVectorStore.VECTORS_FILENAME) == 3 * 4
+
+    docs_and_scores = store.similarity_search_with_score('bus', k=4)
+    assert _doc_ids(docs_and_scores) == ['bus']
+    assert docs_and_scores[0][0].page_content == 'bus'
+    assert docs_and_scores[0][1] == pytest.approx(1.0)
+
+    # rows added after compaction are appended to the compacted files
+    _add(store, ['apple'])
+    assert _doc_ids(store.similarity_search_with_score('apple', k=4)) == ['apple', 'bus']
+
+
+def test_other_instances_see_writes(tmp_path, embeddings):
+    store = NumpyVectorStore(path=str(tmp_path), embedding=embeddings)
+    other_store = NumpyVectorStore(path=str(tmp_path), embedding=embeddings)
+    _add(store, ['apple'])
+    assert _doc_ids(other_store.similarity_search_with_score('apple', k=4)) == ['apple']
+
+    # the index is deleted and recreated by another instance
+    store.delete()
+    _add(store, ['car'])
+    assert _doc_ids(other_store.similarity_search_with_score('apple', k=4)) == ['car']
+
+
+def _clustered_vectors(count: int, dim: int = 16, clusters: int = 8) -> Dict[str, List[float]]:
+    rng = np.random.default_rng(42)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(clusters, size=count)] + rng.normal(scale=0.1, size=(count, dim))
+    return {f'text-{i}': vector.tolist() for i, vector in enumerate(vectors)}
+
+
+def test_ivf_index(tmp_path):
+    embeddings = FakeEmbeddings(_clustered_vectors(400))
+    texts = list(embeddings.vectors)
+    store = NumpyVectorStore(path=str(tmp_path), embedding=embeddings, ivf_threshold=100, ivf_nprobe=2)
+
+    _add(store, texts[:50])
+    assert _meta(tmp_path)['ivf_count'] == 0
+
+    _add(store, texts[50:150])
+    assert _meta(tmp_path)['ivf_count'] == 150
+    assert os.path.exists(tmp_path / NumpyVectorStore.CENTROIDS_FILENAME)
+
+    # rows added below the retrain point are assigned to the trained clusters
+    _add(store, texts[150:250])
+    assert _meta(tmp_path)['ivf_count'] == 150
+
+    # the inverted file finds the stored vectors through the probed clusters
+    for text in texts[:250:25]:
+        docs_and_scores = store.similarity_search_with_score(text, k=3)
+        assert docs_and_scores[0][0].page_content == text
+        assert docs_and_scores[0][1] == pytest.approx(1.0, abs=1e-5)
+        assert len(docs_and_scores) == 3
+
+    # the rows doubled since training, the clusters are retrained
+    _add(store, texts[250:])
+    assert _meta(tmp_path)['ivf_count'] == 400
+
+    # below the threshold, the inverted file is dropped
+    store.del_texts_by_ids(texts[99:])
+    assert _meta(tmp_path)['ivf_count'] == 0
+    assert _doc_ids(store.similarity_search_with_score(texts[0], k=1)) == [texts[0]]
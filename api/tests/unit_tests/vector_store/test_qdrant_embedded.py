@@ -0,0 +1,108 @@
+import multiprocessing
+import sqlite3
+
+import pytest
+from qdrant_client.http import models as rest_models
+
+from core.vector_store.qdrant_embedded import EmbeddedQdrantClient
+
+
+def _vectors_config() -> rest_models.VectorParams:
+    return rest_models.VectorParams(size=2, distance=rest_models.Distance.COSINE)
+
+
+def _points(*ids: int) -> list:
+    return [rest_models.PointStruct(id=point_id, vector=[1.0, float(point_id)], payload={'n': point_id})
+            for point_id in ids]
+
+
+def _write_in_process(path: str, collection_name: str, point_ids: list, recreate: bool) -> None:
+    client = EmbeddedQdrantClient(path=path)
+    if recreate:
+        client.recreate_collection(collection_name=collection_name, vectors_config=_vectors_config())
+
+    client.upsert(collection_name=collection_name, points=_points(*point_ids))
+
+
+def _run_in_other_process(path: str, collection_name: str, point_ids: list, recreate: bool = False) -> None:
+    process = multiprocessing.get_context('spawn').Process(
+        target=_write_in_process,
+        args=(path, collection_name, point_ids, recreate)
+    )
+    process.start()
+    process.join(timeout=60)
+    assert process.exitcode == 0
+
+
+def _count(client: EmbeddedQdrantClient, collection_name: str) -> int:
+    return client.count(collection_name=collection_name).count
+
+
+def test_reads_reload_collections_written_by_another_process(tmp_path):
+    path = str(tmp_path)
+    client = EmbeddedQdrantClient(path=path)
+    assert client.get_collections().collections == []
+
+    _run_in_other_process(path, 'collection_a', [1, 2], recreate=True)
+
+    assert [collection.name for collection in client.get_collections().collections] == ['collection_a']
+    assert _count(client, 'collection_a') == 2
+
+    _run_in_other_process(path, 'collection_a', [3])
+
+    assert _count(client, 'collection_a') == 3
+    hits = client.search(collection_name='collection_a', query_vector=[1.0, 3.0], limit=1)
+    assert hits[0].id == 3
+
+
+def test_writes_are_seen_by_another_process(tmp_path):
+    path = str(tmp_path)
+    client = EmbeddedQdrantClient(path=path)
+    client.recreate_collection(collection_name='collection_a', vectors_config=_vectors_config())
+    client.upsert(collection_name='collection_a', points=_points(1))
+
+    # the other process opens the store while this one holds it, and adds to what this one wrote
+    _run_in_other_process(path, 'collection_a', [2])
+
+    assert _count(client, 'collection_a') == 2
+
+
+def test_points_write_reloads_only_the_changed_collection(tmp_path):
+    path = str(tmp_path)
+    writer = EmbeddedQdrantClient(path=path)
+    for collection_name in ('collection_a', 'collection_b'):
+        writer.recreate_collection(collection_name=collection_name, vectors_config=_vectors_config())
+
+    reader = EmbeddedQdrantClient(path=path)
+    store = reader._client
+    assert _count(reader, 'collection_a') == 0
+    collection_a = store.collections['collection_a']
+    collection_b = store.collections['collection_b']
+
+    writer.upsert(collection_name='collection_a', points=_points(1))
+
+    assert _count(reader, 'collection_a') == 1
+    assert store.collections['collection_b'] is collection_b
+    # the replaced collection's storage is closed
+    with pytest.raises(sqlite3.ProgrammingError):
+        collection_a.storage.storage.execute('SELECT 1')
+
+
+def test_recreated_collection_drops_its_points(tmp_path):
+    path = str(tmp_path)
+    writer = EmbeddedQdrantClient(path=path)
+    writer.recreate_collection(collection_name='collection_a', vectors_config=_vectors_config())
+    writer.upsert(collection_name='collection_a', points=_points(1, 2))
+
+    reader = EmbeddedQdrantClient(path=path)
+    assert _count(reader, 'collection_a') == 2
+
+    writer.recreate_collection(collection_name='collection_a', vectors_config=_vectors_config())
+    writer.upsert(collection_name='collection_a', points=_points(3))
+
+    assert _count(reader, 'collection_a') == 1
+    assert _count(EmbeddedQdrantClient(path=path), 'collection_a') == 1
+
+    writer.delete_collection(collection_name='collection_a')
+
+    assert reader.get_collections().collections == []